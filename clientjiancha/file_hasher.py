@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 进程文件多摘要哈希
+版本: 1.0
+用途: 威胁情报查询同时需要 MD5、SHA-1 和 SHA-256。每个不同的文件只读取一遍，按固定大小的块
+      读入同一个缓冲区，三个摘要从同一块数据更新，内存占用与文件大小无关；
+      多个文件在有界线程池中并发计算（hashlib 处理大块数据时释放 GIL，读盘与计算可以重叠）。
+      超过大小上限的文件不计算，单个文件超过时限时放弃，避免一个巨大的映像拖住整个扫描；
+      读取阻塞在挂起的网络共享或卷上时，调用方按时限停止等待，不等待卡住的线程退出。
+"""
+
+import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+HASH_ALGORITHMS = ('md5', 'sha1', 'sha256')
+HASH_CHUNK_SIZE = 1024 * 1024  # 每次读取的字节数
+
+class HashLimitExceeded(Exception):
+    """文件超过大小上限或计算超时"""
+
+def hash_file(path, algorithms=HASH_ALGORITHMS, max_bytes=None, deadline=None):
+    """一遍读取文件，返回 {算法名: 十六进制摘要}
+
+    超过 max_bytes 或到达 deadline（monotonic 时间）时抛出 HashLimitExceeded；
+    时限在每读完一块后检查，读取本身阻塞时无法中断。
+    """
+    digests = [hashlib.new(name) for name in algorithms]
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if max_bytes is not None and size > max_bytes:
+            raise HashLimitExceeded(f'文件大小 {size} 字节超过上限 {max_bytes} 字节')
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            chunk = view[:count]
+            for digest in digests:
+                digest.update(chunk)
+            if deadline is not None and time.monotonic() > deadline:
+                raise HashLimitExceeded('计算超时')
+    return {name: digest.hexdigest() for name, digest in zip(algorithms, digests)}
+
+class FileHasher:
+    """有界线程池上的批量哈希，结果写入 hash_cache（HashCache，可为 None）
+
+    hash_files 返回 {路径: digests}；无法计算的文件对应 {'error': 原因}，不写入缓存。
+    """
+
+    def __init__(self, hash_cache=None, workers=4, max_bytes=None, timeout=None, algorithms=HASH_ALGORITHMS):
+        self.hash_cache = hash_cache
+        self.workers = max(1, workers)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.algorithms = tuple(algorithms)
+        self.skipped = 0  # 超过大小上限、超时或无法读取的文件数
+
+    def _hash_one(self, path, deadlines):
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        deadlines[path] = deadline  # 开始计算的时间决定该文件的时限，供等待方使用
+        return hash_file(path, self.algorithms, self.max_bytes, deadline)
+
+    def _result(self, future, path, deadlines):
+        """等待一个文件的结果，不超过该文件自身的时限；仍在排队的文件最多再等一个时限
+        （所有线程都卡在读取上时不再等待）"""
+        if not self.timeout:
+            return future.result()
+        queued_until = time.monotonic() + self.timeout
+        while True:
+            deadline = deadlines.get(path) or queued_until
+            try:
+                return future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                started = deadlines.get(path)
+                if started is not None and started > time.monotonic():
+                    continue  # 等待期间才开始计算，按该文件自己的时限继续等待
+                future.cancel()
+                raise HashLimitExceeded('计算超时')
+
+    def hash_files(self, paths):
+        """计算一批文件的哈希：相同路径只计算一次，缓存命中的文件不读取"""
+        results = {}
+        pending = {}
+        for path in dict.fromkeys(paths):
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                self.skipped += 1
+                results[path] = {'error': str(e)}
+                continue
+            digests = self.hash_cache.get(path, stat, self.algorithms) if self.hash_cache else None
+            if digests is not None:
+                results[path] = digests
+            else:
+                pending[path] = stat
+
+        if pending:
+            executor = ThreadPoolExecutor(max_workers=min(self.workers, len(pending)),
+                                          thread_name_prefix='winxy-hash')
+            deadlines = {}
+            futures = {path: executor.submit(self._hash_one, path, deadlines) for path in pending}
+            try:
+                for path, future in futures.items():
+                    try:
+                        digests = self._result(future, path, deadlines)
+                    except (OSError, HashLimitExceeded) as e:
+                        self.skipped += 1
+                        results[path] = {'error': str(e)}
+                        continue
+                    results[path] = digests
+                    if self.hash_cache:
+                        self.hash_cache.put(path, pending[path], digests)
+            finally:
+                # 取消尚未开始的文件，不等待阻塞在读取上的线程（等价于 Python 3.9 的 cancel_futures=True）
+                for future in futures.values():
+                    future.cancel()
+                executor.shutdown(wait=False)
+        return results
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 进程文件哈希缓存
+版本: 1.0
+用途: 几百个进程通常只对应几十个不同的可执行文件（svchost.exe、chrome.exe 等）。
+      按 (路径, 大小, 修改时间) 缓存文件哈希：同一次运行中每个文件只计算一次，
+      缓存保存在 SQLite 中（默认与输出文件放在同一目录），再次分析同一台主机时
+      未变化的文件直接复用，几乎不再读取文件。文件被替换后大小或修改时间变化，自动重新计算。
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+HASH_CACHE_FILE_NAME = 'process_hash_cache.db'
+HASH_CACHE_MAX_AGE_DAYS = 30  # 超过这么多天没有再遇到的文件从缓存中删除
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    digests TEXT,
+    last_seen REAL
+);
+'''
+
+def cache_key(path):
+    """缓存键：绝对路径，Windows 上不区分大小写"""
+    return os.path.normcase(os.path.abspath(path))
+
+class HashCache:
+    """文件哈希缓存；db_path 为空时只在本次运行的内存中缓存
+
+    digests 为 {算法名: 十六进制摘要}，调用方要求的算法不全时视为未命中。
+    新计算的结果先保存在内存中，flush() 时在一个事务中写入数据库。
+    """
+
+    def __init__(self, db_path=HASH_CACHE_FILE_NAME):
+        self.entries = {}  # 键 -> (大小, 修改时间, digests)
+        self.pending = {}  # 等待写入数据库的条目
+        self.seen = set()  # 本次运行遇到的数据库条目（flush 时更新 last_seen）
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+        if db_path:
+            try:
+                self.conn = sqlite3.connect(db_path, timeout=30)
+                self.conn.executescript(SCHEMA)
+            except sqlite3.Error as e:
+                print(f"[警告] 无法打开哈希缓存 {db_path}，本次只在内存中缓存: {e}")
+                self.conn = None
+
+    def _load(self, key):
+        """从内存或数据库读取条目"""
+        entry = self.entries.get(key)
+        if entry is None and self.conn is not None:
+            try:
+                row = self.conn.execute('SELECT size, mtime_ns, digests FROM file_hashes WHERE path = ?',
+                                        (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row:
+                entry = self.entries[key] = (row[0], row[1], json.loads(row[2]))
+                self.seen.add(key)
+        return entry
+
+    def get(self, path, stat, algorithms=('md5',)):
+        """文件未变化且包含全部所需算法时返回 digests，否则返回 None"""
+        entry = self._load(cache_key(path))
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns \
+                and all(name in entry[2] for name in algorithms):
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        return None
+
+    def put(self, path, stat, digests):
+        """记录新计算的哈希（与已缓存的其他算法合并）"""
+        key = cache_key(path)
+        entry = self._load(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            digests = dict(entry[2], **digests)
+        self.entries[key] = self.pending[key] = (stat.st_size, stat.st_mtime_ns, digests)
+
+    def flush(self):
+        """把新结果写入数据库，并删除长期未再遇到的条目"""
+        if self.conn is None:
+            return
+        now = time.time()
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, digests, last_seen) VALUES (?, ?, ?, ?, ?)',
+                    [(key, size, mtime_ns, json.dumps(digests), now) for key, (size, mtime_ns, digests) in self.pending.items()])
+                self.conn.executemany('UPDATE file_hashes SET last_seen = ? WHERE path = ?',
+                                      [(now, key) for key in self.seen - set(self.pending)])
+                self.conn.execute('DELETE FROM file_hashes WHERE last_seen < ?', (now - HASH_CACHE_MAX_AGE_DAYS * 86400,))
+        except sqlite3.Error as e:
+            print(f"[警告] 写入哈希缓存失败: {e}")
+        self.pending = {}
+        self.seen = set()
+
+    def stats(self):
+        """本次运行的命中/未命中次数"""
+        return {'hits': self.hits, 'misses': self.misses, 'persistent': self.conn is not None}
+
+    def close(self):
+        """写入未保存的结果并关闭数据库"""
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
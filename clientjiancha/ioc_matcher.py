@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 威胁情报(IOC)匹配
+版本: 1.0
+用途: 把进程名、文件哈希、IP、端口和关键字情报一次性编译为哈希集合与
+      Aho-Corasick 自动机，供 Web 服务器和 clientjiancha 中的收集脚本共用。
+      无论情报规模多大，名称/哈希/IP/端口查询都是 O(1)，关键字查询是 O(文本长度)。
+
+情报目录（默认 ioc_feeds/）中的每个 .txt/.csv 文件每行一条情报：
+    mimikatz.exe                     # 类型由文件名推断（见 FEED_FILE_KINDS）
+    hash:44d88612fea8a8f36de82e1278abb02f
+    ip:203.0.113.7,某APT组织C2      # 逗号之后为备注，# 之后为注释
+无法从文件名推断类型且没有 "类型:" 前缀时，按值的格式自动识别。
+config.json 中 detection_rules 的可疑进程名和端口不在这里重复定义，由调用方从规则集传入 load_matcher。
+"""
+
+import os
+import csv
+import hashlib
+import socket
+
+IOC_KINDS = ('name', 'hash', 'ip', 'port', 'keyword')
+FEED_EXTENSIONS = ('.txt', '.csv')
+FEED_FOLDER_ENV = 'WINXY_IOC_FEEDS'
+FEED_FOLDER_NAME = 'ioc_feeds'
+
+# 情报文件名（不含扩展名，小写）中出现的词 -> 情报类型
+FEED_FILE_KINDS = [
+    ('process', 'name'), ('name', 'name'),
+    ('hash', 'hash'), ('md5', 'hash'), ('sha1', 'hash'), ('sha256', 'hash'),
+    ('port', 'port'),
+    ('ip', 'ip'), ('address', 'ip'),
+    ('keyword', 'keyword'), ('pattern', 'keyword'), ('string', 'keyword')
+]
+# 行内 "类型:值" 前缀的别名
+KIND_ALIASES = {
+    'name': 'name', 'process': 'name', 'process_name': 'name',
+    'hash': 'hash', 'md5': 'hash', 'sha1': 'hash', 'sha256': 'hash',
+    'ip': 'ip', 'ipv4': 'ip', 'ipv6': 'ip',
+    'port': 'port',
+    'keyword': 'keyword', 'pattern': 'keyword'
+}
+HASH_LENGTHS = {32, 40, 64}  # MD5 / SHA-1 / SHA-256 的十六进制长度
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+# config.json 中 detection_rules 的可疑进程名和端口（由 rule_engine 编译）作为情报时的来源名
+RULE_SOURCE = 'config.json'
+
+class KeywordAutomaton:
+    """Aho-Corasick 多模式匹配自动机（大小写不敏感）"""
+
+    def __init__(self, keywords=()):
+        self.goto = [{}]
+        self.terminal = [None]  # 状态自身对应的关键字
+        self.fail = [0]
+        self.output = [()]  # 编译后：状态自身及其后缀状态上的全部关键字
+        self.count = 0
+        self.compiled = True
+        for keyword in keywords:
+            self.add(keyword)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, keyword):
+        """添加关键字，添加完毕后需要调用 compile()"""
+        keyword = keyword.lower()
+        if not keyword:
+            return
+        state = 0
+        for ch in keyword:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.terminal.append(None)
+            state = next_state
+        if self.terminal[state] is None:
+            self.terminal[state] = keyword
+            self.count += 1
+        self.compiled = False
+
+    def compile(self):
+        """按广度优先计算失败指针，并把后缀状态的输出合并进来"""
+        goto, terminal = self.goto, self.terminal
+        fail = [0] * len(goto)
+        output = [(keyword,) if keyword else () for keyword in terminal]
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(ch, 0)
+                if output[fail[next_state]]:
+                    output[next_state] = output[next_state] + output[fail[next_state]]
+        self.fail = fail
+        self.output = output
+        self.compiled = True
+
+    def search(self, text):
+        """返回文本中出现的所有关键字（按首次出现顺序去重）"""
+        if not self.compiled:
+            self.compile()
+        goto, fail, output = self.goto, self.fail, self.output
+        found = {}
+        state = 0
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                for keyword in output[state]:
+                    found.setdefault(keyword, None)
+        return list(found)
+
+def normalize_hash(value):
+    """规范化十六进制哈希，格式不符时返回 None"""
+    value = value.strip().lower()
+    if len(value) in HASH_LENGTHS and HEX_DIGITS.issuperset(value):
+        return value
+    return None
+
+def normalize_ip(value):
+    """规范化 IP 地址（IPv6 压缩形式），格式不符时返回 None"""
+    value = value.strip().strip('[]')
+    # inet_pton 比 ipaddress 快一个数量级，情报中动辄数十万条 IP
+    family = socket.AF_INET6 if ':' in value else socket.AF_INET
+    try:
+        return socket.inet_ntop(family, socket.inet_pton(family, value))
+    except (OSError, ValueError):
+        return None
+
+def normalize_port(value):
+    """规范化端口号，格式不符时返回 None"""
+    try:
+        port = int(str(value).strip())
+    except ValueError:
+        return None
+    return port if 0 < port < 65536 else None
+
+def guess_kind(value):
+    """根据值的格式推断情报类型"""
+    if normalize_hash(value):
+        return 'hash'
+    if normalize_ip(value):
+        return 'ip'
+    if value.isdigit():
+        return 'port'
+    if ' ' not in value and '.' in value:
+        return 'name'
+    return 'keyword'
+
+def kind_from_filename(filename):
+    """根据情报文件名推断类型，推断不出时返回 None"""
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    for word, kind in FEED_FILE_KINDS:
+        if word in stem:
+            return kind
+    return None
+
+class IOCMatcher:
+    """编译后的情报集合：名称/哈希/IP/端口用哈希集合，关键字用 Aho-Corasick 自动机"""
+
+    def __init__(self):
+        # 值 -> 来源（情报文件名或 config.json），命中时作为原因的一部分返回
+        self.names = {}
+        self.hashes = {}
+        self.ips = {}
+        self.ports = {}
+        self.keywords = {}
+        self.automaton = KeywordAutomaton()
+        self.sources = []
+        self.skipped = 0
+        self._digest = hashlib.sha256()
+        self.rule_indicators = ((), ())  # 已加入的 (可疑进程名, 可疑端口)
+
+    def add(self, kind, value, source='manual'):
+        """添加一条情报，值格式不符时计入 skipped 并返回 False"""
+        kind = KIND_ALIASES.get(kind, kind)
+        if kind == 'name':
+            value = str(value).strip().lower()
+            table = self.names
+        elif kind == 'hash':
+            value = normalize_hash(str(value))
+            table = self.hashes
+        elif kind == 'ip':
+            value = normalize_ip(str(value))
+            table = self.ips
+        elif kind == 'port':
+            value = normalize_port(value)
+            table = self.ports
+        elif kind == 'keyword':
+            value = str(value).strip().lower()
+            table = self.keywords
+        else:
+            value = None
+        if not value:
+            self.skipped += 1
+            return False
+        if value not in table:
+            table[value] = source
+            if kind == 'keyword':
+                self.automaton.add(value)
+            self._digest.update(f'{kind}\0{value}\n'.encode('utf-8'))
+        return True
+
+    def load_file(self, file_path):
+        """加载一个情报文件，返回成功加载的条数"""
+        source = os.path.basename(file_path)
+        file_kind = kind_from_filename(file_path)
+        loaded = 0
+        with open(file_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+            for row in csv.reader(line.split('#', 1)[0] for line in f):
+                if not row or not row[0].strip():
+                    continue
+                value = row[0].strip()
+                kind = file_kind
+                prefix, sep, rest = value.partition(':')
+                if sep and prefix.lower() in KIND_ALIASES and rest:
+                    # 显式类型前缀；IPv6 地址本身含冒号，只有前缀是已知类型时才拆分
+                    kind, value = KIND_ALIASES[prefix.lower()], rest.strip()
+                if kind is None:
+                    kind = guess_kind(value)
+                if self.add(kind, value, source):
+                    loaded += 1
+        self.sources.append(source)
+        return loaded
+
+    def load_folder(self, folder):
+        """加载目录中的全部情报文件（按文件名排序，结果与加载顺序无关的版本号）"""
+        loaded = 0
+        if not folder or not os.path.isdir(folder):
+            return loaded
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(FEED_EXTENSIONS):
+                loaded += self.load_file(os.path.join(folder, filename))
+        self.compile()
+        return loaded
+
+    def with_rule_indicators(self, process_names, ports):
+        """返回加入检测规则中可疑进程名和端口的新匹配器（哈希、IP、关键字与原匹配器共享，
+        原匹配器不变，规则变化时可以从同一份情报重新生成）"""
+        matcher = IOCMatcher()
+        matcher.names = dict(self.names)
+        matcher.hashes = self.hashes
+        matcher.ips = self.ips
+        matcher.ports = dict(self.ports)
+        matcher.keywords = self.keywords
+        matcher.automaton = self.automaton
+        matcher.sources = list(self.sources)
+        matcher.skipped = self.skipped
+        matcher._digest = self._digest.copy()
+        for name in process_names:
+            matcher.add('name', name, RULE_SOURCE)
+        for port in ports:
+            matcher.add('port', port, RULE_SOURCE)
+        matcher.rule_indicators = (tuple(process_names), tuple(ports))
+        if process_names or ports:
+            matcher.sources.append(RULE_SOURCE)
+        return matcher
+
+    def compile(self):
+        """编译关键字自动机（添加情报后调用一次即可）"""
+        self.automaton.compile()
+        return self
+
+    @property
+    def version(self):
+        """情报内容指纹，情报变化时随之变化（可用于缓存失效）"""
+        return self._digest.hexdigest()[:12]
+
+    def match_name(self, name):
+        """进程名命中时返回情报来源，否则返回 None"""
+        if not name:
+            return None
+        return self.names.get(name.strip().lower())
+
+    def match_hash(self, file_hash):
+        """文件哈希命中时返回情报来源，否则返回 None"""
+        if not file_hash:
+            return None
+        return self.hashes.get(file_hash.strip().lower())
+
+    def match_ip(self, ip):
+        """IP 命中时返回情报来源，否则返回 None"""
+        if not ip or not self.ips:
+            return None
+        source = self.ips.get(ip)
+        if source is None:
+            normalized = normalize_ip(ip)
+            source = self.ips.get(normalized) if normalized else None
+        return source
+
+    def match_port(self, port):
+        """端口命中时返回情报来源，否则返回 None"""
+        try:
+            return self.ports.get(int(port))
+        except (TypeError, ValueError):
+            return None
+
+    def search_keywords(self, text):
+        """返回文本中出现的情报关键字列表"""
+        if not text or not self.keywords:
+            return []
+        return self.automaton.search(text)
+
+    def stats(self):
+        """各类情报的条数"""
+        return {
+            'names': len(self.names),
+            'hashes': len(self.hashes),
+            'ips': len(self.ips),
+            'ports': len(self.ports),
+            'keywords': len(self.keywords),
+            'skipped': self.skipped,
+            'sources': list(self.sources),
+            'version': self.version
+        }
+
+def find_feed_folder(folder=None):
+    """定位情报目录：参数 -> 环境变量 -> 当前目录 -> 项目根目录"""
+    candidates = [folder, os.environ.get(FEED_FOLDER_ENV), FEED_FOLDER_NAME,
+                  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), FEED_FOLDER_NAME)]
+    for candidate in candidates:
+        if candidate and os.path.isdir(candidate):
+            return candidate
+    return None
+
+def load_matcher(folder=None, process_names=(), ports=()):
+    """创建匹配器并加载情报目录，再加入检测规则中的可疑进程名和端口（RuleSet.suspicious_*）"""
+    matcher = IOCMatcher()
+    matcher.load_folder(find_feed_folder(folder))
+    return matcher.compile().with_rule_indicators(process_names, ports)
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - IP 地址分类与离线富化
+版本: 1.0
+用途: 把保留地址段、企业内网网段以及离线 ASN/地理位置/黑名单 CSV 编译为按起始地址
+      排序的不重叠整数区间，用二分查找在 O(log n) 内判断地址范围（内网/外网）并补充
+      ASN、国家和黑名单信息；查询结果按 IP 缓存（netstat 输出中同一批远程地址会反复出现）。
+      供 Web 服务器和 clientjiancha 中的收集脚本共用。
+
+离线数据目录（默认 ip_data/）中的 .csv/.tsv/.txt 文件按文件名区分类型：
+    asn*      网段,ASN,组织    （也支持 ip2asn 的 起始,结束,ASN,国家,组织 格式）
+    geo*/country*  网段,国家
+    block*/deny*   网段,说明
+网段可以是 CIDR、"起始-结束" 或单个地址；带表头的文件按列名识别
+（network/start/end/asn/org/country/description 及 MaxMind 风格的列名）。
+"""
+
+import os
+import csv
+import socket
+import bisect
+import hashlib
+import functools
+
+DATA_FOLDER_ENV = 'WINXY_IP_DATA'
+DATA_FOLDER_NAME = 'ip_data'
+DATA_EXTENSIONS = ('.csv', '.tsv', '.txt')
+IP_CACHE_SIZE = 65536  # 每个索引缓存的不同 IP 数
+
+# 保留地址段 -> 地址范围；不在其中、也不在企业内网网段中的地址视为外部地址
+RESERVED_RANGES = [
+    ('0.0.0.0/8', 'unspecified'),
+    ('10.0.0.0/8', 'private'),
+    ('100.64.0.0/10', 'shared'),
+    ('127.0.0.0/8', 'loopback'),
+    ('169.254.0.0/16', 'link_local'),
+    ('172.16.0.0/12', 'private'),
+    ('192.168.0.0/16', 'private'),
+    ('224.0.0.0/4', 'multicast'),
+    ('240.0.0.0/4', 'reserved'),
+    ('::/128', 'unspecified'),
+    ('::1/128', 'loopback'),
+    ('fc00::/7', 'private'),
+    ('fe80::/10', 'link_local'),
+    ('ff00::/8', 'multicast')
+]
+INTERNAL_SCOPE = 'internal'  # 配置的企业内网网段
+PUBLIC_SCOPE = 'public'
+
+# 数据文件名中出现的词 -> 数据类型
+DATA_FILE_KINDS = [
+    ('asn', 'asn'),
+    ('geo', 'geo'), ('country', 'geo'), ('location', 'geo'),
+    ('block', 'blocklist'), ('deny', 'blocklist'), ('bad', 'blocklist')
+]
+# 无表头时网段之后各列的含义
+DEFAULT_COLUMNS = {
+    'asn': ('asn', 'org'),
+    'geo': ('country',),
+    'blocklist': ('description',)
+}
+# 表头列名（小写） -> 字段
+HEADER_ALIASES = {
+    'network': 'network', 'cidr': 'network', 'prefix': 'network', 'ip': 'network', 'range': 'network',
+    'start': 'start', 'range_start': 'start', 'start_ip': 'start', 'ip_start': 'start',
+    'end': 'end', 'range_end': 'end', 'end_ip': 'end', 'ip_end': 'end',
+    'asn': 'asn', 'as_number': 'asn', 'autonomous_system_number': 'asn',
+    'org': 'org', 'organization': 'org', 'as_description': 'org', 'autonomous_system_organization': 'org',
+    'country': 'country', 'country_code': 'country', 'country_iso_code': 'country',
+    'description': 'description', 'comment': 'description', 'reason': 'description'
+}
+
+def ip_to_int(text):
+    """把 IP 文本转换为 (版本, 整数)，IPv4 映射的 IPv6 地址按 IPv4 处理；格式不符时返回 None"""
+    text = text.strip().strip('[]')
+    try:
+        if ':' in text:
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET6, text), 'big')
+            if value >> 32 == 0xFFFF:
+                return 4, value & 0xFFFFFFFF
+            return 6, value
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, text), 'big')
+    except (OSError, ValueError):
+        return None
+
+def parse_network(text):
+    """解析 CIDR、"起始-结束" 或单个地址，返回 (版本, 起始整数, 结束整数)；格式不符时返回 None"""
+    text = text.strip()
+    if '/' in text:
+        address, _, prefix = text.partition('/')
+        parsed = ip_to_int(address)
+        if parsed is None or not prefix.isdigit():
+            return None
+        version, value = parsed
+        bits = 32 if version == 4 and ':' not in address else 128
+        prefix = int(prefix)
+        if prefix > bits:
+            return None
+        if bits == 128 and version == 4:
+            # IPv4 映射地址的网段（::ffff:a.b.c.d/96 以上）
+            prefix = max(prefix - 96, 0)
+            bits = 32
+        host_bits = bits - prefix
+        start = value >> host_bits << host_bits
+        return version, start, start | ((1 << host_bits) - 1)
+    if '-' in text:
+        first, _, last = text.partition('-')
+        start, end = ip_to_int(first), ip_to_int(last)
+        if start is None or end is None or start[0] != end[0] or start[1] > end[1]:
+            return None
+        return start[0], start[1], end[1]
+    parsed = ip_to_int(text)
+    if parsed is None:
+        return None
+    return parsed[0], parsed[1], parsed[1]
+
+class RangeIndex:
+    """区间索引：重叠的网段展开为不重叠区间，更具体（更短）的网段优先，查询时二分查找"""
+
+    def __init__(self):
+        self.pending = {4: [], 6: []}
+        self.starts = {4: [], 6: []}
+        self.ends = {4: [], 6: []}
+        self.values = {4: [], 6: []}
+
+    def __len__(self):
+        return sum(len(items) for items in self.pending.values())
+
+    def add(self, network, value):
+        """添加一个网段（文本或 (版本, 起始, 结束)），返回是否有效"""
+        parsed = parse_network(network) if isinstance(network, str) else network
+        if parsed is None:
+            return False
+        version, start, end = parsed
+        self.pending[version].append((start, end, len(self.pending[version]), value))
+        return True
+
+    def compile(self):
+        """展开为不重叠区间；同一起点按范围从大到小处理，后出现的更小网段覆盖外层网段"""
+        for version, items in self.pending.items():
+            items.sort(key=lambda item: (item[0], -item[1], item[2]))
+            starts, ends, values = [], [], []
+
+            def emit(start, end, value):
+                if start <= end:
+                    starts.append(start)
+                    ends.append(end)
+                    values.append(value)
+
+            stack = []  # (结束, 值)，栈顶是当前最内层网段
+            cursor = 0
+            for start, end, _, value in items:
+                while stack and stack[-1][0] < start:
+                    outer_end, outer_value = stack.pop()
+                    if cursor <= outer_end:
+                        emit(cursor, outer_end, outer_value)
+                        cursor = outer_end + 1
+                if stack and cursor < start:
+                    emit(cursor, start - 1, stack[-1][1])
+                cursor = max(cursor, start)
+                stack.append((end, value))
+            while stack:
+                outer_end, outer_value = stack.pop()
+                if cursor <= outer_end:
+                    emit(cursor, outer_end, outer_value)
+                    cursor = outer_end + 1
+
+            self.starts[version], self.ends[version], self.values[version] = starts, ends, values
+        return self
+
+    def find(self, version, value):
+        """返回包含该地址的最具体网段的值，没有时返回 None"""
+        starts = self.starts[version]
+        index = bisect.bisect_right(starts, value) - 1
+        if index >= 0 and value <= self.ends[version][index]:
+            return self.values[version][index]
+        return None
+
+def kind_from_filename(filename):
+    """根据数据文件名推断类型，推断不出时返回 None"""
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    for word, kind in DATA_FILE_KINDS:
+        if word in stem:
+            return kind
+    return None
+
+def iter_data_rows(file_path, kind):
+    """逐行读取数据文件，产生 (网段文本, 字段字典)；文件格式按第一行判断"""
+    delimiter = '\t' if file_path.lower().endswith('.tsv') else ','
+    with open(file_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+        header = None
+        range_pairs = None  # 是否为 起始,结束,... 格式
+        for row in csv.reader(f, delimiter=delimiter):
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            cells = [cell.strip() for cell in row]
+            if range_pairs is None and header is None:
+                if parse_network(cells[0]) is None:
+                    # 第一列不是地址：视为表头
+                    header = [HEADER_ALIASES.get(cell.lower()) for cell in cells]
+                    continue
+                range_pairs = len(cells) > 1 and '/' not in cells[0] and parse_network(cells[1]) is not None
+                if range_pairs:
+                    # ip2asn 为 起始,结束,ASN,国家,组织
+                    columns = ('asn', 'country', 'org') if kind == 'asn' and len(cells) >= 5 else DEFAULT_COLUMNS[kind]
+                else:
+                    columns = DEFAULT_COLUMNS[kind]
+
+            if header:
+                fields = {name: cell for name, cell in zip(header, cells) if name and cell}
+                if 'network' in fields:
+                    network = fields['network']
+                elif 'start' in fields:
+                    network = f"{fields['start']}-{fields.get('end', fields['start'])}"
+                else:
+                    continue
+            elif range_pairs:
+                network = f'{cells[0]}-{cells[1]}'
+                fields = dict(zip(columns, cells[2:]))
+            else:
+                network = cells[0]
+                fields = dict(zip(columns, cells[1:]))
+            yield network, fields
+
+class IPIndex:
+    """IP 分类索引：地址范围（保留/企业内网/公网）+ ASN/国家/黑名单富化，结果按 IP 缓存
+
+    lookup() 返回的字典会被缓存复用，调用方不要修改。
+    """
+
+    def __init__(self, internal_networks=(), layers=None, version=None):
+        self.internal_networks = tuple(internal_networks)
+        self.scopes = RangeIndex()
+        for network, scope in RESERVED_RANGES:
+            self.scopes.add(network, scope)
+        for network in self.internal_networks:
+            self.scopes.add(network, INTERNAL_SCOPE)
+        self.scopes.compile()
+
+        # 富化数据量大，更换企业内网网段时在新旧索引间共享
+        self.layers = layers if layers is not None else {kind: RangeIndex() for kind in DEFAULT_COLUMNS}
+        self.sources = []
+        self._digest = hashlib.sha256()
+        self._version = version
+        self.lookup = functools.lru_cache(maxsize=IP_CACHE_SIZE)(self._lookup)
+
+    def with_internal_networks(self, internal_networks):
+        """返回使用新的企业内网网段、共享富化数据的新索引"""
+        index = IPIndex(internal_networks, self.layers, self.version)
+        index.sources = list(self.sources)
+        return index
+
+    def load_file(self, file_path):
+        """加载一个离线数据文件，返回有效记录数"""
+        kind = kind_from_filename(file_path)
+        if kind is None:
+            return 0
+        layer = self.layers[kind]
+        loaded = 0
+        for network, fields in iter_data_rows(file_path, kind):
+            if kind == 'asn':
+                asn = fields.get('asn', '').strip().upper()
+                if asn.startswith('AS'):
+                    asn = asn[2:]
+                if not asn.isdigit() or int(asn) == 0:
+                    continue  # 未分配/未路由的地址段
+                value = {'asn': int(asn), 'org': fields.get('org') or None}
+                if fields.get('country', 'None') not in ('None', 'ZZ', '-'):
+                    value['country'] = fields['country']
+            elif kind == 'geo':
+                value = fields.get('country') or None
+            else:
+                value = fields.get('description') or os.path.basename(file_path)
+            if layer.add(network, value):
+                loaded += 1
+
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                self._digest.update(chunk)
+        self._version = None
+        self.sources.append(os.path.basename(file_path))
+        return loaded
+
+    def load_folder(self, folder):
+        """加载目录中的全部离线数据文件并编译"""
+        loaded = 0
+        if folder and os.path.isdir(folder):
+            for filename in sorted(os.listdir(folder)):
+                if filename.lower().endswith(DATA_EXTENSIONS):
+                    loaded += self.load_file(os.path.join(folder, filename))
+        for layer in self.layers.values():
+            layer.compile()
+        self.lookup.cache_clear()
+        return loaded
+
+    @property
+    def version(self):
+        """离线数据指纹（企业内网网段来自 config.json，由规则版本覆盖）"""
+        if self._version is None:
+            self._version = self._digest.hexdigest()[:12]
+        return self._version
+
+    def _lookup(self, ip):
+        parsed = ip_to_int(ip)
+        if parsed is None:
+            return None
+        version, value = parsed
+        scope = self.scopes.find(version, value) or PUBLIC_SCOPE
+        info = {'scope': scope, 'external': scope == PUBLIC_SCOPE}
+        asn = self.layers['asn'].find(version, value)
+        if asn:
+            info.update(asn)
+        country = self.layers['geo'].find(version, value)
+        if country:
+            info['country'] = country
+        blocklist = self.layers['blocklist'].find(version, value)
+        if blocklist:
+            info['blocklist'] = blocklist
+        return info
+
+    def is_external(self, ip):
+        """是否为外部（公网）地址；无法解析的地址按外部地址处理"""
+        info = self.lookup(ip)
+        return info is None or info['external']
+
+def find_data_folder(folder=None):
+    """定位离线数据目录：参数 -> 环境变量 -> 当前目录 -> 项目根目录"""
+    candidates = [folder, os.environ.get(DATA_FOLDER_ENV), DATA_FOLDER_NAME,
+                  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_FOLDER_NAME)]
+    for candidate in candidates:
+        if candidate and os.path.isdir(candidate):
+            return candidate
+    return None
+
+def load_ip_index(internal_networks=(), folder=None):
+    """创建索引并加载离线数据目录（目录不存在时只做地址范围分类）"""
+    index = IPIndex(internal_networks)
+    index.load_folder(find_data_folder(folder))
+    return index
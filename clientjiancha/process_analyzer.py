@@ -9,25 +9,45 @@ Windows进程分析脚本 (Python版本)
 import os
 import sys
 import json
+import time
 import psutil
 import datetime
-import hashlib
 import subprocess
 from pathlib import Path
+from ioc_matcher import load_matcher
+from rule_engine import load_rules, load_performance_settings
+from ip_index import load_ip_index
+from hash_cache import HashCache
+from file_hasher import FileHasher
+from process_tree import ProcessTree
 
 class WindowsProcessAnalyzer:
-    def __init__(self):
+    def __init__(self, cpu_interval=None, hash_cache_file=None):
         self.timestamp = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         self.output_file = f"process_analysis_python_{self.timestamp}.json"
         self.text_file = f"process_analysis_python_{self.timestamp}.txt"
         
-        # 可疑进程名称列表
-        self.suspicious_names = [
-            'cmd.exe', 'powershell.exe', 'nc.exe', 'netcat.exe',
-            'psexec.exe', 'mimikatz.exe', 'procdump.exe', 'wce.exe',
-            'fgdump.exe', 'pwdump.exe', 'gsecdump.exe', 'cachedump.exe',
-            'lsadump.exe', 'pwdumpx.exe', 'servpw.exe', 'htool.exe'
-        ]
+        # 检测规则（评分权重、阈值和威胁等级来自 config.json）
+        self.rules = load_rules()
+        
+        # 威胁情报（情报目录 + config.json 中的可疑进程名和端口），加载一次后重复使用
+        self.ioc = load_matcher(process_names=self.rules.suspicious_process_names, ports=self.rules.suspicious_ports)
+        
+        # 收集参数（config.json 的 performance_settings：CPU 采样窗口、哈希缓存与并发、监控间隔）
+        self.settings = load_performance_settings()
+        
+        # IP 地址分类（保留地址段、企业内网网段）与离线 ASN/地理位置/黑名单数据
+        self.ip_index = load_ip_index(self.rules.internal_networks)
+        
+        # CPU 采样窗口（秒）：所有进程共用一个窗口，总耗时与进程数无关
+        self.cpu_interval = self.settings['cpu_sample_interval'] if cpu_interval is None else cpu_interval
+        
+        # 进程文件哈希缓存（按路径、大小、修改时间），空字符串表示只在本次运行中缓存
+        self.hash_cache = HashCache(self.settings['hash_cache_file'] if hash_cache_file is None else hash_cache_file)
+        
+        # MD5/SHA-1/SHA-256 一遍读取计算，有界线程池并发，超过大小上限或时限的文件跳过
+        self.hasher = FileHasher(self.hash_cache, workers=self.settings['hash_workers'],
+                                 max_bytes=self.settings['hash_max_bytes'], timeout=self.settings['hash_timeout'])
         
         # 可疑路径
         self.suspicious_paths = [
@@ -43,25 +63,26 @@ class WindowsProcessAnalyzer:
             }
         }
     
-    def get_process_hash(self, exe_path):
-        """计算进程文件的哈希值"""
-        try:
-            if os.path.exists(exe_path):
-                with open(exe_path, 'rb') as f:
-                    content = f.read()
-                    return hashlib.md5(content).hexdigest()
-        except:
-            pass
-        return None
-    
     def is_suspicious_process(self, proc_info):
         """判断进程是否可疑"""
         suspicious_reasons = []
         
         # 检查进程名称
-        if proc_info['name'] and proc_info['name'].lower() in [s.lower() for s in self.suspicious_names]:
+        if self.ioc.match_name(proc_info['name']):
             suspicious_reasons.append(f"可疑进程名称: {proc_info['name']}")
         
+        # 检查文件哈希（MD5、SHA-1、SHA-256 任一命中即可）
+        for file_hash in (proc_info['file_hashes'] or {}).values():
+            source = self.ioc.match_hash(file_hash)
+            if source:
+                suspicious_reasons.append(f"文件哈希命中威胁情报: {file_hash} ({source})")
+                break
+        
+        # 检查命令行关键字
+        keywords = self.ioc.search_keywords(proc_info['cmdline'])
+        if keywords:
+            suspicious_reasons.append(f"命令行命中威胁情报关键字: {', '.join(keywords)}")
+        
         # 检查进程路径
         if proc_info['exe_path']:
             path_lower = proc_info['exe_path'].lower()
@@ -84,6 +105,80 @@ class WindowsProcessAnalyzer:
         
         return suspicious_reasons
     
+    def process_info(self, info):
+        """psutil 进程属性字典 -> 进程信息（CPU 使用率和文件哈希稍后填入）"""
+        return {
+            'pid': info['pid'],
+            'ppid': info['ppid'],
+            'name': info['name'],
+            'username': info['username'],
+            'cmdline': ' '.join(info['cmdline']) if info['cmdline'] else '',
+            'create_time': datetime.datetime.fromtimestamp(info['create_time']).isoformat() if info['create_time'] else None,
+            'memory_mb': info['memory_info'].rss / 1024 / 1024 if info['memory_info'] else 0,
+            'cpu_percent': 0.0,
+            'exe_path': info['exe'],
+            'file_hash': None,
+            'file_hashes': None,
+            'hash_error': None,
+            'suspicious': False,
+            'suspicious_reasons': []
+        }
+    
+    def apply_hashes(self, proc_infos):
+        """批量计算进程文件哈希并填入进程信息（相同文件只计算一次）"""
+        hashes = self.hasher.hash_files([proc_info['exe_path'] for proc_info in proc_infos if proc_info['exe_path']])
+        for proc_info in proc_infos:
+            digests = hashes.get(proc_info['exe_path'])
+            if digests is None:
+                continue
+            if 'error' in digests:
+                proc_info['hash_error'] = digests['error']
+            else:
+                proc_info['file_hashes'] = digests
+                proc_info['file_hash'] = digests['md5']
+    
+    def connection_reason(self, raddr):
+        """外部连接命中威胁情报IP、黑名单或可疑端口时返回原因，否则返回 None"""
+        ip_info = self.ip_index.lookup(raddr.ip)
+        if not ip_info or not ip_info['external']:
+            return None
+        if self.ioc.match_ip(raddr.ip):
+            return f'威胁情报IP: {raddr.ip}'
+        if ip_info.get('blocklist'):
+            return f"黑名单IP: {raddr.ip} ({ip_info['blocklist']})"
+        if self.ioc.match_port(raddr.port):
+            return f'可疑端口: {raddr.port}'
+        return None
+    
+    def collect_processes(self):
+        """遍历一次进程，返回 [(进程对象, 进程信息)]
+
+        读取 cpu_percent 属性即为每个进程记录 CPU 时间基准（psutil 首次调用不等待、返回 0），
+        实际使用率在采样窗口结束后由 sample_cpu_percent 统一读取。
+        """
+        collected = []
+        for proc in psutil.process_iter(['pid', 'ppid', 'name', 'username', 'cmdline', 
+                                       'create_time', 'memory_info', 'cpu_percent', 'exe']):
+            try:
+                collected.append((proc, self.process_info(proc.info)))
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+        return collected
+    
+    def sample_cpu_percent(self, collected, deadline):
+        """等到采样窗口结束（deadline，monotonic 时间）后一起读取所有进程的 CPU 使用率
+
+        所有进程的数值来自同一个窗口；窗口内退出或无权读取的进程保留 0。
+        """
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        for proc, proc_info in collected:
+            try:
+                proc_info['cpu_percent'] = proc.cpu_percent(interval=None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+    
     def analyze_processes(self):
         """分析所有进程"""
         print("[1/8] 收集进程信息...")
@@ -93,56 +188,40 @@ class WindowsProcessAnalyzer:
         high_memory_processes = []
         high_cpu_processes = []
         
-        for proc in psutil.process_iter(['pid', 'ppid', 'name', 'username', 'cmdline', 
-                                       'create_time', 'memory_info', 'cpu_percent', 'exe']):
-            try:
-                # 获取CPU使用率（需要短暂等待）
-                cpu_percent = proc.cpu_percent(interval=0.1)
-                
-                proc_info = {
-                    'pid': proc.info['pid'],
-                    'ppid': proc.info['ppid'],
-                    'name': proc.info['name'],
-                    'username': proc.info['username'],
-                    'cmdline': ' '.join(proc.info['cmdline']) if proc.info['cmdline'] else '',
-                    'create_time': datetime.datetime.fromtimestamp(proc.info['create_time']).isoformat(),
-                    'memory_mb': proc.info['memory_info'].rss / 1024 / 1024 if proc.info['memory_info'] else 0,
-                    'cpu_percent': cpu_percent,
-                    'exe_path': proc.info['exe'],
-                    'file_hash': None,
-                    'suspicious': False,
-                    'suspicious_reasons': []
-                }
-                
-                # 计算文件哈希
-                if proc_info['exe_path']:
-                    proc_info['file_hash'] = self.get_process_hash(proc_info['exe_path'])
-                
-                # 检查是否可疑
-                suspicious_reasons = self.is_suspicious_process(proc_info)
-                if suspicious_reasons:
-                    proc_info['suspicious'] = True
-                    proc_info['suspicious_reasons'] = suspicious_reasons
-                    suspicious_processes.append(proc_info)
-                
-                # 高内存使用进程
-                if proc_info['memory_mb'] > 500:
-                    high_memory_processes.append(proc_info)
-                
-                # 高CPU使用进程
-                if proc_info['cpu_percent'] > 50:
-                    high_cpu_processes.append(proc_info)
-                
-                processes.append(proc_info)
-                
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                continue
+        collected = self.collect_processes()
+        deadline = time.monotonic() + self.cpu_interval
+        
+        # 计算文件哈希（在 CPU 采样窗口内进行，不额外占用时间）
+        self.apply_hashes([proc_info for _, proc_info in collected])
+        
+        self.sample_cpu_percent(collected, deadline)
+        self.hash_cache.flush()
+        
+        for _, proc_info in collected:
+            # 检查是否可疑
+            suspicious_reasons = self.is_suspicious_process(proc_info)
+            if suspicious_reasons:
+                proc_info['suspicious'] = True
+                proc_info['suspicious_reasons'] = suspicious_reasons
+                suspicious_processes.append(proc_info)
+            
+            # 高内存使用进程
+            if proc_info['memory_mb'] > 500:
+                high_memory_processes.append(proc_info)
+            
+            # 高CPU使用进程
+            if proc_info['cpu_percent'] > 50:
+                high_cpu_processes.append(proc_info)
+            
+            processes.append(proc_info)
         
         # 按内存使用排序
         high_memory_processes.sort(key=lambda x: x['memory_mb'], reverse=True)
         high_cpu_processes.sort(key=lambda x: x['cpu_percent'], reverse=True)
         
         self.data['process_analysis'] = {
+            'cpu_sample_interval': self.cpu_interval,
+            'hash_cache': dict(self.hash_cache.stats(), skipped=self.hasher.skipped),
             'total_processes': len(processes),
             'suspicious_count': len(suspicious_processes),
             'high_memory_count': len(high_memory_processes),
@@ -157,29 +236,18 @@ class WindowsProcessAnalyzer:
         """分析进程树结构"""
         print("[2/8] 分析进程树结构...")
         
-        process_tree = {}
-        orphan_processes = []
+        # 一次遍历建立 pid 索引，孤儿判定和父子关系检查都是查表
+        self.process_tree = ProcessTree(self.data['process_analysis']['processes'])
+        orphan_processes = self.process_tree.orphans()
+        anomalies = self.process_tree.find_anomalies()
         
-        # 构建进程树
-        for proc_info in self.data['process_analysis']['processes']:
-            pid = proc_info['pid']
-            ppid = proc_info['ppid']
-            
-            if ppid not in process_tree:
-                process_tree[ppid] = []
-            process_tree[ppid].append(proc_info)
-            
-            # 检查孤儿进程
-            if ppid != 0:
-                parent_exists = any(p['pid'] == ppid for p in self.data['process_analysis']['processes'])
-                if not parent_exists:
-                    orphan_processes.append(proc_info)
-        
-        self.data['process_tree'] = {
-            'tree_structure': process_tree,
+        # 树结构和孤儿列表只引用 pid，进程详情见 process_analysis.processes
+        self.data['process_tree'] = dict(self.process_tree.summary(), **{
             'orphan_processes': orphan_processes,
-            'orphan_count': len(orphan_processes)
-        }
+            'orphan_count': len(orphan_processes),
+            'parent_child_anomalies': anomalies,
+            'parent_child_anomaly_count': len(anomalies)
+        })
     
     def analyze_network_processes(self):
         """分析有网络连接的进程"""
@@ -219,17 +287,15 @@ class WindowsProcessAnalyzer:
                     
                     network_processes[conn.pid]['connections'].append(conn_info)
                     
-                    # 检查可疑连接
-                    if conn.raddr and not conn.raddr.ip.startswith(('127.', '0.0.0.0')):
-                        # 检查可疑端口
-                        suspicious_ports = [4444, 6666, 1337, 31337, 8080, 9999, 12345, 54321]
-                        if conn.raddr.port in suspicious_ports:
-                            suspicious_connections.append({
-                                'pid': conn.pid,
-                                'process_name': network_processes[conn.pid]['name'],
-                                'connection': conn_info,
-                                'reason': f'可疑端口: {conn.raddr.port}'
-                            })
+                    # 检查可疑连接（仅针对外部地址：威胁情报IP、黑名单和可疑端口）
+                    reason = self.connection_reason(conn.raddr) if conn.raddr else None
+                    if reason:
+                        suspicious_connections.append({
+                            'pid': conn.pid,
+                            'process_name': network_processes[conn.pid]['name'],
+                            'connection': conn_info,
+                            'reason': reason
+                        })
         
         except Exception as e:
             print(f"分析网络连接时出错: {e}")
@@ -253,6 +319,8 @@ class WindowsProcessAnalyzer:
         recent_processes = []
         
         for proc_info in self.data['process_analysis']['processes']:
+            if not proc_info['create_time']:
+                continue  # 无权读取创建时间
             create_time = datetime.datetime.fromisoformat(proc_info['create_time'])
             
             # 启动后5分钟内创建的进程
@@ -335,77 +403,26 @@ class WindowsProcessAnalyzer:
         """生成威胁评估"""
         print("[7/8] 生成威胁评估...")
         
-        threat_score = 0
-        threats = []
-        
-        # 可疑进程评分
-        suspicious_count = self.data['process_analysis']['suspicious_count']
-        if suspicious_count > 0:
-            threat_score += suspicious_count * 25
-            threats.append(f"发现 {suspicious_count} 个可疑进程")
-        
-        # 可疑网络连接评分
-        suspicious_conn_count = self.data['network_analysis']['suspicious_connection_count']
-        if suspicious_conn_count > 0:
-            threat_score += suspicious_conn_count * 30
-            threats.append(f"发现 {suspicious_conn_count} 个可疑网络连接")
-        
-        # 孤儿进程评分
-        orphan_count = self.data['process_tree']['orphan_count']
-        if orphan_count > 5:
-            threat_score += 15
-            threats.append(f"发现 {orphan_count} 个孤儿进程")
-        
-        # 高内存使用评分
-        high_memory_count = self.data['process_analysis']['high_memory_count']
-        if high_memory_count > 10:
-            threat_score += 10
-            threats.append(f"发现 {high_memory_count} 个高内存使用进程")
-        
-        # 确定威胁等级
-        if threat_score >= 80:
-            threat_level = "严重"
-        elif threat_score >= 50:
-            threat_level = "高"
-        elif threat_score >= 20:
-            threat_level = "中"
-        else:
-            threat_level = "低"
+        # 按 config.json 中的检测规则评分并确定威胁等级
+        assessment = self.rules.assess({
+            'suspicious_processes': self.data['process_analysis']['suspicious_count'],
+            'suspicious_connections': self.data['network_analysis']['suspicious_connection_count'],
+            'orphan_processes': self.data['process_tree']['orphan_count'],
+            'parent_child_anomalies': self.data['process_tree']['parent_child_anomaly_count'],
+            'high_memory_processes': self.data['process_analysis']['high_memory_count']
+        })
         
         self.data['threat_assessment'] = {
-            'threat_level': threat_level,
-            'threat_score': threat_score,
-            'threats': threats,
-            'recommendations': self.generate_recommendations(threats)
+            'threat_level': assessment['level'],
+            'threat_score': assessment['score'],
+            'threats': assessment['issues'],
+            'recommendations': self.generate_recommendations(assessment['findings']),
+            'ruleset_version': self.rules.version
         }
     
-    def generate_recommendations(self, threats):
+    def generate_recommendations(self, findings):
         """生成安全建议"""
-        recommendations = []
-        
-        if any('可疑进程' in threat for threat in threats):
-            recommendations.append({
-                'priority': 'High',
-                'category': '进程安全',
-                'description': '立即检查可疑进程的合法性',
-                'action': '使用 tasklist /v 查看详细信息，必要时使用 taskkill 终止'
-            })
-        
-        if any('可疑网络连接' in threat for threat in threats):
-            recommendations.append({
-                'priority': 'High',
-                'category': '网络安全',
-                'description': '检查可疑网络连接',
-                'action': '使用 netstat -ano 查看连接详情，考虑阻断可疑IP'
-            })
-        
-        if any('孤儿进程' in threat for threat in threats):
-            recommendations.append({
-                'priority': 'Medium',
-                'category': '进程管理',
-                'description': '检查孤儿进程的来源',
-                'action': '分析进程创建时间和路径，确认合法性'
-            })
+        recommendations = self.rules.recommendations(findings)
         
         # 通用建议
         recommendations.extend([
@@ -447,7 +464,8 @@ class WindowsProcessAnalyzer:
             f.write(f"- 高内存使用进程: {self.data['process_analysis']['high_memory_count']}\n")
             f.write(f"- 高CPU使用进程: {self.data['process_analysis']['high_cpu_count']}\n")
             f.write(f"- 网络连接进程: {self.data['network_analysis']['network_process_count']}\n")
-            f.write(f"- 可疑网络连接: {self.data['network_analysis']['suspicious_connection_count']}\n\n")
+            f.write(f"- 可疑网络连接: {self.data['network_analysis']['suspicious_connection_count']}\n")
+            f.write(f"- 异常父子进程关系: {self.data['process_tree']['parent_child_anomaly_count']}\n\n")
             
             # 威胁评估
             f.write("威胁评估:\n")
@@ -471,6 +489,14 @@ class WindowsProcessAnalyzer:
                     f.write(f"  内存: {proc['memory_mb']:.2f}MB\n")
                     f.write(f"  可疑原因: {', '.join(proc['suspicious_reasons'])}\n\n")
             
+            # 异常父子进程关系
+            if self.data['process_tree']['parent_child_anomalies']:
+                f.write("异常父子进程关系:\n")
+                for anomaly in self.data['process_tree']['parent_child_anomalies']:
+                    f.write(f"- {anomaly['description']}\n")
+                    f.write(f"  进程链: {anomaly['lineage']}\n")
+                    f.write(f"  路径: {anomaly['exe_path']}\n\n")
+            
             # 安全建议
             f.write("安全建议:\n")
             for rec in self.data['threat_assessment']['recommendations']:
@@ -514,6 +540,9 @@ class WindowsProcessAnalyzer:
         except Exception as e:
             print(f"\n[错误] 分析过程中发生错误: {str(e)}")
             return False
+        
+        finally:
+            self.hash_cache.close()
 
 def main():
     """主函数"""
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows进程持续监控脚本 (Python版本)
+版本: 1.0
+用途: 在可疑主机上长时间运行，按固定间隔轮询进程和网络连接，只输出变化：
+      新进程、退出的进程、新建和关闭的外部连接，每个事件一行 JSON（NDJSON）。
+      上一次的快照保存在内存中，轮询时只读取 pid、父进程、名称和创建时间；
+      命令行、文件哈希、可疑判定和父子关系检查只对新进程执行，空闲主机上几乎没有额外开销。
+"""
+
+import os
+import sys
+import json
+import time
+import psutil
+import argparse
+import datetime
+from process_analyzer import WindowsProcessAnalyzer
+from process_tree import ProcessTree
+
+# 每次轮询读取的轻量属性（用于判断进程是否变化）与新进程补充读取的属性
+SNAPSHOT_ATTRS = ['pid', 'ppid', 'name', 'create_time']
+ENRICH_ATTRS = ['username', 'cmdline', 'memory_info', 'exe']
+
+class ProcessMonitor:
+    """增量进程监控：analyzer 提供威胁情报、检测规则和文件哈希（WindowsProcessAnalyzer）
+
+    进程以 (pid, 创建时间) 标识，pid 被系统复用时视为新进程。
+    """
+
+    def __init__(self, analyzer, interval, output, track_connections=True):
+        self.analyzer = analyzer
+        self.interval = interval
+        self.output = output
+        self.track_connections = track_connections
+        self.processes = {}  # (pid, 创建时间) -> 轻量进程信息
+        self.connections = {}  # (pid, 本地地址, 远程地址) -> 连接信息
+        self.event_count = 0
+
+    def snapshot_processes(self):
+        """读取当前进程的轻量信息 {(pid, 创建时间): 信息}"""
+        snapshot = {}
+        for proc in psutil.process_iter(SNAPSHOT_ATTRS):
+            info = proc.info
+            snapshot[(info['pid'], info['create_time'])] = info
+        return snapshot
+
+    def snapshot_connections(self, names):
+        """读取当前已建立的外部连接 {(pid, 本地地址, 远程地址): 信息}，无权读取时关闭连接跟踪"""
+        try:
+            connections = psutil.net_connections(kind='inet')
+        except (psutil.AccessDenied, OSError) as e:
+            self.track_connections = False
+            self.emit('warning', message=f'无法读取网络连接，停止跟踪连接变化: {e}')
+            return {}
+        snapshot = {}
+        for conn in connections:
+            if not conn.pid or not conn.raddr or conn.status != 'ESTABLISHED':
+                continue
+            local = f"{conn.laddr.ip}:{conn.laddr.port}" if conn.laddr else None
+            remote = f"{conn.raddr.ip}:{conn.raddr.port}"
+            snapshot[(conn.pid, local, remote)] = {
+                'pid': conn.pid,
+                'process_name': names.get(conn.pid),
+                'local_address': local,
+                'remote_address': remote,
+                'raddr': conn.raddr
+            }
+        return snapshot
+
+    def enrich(self, info):
+        """读取新进程的完整信息（进程已退出或无权读取的属性为空）"""
+        try:
+            extra = psutil.Process(info['pid']).as_dict(ENRICH_ATTRS)
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            extra = dict.fromkeys(ENRICH_ATTRS)
+        return self.analyzer.process_info(dict(info, **extra))
+
+    def emit(self, event, **fields):
+        """写出一个事件（一行 JSON）"""
+        record = {'event': event, 'time': datetime.datetime.now().isoformat()}
+        record.update(fields)
+        self.output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.event_count += 1
+
+    def baseline(self):
+        """记录初始快照（已有进程不补充信息，完整分析请使用 process_analyzer.py）"""
+        self.processes = self.snapshot_processes()
+        names = {info['pid']: info['name'] for info in self.processes.values()}
+        if self.track_connections:
+            self.connections = self.snapshot_connections(names)
+        self.emit('baseline', process_count=len(self.processes), connection_count=len(self.connections),
+                  interval=self.interval)
+        self.output.flush()
+
+    def poll(self):
+        """轮询一次，输出与上次快照相比的变化，返回事件数"""
+        start_count = self.event_count
+        current = self.snapshot_processes()
+        started = [key for key in current if key not in self.processes]
+        exited = [key for key in self.processes if key not in current]
+
+        if started:
+            enriched = {key: self.enrich(current[key]) for key in started}
+            self.analyzer.apply_hashes(list(enriched.values()))
+            self.analyzer.hash_cache.flush()
+
+            # 父子关系检查：新进程的记录带有映像路径，其余进程只需要名称和创建时间
+            # （创建时间统一使用快照中的时间戳，用于识别被复用的父进程 pid）
+            records = [dict(enriched[key], create_time=key[1]) if key in enriched else info
+                       for key, info in current.items()]
+            tree = ProcessTree(records)
+            anomalies = {}
+            for anomaly in tree.find_anomalies(pids=[pid for pid, _ in started]):
+                anomalies.setdefault(anomaly['pid'], []).append(anomaly)
+
+            for key in started:
+                proc_info = enriched[key]
+                proc_info['suspicious_reasons'] = self.analyzer.is_suspicious_process(proc_info)
+                proc_info['suspicious'] = bool(proc_info['suspicious_reasons'])
+                proc_info['parent_child_anomalies'] = anomalies.get(proc_info['pid'], [])
+                proc_info['lineage'] = tree.lineage(proc_info['pid'])
+                self.emit('process_started', **proc_info)
+
+        for key in exited:
+            info = self.processes[key]
+            self.emit('process_exited', pid=info['pid'], ppid=info['ppid'], name=info['name'],
+                      create_time=datetime.datetime.fromtimestamp(info['create_time']).isoformat() if info['create_time'] else None)
+
+        self.processes = current
+
+        if self.track_connections:
+            names = {info['pid']: info['name'] for info in current.values()}
+            connections = self.snapshot_connections(names)
+            for key, conn in connections.items():
+                if key not in self.connections:
+                    raddr = conn.pop('raddr')
+                    self.emit('connection_opened', reason=self.analyzer.connection_reason(raddr), **conn)
+            for key, conn in self.connections.items():
+                if key not in connections:
+                    conn.pop('raddr', None)
+                    self.emit('connection_closed', **conn)
+            self.connections = connections
+
+        self.output.flush()
+        return self.event_count - start_count
+
+    def run(self, duration=None):
+        """持续轮询，duration 秒后（None 表示直到 Ctrl+C）停止"""
+        self.baseline()
+        started = time.monotonic()
+        next_poll = started + self.interval
+        try:
+            while duration is None or time.monotonic() - started < duration:
+                time.sleep(max(0.0, next_poll - time.monotonic()))
+                self.poll()
+                # 轮询耗时超过间隔时不补做错过的轮询
+                next_poll = max(next_poll + self.interval, time.monotonic())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.emit('stopped', event_count=self.event_count)
+            self.output.flush()
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='Windows进程持续监控 - 以 NDJSON 输出进程和连接变化')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='轮询间隔（秒），默认取 config.json 的 performance_settings.monitor_interval_seconds')
+    parser.add_argument('--duration', type=float, default=None, help='监控时长（秒），默认直到 Ctrl+C')
+    parser.add_argument('--output', default=None, help='事件输出文件，- 表示标准输出，默认 process_monitor_<时间>.ndjson')
+    parser.add_argument('--no-connections', action='store_true', help='不跟踪网络连接变化')
+    args = parser.parse_args()
+
+    if os.name != 'nt':
+        print("[警告] 此脚本面向Windows系统，其他系统上的检测规则可能不适用", file=sys.stderr)
+
+    analyzer = WindowsProcessAnalyzer()
+    interval = args.interval if args.interval is not None else analyzer.settings['monitor_interval']
+    output_path = args.output or f"process_monitor_{analyzer.timestamp}.ndjson"
+    output = sys.stdout if output_path == '-' else open(output_path, 'a', encoding='utf-8')
+
+    print(f"开始监控进程变化，间隔 {interval} 秒，事件写入 {output_path}，按 Ctrl+C 停止", file=sys.stderr)
+    try:
+        ProcessMonitor(analyzer, interval, output, track_connections=not args.no_connections).run(args.duration)
+    finally:
+        analyzer.hash_cache.close()
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 进程树索引与父子关系检测
+版本: 1.0
+用途: 一次遍历建立 pid -> 进程记录 与 pid -> 子进程 两个索引，祖先链、深度、子树查询
+      都只沿树走必要的节点，孤儿进程判定为 O(1) 查表。输出只引用 pid，不复制进程记录。
+      在索引之上按进程名检查常见的可疑父子关系（Office 启动 PowerShell、
+      services.exe 启动系统目录外的程序、svchost.exe 的父进程不是 services.exe 等）。
+"""
+
+import ntpath
+
+# 常见的可疑父子关系。每条规则按进程名（小写）匹配：
+#   parents/children: 父/子进程名集合，None 表示不限
+#   expected_parents: 子进程的父进程不在此集合中时触发（用于固定由某个系统进程启动的程序）
+#   allowed_dirs: 子进程映像不在这些目录（小写，不含盘符）下时触发
+OFFICE_APPS = {'winword.exe', 'excel.exe', 'powerpnt.exe', 'outlook.exe', 'msaccess.exe',
+               'mspub.exe', 'onenote.exe', 'visio.exe'}
+BROWSERS = {'chrome.exe', 'msedge.exe', 'firefox.exe', 'iexplore.exe', 'opera.exe', 'brave.exe'}
+SHELLS_AND_LOLBINS = {'cmd.exe', 'powershell.exe', 'pwsh.exe', 'wscript.exe', 'cscript.exe',
+                      'mshta.exe', 'rundll32.exe', 'regsvr32.exe', 'certutil.exe', 'bitsadmin.exe',
+                      'msbuild.exe', 'installutil.exe'}
+
+PARENT_CHILD_RULES = [
+    {
+        'name': 'office_spawns_shell',
+        'parents': OFFICE_APPS,
+        'children': SHELLS_AND_LOLBINS,
+        'description': 'Office 程序启动了命令解释器或脚本宿主（常见于恶意宏）'
+    },
+    {
+        'name': 'browser_spawns_shell',
+        'parents': BROWSERS,
+        'children': SHELLS_AND_LOLBINS,
+        'description': '浏览器启动了命令解释器或脚本宿主（可能是漏洞利用）'
+    },
+    {
+        'name': 'service_outside_system_dirs',
+        'parents': {'services.exe'},
+        'children': None,
+        'allowed_dirs': ('\\windows\\system32\\', '\\windows\\syswow64\\',
+                         '\\program files\\', '\\program files (x86)\\'),
+        'description': 'services.exe 启动了系统目录和程序目录之外的程序'
+    },
+    {
+        'name': 'svchost_unexpected_parent',
+        'parents': None,
+        'children': {'svchost.exe'},
+        'expected_parents': {'services.exe', 'svchost.exe'},
+        'description': 'svchost.exe 的父进程不是 services.exe（可能是伪装进程）'
+    },
+    {
+        'name': 'lsass_unexpected_parent',
+        'parents': None,
+        'children': {'lsass.exe'},
+        'expected_parents': {'wininit.exe'},
+        'description': 'lsass.exe 的父进程不是 wininit.exe（可能是伪装进程）'
+    }
+]
+
+def process_name(record):
+    """进程名（小写），缺失时为空字符串"""
+    return (record.get('name') or '').lower()
+
+class ProcessTree:
+    """进程树索引（records 为进程信息字典列表，至少包含 pid、ppid，可选 name、exe_path、create_time）
+
+    父进程不存在、父子 pid 相同，或父进程创建时间晚于子进程（父 pid 已被系统复用）时，
+    该进程视为根节点；ppid 不为 0 的根节点即孤儿进程。
+    """
+
+    def __init__(self, records):
+        self.records = {}
+        for record in records:
+            self.records[record['pid']] = record
+        self.parents = {}  # pid -> 有效的父进程 pid
+        self.children = {pid: [] for pid in self.records}
+        self.roots = []
+        for pid, record in self.records.items():
+            ppid = record.get('ppid')
+            parent = self.records.get(ppid)
+            if parent is None or ppid == pid or self._reused(parent, record):
+                self.roots.append(pid)
+            else:
+                self.parents[pid] = ppid
+                self.children[ppid].append(pid)
+
+        # 从根节点向下计算深度；成环的进程（pid 复用造成）不可达，按根节点处理
+        self.depths = {}
+        stack = [(pid, 0) for pid in self.roots]
+        while stack:
+            pid, depth = stack.pop()
+            self.depths[pid] = depth
+            stack.extend((child, depth + 1) for child in self.children[pid])
+        for pid in self.records:
+            if pid not in self.depths:
+                self.roots.append(pid)
+                self.children[self.parents.pop(pid)].remove(pid)
+                stack.append((pid, 0))
+                while stack:
+                    node, depth = stack.pop()
+                    self.depths[node] = depth
+                    stack.extend((child, depth + 1) for child in self.children[node])
+
+    @staticmethod
+    def _reused(parent, child):
+        """父进程创建时间晚于子进程：原父进程已退出，pid 被复用"""
+        parent_time, child_time = parent.get('create_time'), child.get('create_time')
+        return bool(parent_time and child_time) and parent_time > child_time
+
+    def parent(self, pid):
+        """父进程记录，没有时返回 None"""
+        ppid = self.parents.get(pid)
+        return None if ppid is None else self.records[ppid]
+
+    def ancestors(self, pid):
+        """祖先 pid 列表，从父进程到根节点"""
+        chain = []
+        while pid in self.parents:
+            pid = self.parents[pid]
+            chain.append(pid)
+        return chain
+
+    def depth(self, pid):
+        """深度，根节点为 0"""
+        return self.depths[pid]
+
+    def subtree(self, pid):
+        """以 pid 为根的子树中全部 pid（含自身，先序）"""
+        result = []
+        stack = [pid]
+        while stack:
+            node = stack.pop()
+            result.append(node)
+            stack.extend(reversed(self.children[node]))
+        return result
+
+    def orphans(self):
+        """父进程已不存在的进程 pid（ppid 为 0 的系统进程除外）"""
+        return [pid for pid in self.roots if self.records[pid].get('ppid')]
+
+    def lineage(self, pid):
+        """可读的祖先链：根节点在前，例如 'explorer.exe(1234) > winword.exe(5678)'"""
+        chain = [pid] + self.ancestors(pid)
+        return ' > '.join(f"{self.records[node].get('name')}({node})" for node in reversed(chain))
+
+    def find_anomalies(self, rules=PARENT_CHILD_RULES, pids=None):
+        """按父子关系规则检查每个进程（pids 不为 None 时只检查这些进程），
+        返回命中列表（每个进程每条规则最多一条）"""
+        by_child = {}
+        for rule in rules:
+            for name in rule['children'] or (None,):
+                by_child.setdefault(name, []).append(rule)
+
+        if pids is None:
+            pids = self.records
+        anomalies = []
+        for pid in pids:
+            record = self.records.get(pid)
+            if record is None:
+                continue
+            name = process_name(record)
+            candidates = by_child.get(name, []) + by_child.get(None, [])
+            if not candidates:
+                continue
+            parent = self.parent(pid)
+            parent_name = process_name(parent) if parent else ''
+            for rule in candidates:
+                if rule['parents'] is not None and parent_name not in rule['parents']:
+                    continue
+                if 'expected_parents' in rule and (parent is None or parent_name in rule['expected_parents']):
+                    continue
+                if 'allowed_dirs' in rule:
+                    exe_path = record.get('exe_path')
+                    if not exe_path:
+                        continue  # 无权读取路径时不做判断
+                    directory = ntpath.splitdrive(exe_path.lower())[1]
+                    if directory.startswith(rule['allowed_dirs']):
+                        continue
+                anomalies.append({
+                    'rule': rule['name'],
+                    'description': rule['description'],
+                    'pid': pid,
+                    'name': record.get('name'),
+                    'exe_path': record.get('exe_path'),
+                    'ppid': self.parents.get(pid),
+                    'parent_name': parent.get('name') if parent else None,
+                    'lineage': self.lineage(pid)
+                })
+        return anomalies
+
+    def summary(self):
+        """JSON 可序列化的树结构：只包含 pid 引用，进程详情见 process_analysis.processes"""
+        return {
+            'roots': self.roots,
+            'children': {pid: children for pid, children in self.children.items() if children},
+            'max_depth': max(self.depths.values(), default=0)
+        }
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 检测规则引擎
+版本: 1.0
+用途: 把 config.json 中的 detection_rules、threat_scoring、threat_levels 编译为
+      预先绑定阈值和权重的判定/计分函数，供 Web 服务器和 clientjiancha 中的收集脚本共用。
+      配置文件变化时自动重新编译并整体替换规则集，无需重启，也不在每次评估时解析配置。
+      收集脚本的采样参数（performance_settings）与检测规则无关，由 load_performance_settings 单独读取。
+"""
+
+import os
+import json
+import time
+import bisect
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONFIG_ENV = 'WINXY_CONFIG'
+CONFIG_FILE_NAME = 'config.json'
+RELOAD_CHECK_INTERVAL = 2.0  # 检查配置文件是否变化的最小间隔（秒）
+RULE_ENGINE_VERSION = '2'  # 规则定义（下面的 RULE_DEFINITIONS）变化时递增
+
+# 配置文件缺失或不完整时使用的默认值（与仓库中的 config.json 一致）
+DEFAULT_CONFIG = {
+    'analysis_settings': {
+        'threat_scoring': {
+            'suspicious_process_weight': 20,
+            'suspicious_connection_weight': 25,
+            'hidden_user_weight': 30,
+            'failed_login_weight': 1,
+            'external_connection_threshold': 10,
+            'external_connection_weight': 15,
+            'admin_user_threshold': 3,
+            'admin_user_weight': 10,
+            'orphan_process_threshold': 5,
+            'orphan_process_weight': 15,
+            'high_memory_process_threshold': 10,
+            'high_memory_process_weight': 10,
+            'parent_child_anomaly_weight': 25
+        },
+        'threat_levels': {
+            'low': {'min_score': 0, 'color': 'green'},
+            'medium': {'min_score': 20, 'color': 'yellow'},
+            'high': {'min_score': 50, 'color': 'orange'},
+            'critical': {'min_score': 80, 'color': 'red'}
+        }
+    },
+    'detection_rules': {
+        'suspicious_processes': {
+            'enabled': True,
+            'process_names': ['cmd.exe', 'powershell.exe', 'nc.exe', 'netcat.exe',
+                              'psexec.exe', 'mimikatz.exe', 'procdump.exe', 'wce.exe',
+                              'fgdump.exe', 'pwdump.exe', 'gsecdump.exe', 'cachedump.exe',
+                              'lsadump.exe', 'pwdumpx.exe', 'servpw.exe', 'htool.exe']
+        },
+        'suspicious_ports': {
+            'enabled': True,
+            'ports': [4444, 6666, 1337, 31337, 8080, 9999, 12345, 54321]
+        },
+        'failed_logins': {'enabled': True, 'threshold': 10}
+    },
+    'performance_settings': {
+        'cpu_sample_interval_seconds': 1.0,
+        'hash_cache_file': 'process_hash_cache.db',
+        'hash_workers': 4,
+        'hash_max_file_mb': 256,
+        'hash_timeout_seconds': 10,
+        'monitor_interval_seconds': 5
+    }
+}
+
+# 威胁等级键 -> 报告中显示的名称
+LEVEL_NAMES = {'low': '低', 'medium': '中', 'high': '高', 'critical': '严重'}
+
+# 规则定义：评估时由调用方提供指标字典，缺少某个指标的规则不参与评估。
+#   threshold: 阈值在配置中的路径（指标 > 阈值时触发），None 表示指标 > 0 即触发
+#   weight: 权重在 threat_scoring 中的键；per_item 为 True 时按数量乘以权重计分
+#   switch: detection_rules 中的开关键，开关 enabled 为 false 时规则不生效
+RULE_DEFINITIONS = [
+    {
+        'name': 'suspicious_processes',
+        'threshold': None,
+        'weight': 'suspicious_process_weight',
+        'per_item': True,
+        'switch': 'suspicious_processes',
+        'type': '可疑进程',
+        'severity': 'High',
+        'issue': '发现 {count} 个可疑进程',
+        'recommendation': {
+            'priority': 'High',
+            'category': '进程安全',
+            'description': '发现可疑进程，建议立即检查进程合法性',
+            'action': '使用 tasklist /v 查看详细进程信息，必要时使用 taskkill 终止可疑进程'
+        }
+    },
+    {
+        'name': 'external_connections',
+        'threshold': ('analysis_settings', 'threat_scoring', 'external_connection_threshold'),
+        'weight': 'external_connection_weight',
+        'per_item': False,
+        'switch': 'external_connections',
+        'type': '网络连接',
+        'severity': 'Medium',
+        'issue': '外部连接数量较多 ({count})',
+        'recommendation': None
+    },
+    {
+        'name': 'suspicious_connections',
+        'threshold': None,
+        'weight': 'suspicious_connection_weight',
+        'per_item': True,
+        'switch': 'suspicious_ports',
+        'type': '可疑网络连接',
+        'severity': 'High',
+        'issue': '发现 {count} 个可疑网络连接',
+        'recommendation': {
+            'priority': 'High',
+            'category': '网络安全',
+            'description': '发现可疑网络连接，可能存在恶意通信',
+            'action': '使用 netstat -ano 检查连接详情，考虑阻断可疑IP'
+        }
+    },
+    {
+        'name': 'admin_users',
+        'threshold': ('analysis_settings', 'threat_scoring', 'admin_user_threshold'),
+        'weight': 'admin_user_weight',
+        'per_item': False,
+        'switch': None,
+        'type': '用户管理',
+        'severity': 'Medium',
+        'issue': '管理员用户数量较多 ({count})',
+        'recommendation': {
+            'priority': 'Medium',
+            'category': '用户管理',
+            'description': '管理员账户数量较多，建议审查权限分配',
+            'action': '使用 net localgroup Administrators 检查管理员列表'
+        }
+    },
+    {
+        'name': 'failed_logins',
+        'threshold': ('detection_rules', 'failed_logins', 'threshold'),
+        'weight': 'failed_login_weight',
+        'per_item': True,
+        'switch': 'failed_logins',
+        'type': '登录失败',
+        'severity': 'Medium',
+        'issue': '失败登录尝试较多 ({count})',
+        'recommendation': {
+            'priority': 'Medium',
+            'category': '访问控制',
+            'description': '检测到多次登录失败，可能存在暴力破解攻击',
+            'action': '检查事件日志，考虑启用账户锁定策略'
+        }
+    },
+    {
+        'name': 'hidden_users',
+        'threshold': None,
+        'weight': 'hidden_user_weight',
+        'per_item': True,
+        'switch': 'hidden_users',
+        'type': '隐藏用户',
+        'severity': 'High',
+        'issue': '发现 {count} 个隐藏用户',
+        'recommendation': {
+            'priority': 'High',
+            'category': '用户管理',
+            'description': '发现隐藏用户账户，可能是攻击者留下的后门',
+            'action': '检查注册表 SpecialAccounts\\UserList 并使用 net user 核实账户'
+        }
+    },
+    {
+        'name': 'orphan_processes',
+        'threshold': ('analysis_settings', 'threat_scoring', 'orphan_process_threshold'),
+        'weight': 'orphan_process_weight',
+        'per_item': False,
+        'switch': None,
+        'type': '孤儿进程',
+        'severity': 'Medium',
+        'issue': '发现 {count} 个孤儿进程',
+        'recommendation': {
+            'priority': 'Medium',
+            'category': '进程管理',
+            'description': '检查孤儿进程的来源',
+            'action': '分析进程创建时间和路径，确认合法性'
+        }
+    },
+    {
+        'name': 'parent_child_anomalies',
+        'threshold': None,
+        'weight': 'parent_child_anomaly_weight',
+        'per_item': True,
+        'switch': 'parent_child_anomalies',
+        'type': '进程父子关系异常',
+        'severity': 'High',
+        'issue': '发现 {count} 个异常的父子进程关系',
+        'recommendation': {
+            'priority': 'High',
+            'category': '进程安全',
+            'description': '发现异常的父子进程关系，可能是恶意宏、漏洞利用或伪装的系统进程',
+            'action': '根据报告中的进程链检查父进程打开的文档和子进程命令行，确认后终止整个进程子树'
+        }
+    },
+    {
+        'name': 'high_memory_processes',
+        'threshold': ('analysis_settings', 'threat_scoring', 'high_memory_process_threshold'),
+        'weight': 'high_memory_process_weight',
+        'per_item': False,
+        'switch': None,
+        'type': '资源占用',
+        'severity': 'Low',
+        'issue': '发现 {count} 个高内存使用进程',
+        'recommendation': None
+    }
+]
+
+def config_value(config, path, default=None):
+    """按路径读取配置，缺失时回退到 DEFAULT_CONFIG，再回退到 default"""
+    for source in (config, DEFAULT_CONFIG):
+        node = source
+        for key in path:
+            if not isinstance(node, dict) or key not in node:
+                node = None
+                break
+            node = node[key]
+        if node is not None:
+            return node
+    return default
+
+def performance_settings(config):
+    """收集脚本的采样与哈希参数（performance_settings 段；与检测规则无关，不属于规则集）"""
+    def setting(key, default):
+        return config_value(config, ('performance_settings', key), default)
+    return {
+        'cpu_sample_interval': float(setting('cpu_sample_interval_seconds', 1.0)),
+        'hash_cache_file': setting('hash_cache_file', ''),
+        'hash_workers': int(setting('hash_workers', 4)),
+        'hash_max_bytes': int(float(setting('hash_max_file_mb', 256)) * 1024 * 1024) or None,
+        'hash_timeout': float(setting('hash_timeout_seconds', 10)) or None,
+        'monitor_interval': float(setting('monitor_interval_seconds', 5))
+    }
+
+def rule_enabled(config, switch):
+    """detection_rules 中的开关是否打开（没有开关的规则总是生效）"""
+    return not switch or bool(config_value(config, ('detection_rules', switch, 'enabled'), True))
+
+def rule_values(config, switch, key):
+    """detection_rules 中某条规则的列表（去重并保持顺序），开关关闭时为空"""
+    if not rule_enabled(config, switch):
+        return ()
+    values = config_value(config, ('detection_rules', switch, key), [])
+    return tuple(dict.fromkeys(values))
+
+def compile_rule(definition, config):
+    """把一条规则定义编译为 evaluate(metrics) 函数，阈值和权重在编译时绑定"""
+    name = definition['name']
+    if not rule_enabled(config, definition['switch']):
+        return None
+
+    threshold = 0
+    if definition['threshold']:
+        threshold = config_value(config, definition['threshold'], 0)
+    weight = config_value(config, ('analysis_settings', 'threat_scoring', definition['weight']), 0)
+    threshold, weight = float(threshold), float(weight)
+    if weight == int(weight):
+        weight = int(weight)
+    per_item = definition['per_item']
+    issue = definition['issue']
+    finding_type = definition['type']
+    severity = definition['severity']
+
+    def evaluate(metrics):
+        count = metrics.get(name)
+        if count is None or count <= threshold:
+            return None
+        return {
+            'rule': name,
+            'type': finding_type,
+            'severity': severity,
+            'count': count,
+            'score': count * weight if per_item else weight,
+            'description': issue.format(count=count)
+        }
+
+    return evaluate
+
+class RuleSet:
+    """编译后的规则集（不可变，重新加载时整体替换）"""
+
+    def __init__(self, config, source=None):
+        self.source = source
+        self.rules = [rule for rule in (compile_rule(d, config) for d in RULE_DEFINITIONS) if rule]
+        self.recommendation_map = {d['name']: d['recommendation'] for d in RULE_DEFINITIONS if d['recommendation']}
+
+        # 威胁等级按 min_score 升序排列，评估时二分查找
+        levels = config_value(config, ('analysis_settings', 'threat_levels'), {})
+        ordered = sorted(levels.items(), key=lambda item: item[1].get('min_score', 0))
+        self.level_bounds = [level.get('min_score', 0) for _, level in ordered]
+        self.levels = [(LEVEL_NAMES.get(key, key), level.get('color', 'green')) for key, level in ordered]
+
+        # 视为内部地址的网段（企业内网 CIDR 与排除地址），保留地址段由 ip_index 内置
+        external_rules = config_value(config, ('detection_rules', 'external_connections'), {})
+        self.internal_networks = tuple(external_rules.get('internal_networks', [])) + \
+            tuple(external_rules.get('exclude_ips', []))
+
+        # 可疑进程名和端口，由调用方编译进扫描使用的情报匹配器（ioc_matcher）
+        self.suspicious_process_names = tuple(dict.fromkeys(
+            str(name).strip().lower() for name in rule_values(config, 'suspicious_processes', 'process_names')))
+        self.suspicious_ports = rule_values(config, 'suspicious_ports', 'ports')
+
+        relevant = {
+            'engine': RULE_ENGINE_VERSION,
+            'threat_scoring': config_value(config, ('analysis_settings', 'threat_scoring'), {}),
+            'threat_levels': levels,
+            # 只计入评估和扫描实际使用的检测配置，说明文字等变化不使缓存失效
+            'enabled_rules': [d['name'] for d in RULE_DEFINITIONS if rule_enabled(config, d['switch'])],
+            'thresholds': {d['name']: config_value(config, d['threshold'], 0) for d in RULE_DEFINITIONS if d['threshold']},
+            'internal_networks': self.internal_networks,
+            'suspicious_process_names': self.suspicious_process_names,
+            'suspicious_ports': self.suspicious_ports
+        }
+        canonical = json.dumps(relevant, sort_keys=True, ensure_ascii=False)
+        self.version = hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
+    def level_for(self, score):
+        """根据分数返回 (等级名称, 颜色)"""
+        index = bisect.bisect_right(self.level_bounds, score) - 1
+        return self.levels[max(index, 0)]
+
+    def assess(self, metrics):
+        """评估指标，返回 {'score', 'level', 'color', 'issues', 'findings'}"""
+        findings = []
+        for rule in self.rules:
+            finding = rule(metrics)
+            if finding:
+                findings.append(finding)
+        score = sum(finding['score'] for finding in findings)
+        level, color = self.level_for(score)
+        return {
+            'score': score,
+            'level': level,
+            'color': color,
+            'issues': [finding['description'] for finding in findings],
+            'findings': findings
+        }
+
+    def recommendations(self, findings):
+        """触发规则对应的处置建议"""
+        return [dict(self.recommendation_map[finding['rule']]) for finding in findings
+                if finding['rule'] in self.recommendation_map]
+
+def find_config_file(config_path=None):
+    """定位配置文件：参数 -> 环境变量 -> 当前目录 -> 项目根目录，找不到时返回 None"""
+    candidates = [config_path, os.environ.get(CONFIG_ENV), CONFIG_FILE_NAME,
+                  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), CONFIG_FILE_NAME)]
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            return candidate
+    return None
+
+class RuleEngine:
+    """持有当前规则集，配置文件变化时重新编译并原子替换"""
+
+    def __init__(self, config_path=None, check_interval=RELOAD_CHECK_INTERVAL):
+        self.config_path = find_config_file(config_path) or config_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._next_check = 0.0
+        self.ruleset = RuleSet({}, source='default')
+        self.reload()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.config_path)
+        except (OSError, TypeError):
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self):
+        """配置文件变化时重新编译，返回是否替换了规则集；配置有误时保留原规则集"""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        with self._lock:
+            if stamp == self._stamp:
+                return False
+            try:
+                with open(self.config_path, 'r', encoding='utf-8-sig') as f:
+                    ruleset = RuleSet(json.load(f), source=self.config_path)
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                # 记下该文件状态，避免反复报错；编辑器写完后文件状态变化会再次加载
+                self._stamp = stamp
+                logger.warning(f"规则配置加载失败，继续使用版本 {self.ruleset.version}: {e}")
+                return False
+            self._stamp = stamp
+            changed = ruleset.version != self.ruleset.version
+            self.ruleset = ruleset
+        if changed:
+            logger.info(f"检测规则已加载: {self.config_path}（版本 {ruleset.version}）")
+        return changed
+
+    def current(self):
+        """返回当前规则集；距上次检查超过 check_interval 时先检查配置文件是否变化"""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self.reload()
+        return self.ruleset
+
+def load_rules(config_path=None):
+    """一次性加载规则集（收集脚本运行时间短，不需要热加载）"""
+    return RuleEngine(config_path).current()
+
+def load_performance_settings(config_path=None):
+    """一次性读取收集脚本的采样与哈希参数，配置文件缺失或有误时使用默认值"""
+    config = {}
+    path = find_config_file(config_path)
+    if path:
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"配置文件读取失败，采样参数使用默认值: {e}")
+    return performance_settings(config if isinstance(config, dict) else {})
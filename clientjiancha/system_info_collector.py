@@ -16,6 +16,9 @@ import psutil
 import socket
 import winreg
 from pathlib import Path
+from ioc_matcher import load_matcher
+from rule_engine import load_rules
+from ip_index import load_ip_index
 
 class WindowsSystemCollector:
     def __init__(self):
@@ -28,6 +31,10 @@ class WindowsSystemCollector:
                 'version': '1.0'
             }
         }
+        # 威胁情报与检测规则（与 Web 服务器共用同一套情报目录和 config.json）
+        self.rules = load_rules()
+        self.ioc = load_matcher(process_names=self.rules.suspicious_process_names, ports=self.rules.suspicious_ports)
+        self.ip_index = load_ip_index(self.rules.internal_networks)
     
     def run_command(self, command, shell=True):
         """执行系统命令并返回结果"""
@@ -120,14 +127,25 @@ class WindowsSystemCollector:
         connections = []
         for conn in psutil.net_connections():
             if conn.status == 'ESTABLISHED':
-                connections.append({
+                connection = {
                     'local_address': f"{conn.laddr.ip}:{conn.laddr.port}" if conn.laddr else None,
                     'remote_address': f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else None,
                     'status': conn.status,
                     'pid': conn.pid,
                     'family': str(conn.family),
                     'type': str(conn.type)
-                })
+                }
+                # 远程地址分类，命中威胁情报或黑名单时标记
+                if conn.raddr:
+                    ip_info = self.ip_index.lookup(conn.raddr.ip) or {}
+                    connection['external'] = ip_info.get('external', True)
+                    if self.ioc.match_ip(conn.raddr.ip):
+                        connection['suspicious'] = True
+                        connection['reason'] = f'威胁情报IP: {conn.raddr.ip}'
+                    elif ip_info.get('blocklist'):
+                        connection['suspicious'] = True
+                        connection['reason'] = f"黑名单IP: {conn.raddr.ip} ({ip_info['blocklist']})"
+                connections.append(connection)
         
         # 网络统计
         net_stats = psutil.net_io_counters()
@@ -162,10 +180,7 @@ class WindowsSystemCollector:
                 }
                 
                 # 检查可疑进程
-                suspicious_names = ['cmd.exe', 'powershell.exe', 'nc.exe', 'netcat.exe', 
-                                  'psexec.exe', 'mimikatz.exe', 'procdump.exe']
-                
-                if proc.info['name'] and proc.info['name'].lower() in [s.lower() for s in suspicious_names]:
+                if self.ioc.match_name(proc.info['name']):
                     proc_info['suspicious'] = True
                     proc_info['reason'] = '可疑进程名称'
                     suspicious_processes.append(proc_info)
@@ -350,47 +365,31 @@ class WindowsSystemCollector:
         """威胁分析"""
         print("[14/15] 进行威胁分析...")
         
-        threats = []
-        threat_score = 0
-        
-        # 检查可疑进程
-        if self.data['process_info']['suspicious_count'] > 0:
-            threats.append({
-                'type': '可疑进程',
-                'severity': 'High',
-                'count': self.data['process_info']['suspicious_count'],
-                'description': f"发现 {self.data['process_info']['suspicious_count']} 个可疑进程"
-            })
-            threat_score += self.data['process_info']['suspicious_count'] * 20
-        
-        # 检查外部连接
+        # 统计外部连接
         external_connections = len([conn for conn in self.data['network_info']['connections'] 
-                                  if not conn['remote_address'].startswith(('127.', '0.0.0.0'))])
-        
-        if external_connections > 10:
-            threats.append({
-                'type': '网络连接',
-                'severity': 'Medium',
-                'count': external_connections,
-                'description': f"外部网络连接数量较多: {external_connections}"
-            })
-            threat_score += 15
-        
-        # 确定威胁等级
-        if threat_score >= 80:
-            threat_level = "严重"
-        elif threat_score >= 50:
-            threat_level = "高"
-        elif threat_score >= 20:
-            threat_level = "中"
-        else:
-            threat_level = "低"
+                                  if conn.get('external')])
+        suspicious_connections = len([conn for conn in self.data['network_info']['connections']
+                                      if conn.get('suspicious')])
+        
+        # 按 config.json 中的检测规则评分并确定威胁等级
+        assessment = self.rules.assess({
+            'suspicious_processes': self.data['process_info']['suspicious_count'],
+            'external_connections': external_connections,
+            'suspicious_connections': suspicious_connections
+        })
+        threats = [{
+            'type': finding['type'],
+            'severity': finding['severity'],
+            'count': finding['count'],
+            'description': finding['description']
+        } for finding in assessment['findings']]
         
         self.data['threat_analysis'] = {
-            'threat_level': threat_level,
-            'threat_score': threat_score,
+            'threat_level': assessment['level'],
+            'threat_score': assessment['score'],
             'threats': threats,
-            'external_connections': external_connections
+            'external_connections': external_connections,
+            'ruleset_version': self.rules.version
         }
     
     def generate_summary(self):
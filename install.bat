@@ -162,6 +162,15 @@ if %errorlevel% neq 0 (
     ) else (
         echo psutil已安装
     )
+    
+    :: 检查waitress（生产环境Web服务器）
+    python -c "import waitress" >nul 2>&1
+    if !errorlevel! neq 0 (
+        echo 安装waitress...
+        pip install waitress
+    ) else (
+        echo waitress已安装
+    )
 )
 
 echo.
@@ -220,7 +229,7 @@ echo [5/5] 验证安装结果...
 echo.
 
 echo 检查主要文件...
-set MAIN_FILES=winxy_emergency_response.bat winxy_web_server.py config.json emergency_commands.json
+set MAIN_FILES=winxy_emergency_response.bat winxy_web_server.py winxy_serve.py winxy_jobs.py winxy_metrics.py winxy_profiling.py winxy_watch.py config.json emergency_commands.json
 
 for %%f in (%MAIN_FILES%) do (
     if exist "%%f" (
@@ -242,7 +251,7 @@ for %%d in (%DIRECTORIES%) do (
 
 echo.
 echo 检查clientjiancha脚本...
-set CLIENT_SCRIPTS=system_info_collector.bat network_analyzer.bat user_analyzer.bat system_info_collector.py process_analyzer.py security_checker.ps1
+set CLIENT_SCRIPTS=system_info_collector.bat network_analyzer.bat user_analyzer.bat system_info_collector.py process_analyzer.py process_monitor.py ioc_matcher.py rule_engine.py ip_index.py hash_cache.py file_hasher.py process_tree.py security_checker.ps1
 
 for %%s in (%CLIENT_SCRIPTS%) do (
     if exist "clientjiancha\%%s" (
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 分析器基准测试
+版本: 1.0
+用途: 生成仿真的采集输出（tasklist、tasklist /v、netstat -ano、wevtutil 文本、
+      net user / net localgroup 以及混合文件，UTF-8 与 GBK 两种编码），测量
+      detect_encoding、read_file_with_encoding、各 analyze_* 函数、流式 analyze_file
+      以及经 Flask 测试客户端的端到端 /upload 的吞吐量和峰值内存，结果保存为 JSON，
+      并可与之前的结果对比找出性能回退。
+用法:
+    python winxy_benchmark.py generate --sizes 1MB,100MB
+    python winxy_benchmark.py run --sizes 1MB,100MB [--benchmarks analyze_file,upload] [--repeat 3]
+    python winxy_benchmark.py compare benchmarks/results/旧.json benchmarks/results/新.json [--threshold 10]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import datetime
+import platform
+import subprocess
+import tempfile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_FOLDER = 'benchmarks'
+CORPUS_FOLDER = os.path.join(BENCH_FOLDER, 'corpus')
+RESULTS_FOLDER = os.path.join(BENCH_FOLDER, 'results')
+
+CORPUS_KINDS = ('tasklist', 'tasklist_v', 'netstat', 'wevtutil', 'net_user', 'mixed')
+CORPUS_ENCODINGS = ('utf-8', 'gbk')
+DEFAULT_SIZES = '1MB,100MB'  # 1GB 需要显式指定（生成和测试都要数分钟，并占用 12GB 磁盘）
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+CORPUS_SEED = 20240601  # 固定种子，同样的参数总是生成同样的文件
+
+BENCHMARKS = ('detect_encoding', 'read_file_with_encoding', 'analyze_processes', 'analyze_network_connections',
+              'analyze_users', 'analyze_security_events', 'analyze_file', 'upload')
+# 需要把整个文件解码到内存中的基准（超过 --max-inmemory 时跳过，避免内存耗尽）
+IN_MEMORY_BENCHMARKS = {'read_file_with_encoding', 'analyze_processes', 'analyze_network_connections',
+                        'analyze_users', 'analyze_security_events'}
+DEFAULT_MAX_INMEMORY = '256MB'
+DEFAULT_THRESHOLD = 10.0  # 对比时耗时或峰值内存增加超过此百分比视为回退
+UPLOAD_TIMEOUT = 3600  # 端到端上传等待分析完成的最长时间（秒）
+
+# ==================== 语料生成 ====================
+
+PROCESS_NAMES = ['svchost.exe'] * 12 + [
+    'System', 'smss.exe', 'csrss.exe', 'wininit.exe', 'services.exe', 'lsass.exe', 'winlogon.exe',
+    'explorer.exe', 'chrome.exe', 'chrome.exe', 'chrome.exe', 'msedge.exe', 'OneDrive.exe', 'SearchIndexer.exe',
+    'spoolsv.exe', 'dwm.exe', 'RuntimeBroker.exe', 'taskhostw.exe', 'conhost.exe', 'MsMpEng.exe', 'sqlservr.exe',
+    'WmiPrvSE.exe', 'dllhost.exe', 'ctfmon.exe', 'sihost.exe', 'notepad.exe', 'WINWORD.EXE', 'EXCEL.EXE'
+]
+SUSPICIOUS_PROCESS_NAMES = ['cmd.exe', 'powershell.exe', 'nc.exe', 'mimikatz.exe', 'psexec.exe', 'procdump.exe']
+SUSPICIOUS_RATE = 0.02
+USER_NAMES = ['Administrator', 'Guest', 'DefaultAccount', 'WDAGUtilityAccount', 'zhangsan', 'lisi', 'wangwu',
+              'backup', 'sqlsvc', 'webadmin', 'operator', 'support']
+PUBLIC_PREFIXES = ['52.114', '13.107', '20.190', '104.16', '142.250', '203.0', '185.199', '8.8', '114.114', '223.5']
+PRIVATE_PREFIXES = ['192.168.1', '10.0.0', '172.16.5']
+COMMON_PORTS = [443, 443, 443, 80, 445, 135, 139, 3389, 53, 8443]
+SUSPICIOUS_PORTS = [4444, 1337, 31337, 6666]
+STATES = ['ESTABLISHED'] * 6 + ['LISTENING', 'TIME_WAIT', 'CLOSE_WAIT', 'SYN_SENT']
+EVENT_IDS = ['4624'] * 6 + ['4625'] * 3 + ['4634', '4648', '4672', '4688', '4719', '6005']
+
+TEXT = {
+    'en': {
+        'tasklist_header': 'Image Name                     PID Session Name        Session#    Mem Usage',
+        'tasklist_v_header': ('Image Name                     PID Session Name        Session#    Mem Usage '
+                              'Status          User Name                                              CPU Time Window Title'),
+        'status': 'Running', 'unknown': 'Unknown', 'na': 'N/A',
+        'netstat_title': 'Active Connections',
+        'netstat_header': '  Proto  Local Address          Foreign Address        State           PID',
+        'user_accounts': 'User accounts for \\\\{host}',
+        'completed': 'The command completed successfully.',
+        'alias': 'Alias name     administrators',
+        'comment': 'Comment        Administrators have complete and unrestricted access to the computer/domain',
+        'members': 'Members',
+        'event': 'Event[{n}]:', 'log_name': 'Log Name', 'source': 'Source', 'date': 'Date', 'event_id': 'Event ID',
+        'task': 'Task', 'level': 'Level', 'computer': 'Computer', 'description': 'Description',
+        'failed': 'An account failed to log on.', 'success': 'An account was successfully logged on.',
+        'subject': 'Subject:', 'new_logon': 'New Logon:', 'account_name': 'Account Name',
+        'account_domain': 'Account Domain', 'network': 'Network Information:',
+        'source_address': 'Source Network Address', 'logon': 'Logon', 'info': 'Information',
+        'section': '==================== {title} ====================',
+        'titles': ('Process List', 'Network Connections', 'User Accounts', 'Security Events', 'System Information'),
+        'sysinfo': ['Host Name:                 {host}', 'OS Name:                   Microsoft Windows Server 2019 Standard',
+                    'System Boot Time:          {date}', 'Domain:                    WORKGROUP']
+    },
+    'zh': {
+        'tasklist_header': '映像名称                       PID 会话名              会话#       内存使用',
+        'tasklist_v_header': ('映像名称                       PID 会话名              会话#       内存使用 '
+                              '状态            用户名                                                 CPU 时间 窗口标题'),
+        'status': '正在运行', 'unknown': '未知', 'na': '暂缺',
+        'netstat_title': '活动连接',
+        'netstat_header': '  协议  本地地址          外部地址        状态           PID',
+        'user_accounts': '\\\\{host} 的用户帐户 (net user)',
+        'completed': '命令成功完成。',
+        'alias': '别名     administrators',
+        'comment': '注释     管理员对计算机/域有不受限制的完全访问权',
+        'members': '成员',
+        'event': '事件[{n}]:', 'log_name': '日志名称', 'source': '来源', 'date': '日期', 'event_id': '事件 ID',
+        'task': '任务类别', 'level': '级别', 'computer': '计算机', 'description': '描述',
+        'failed': '帐户登录失败。', 'success': '已成功登录帐户。',
+        'subject': '使用者:', 'new_logon': '新登录:', 'account_name': '帐户名称',
+        'account_domain': '帐户域', 'network': '网络信息:',
+        'source_address': '源网络地址', 'logon': '登录', 'info': '信息',
+        'section': '==================== {title} ====================',
+        'titles': ('进程列表', '网络连接', '用户帐户', '安全事件', '系统信息'),
+        'sysinfo': ['主机名:           {host}', 'OS 名称:          Microsoft Windows Server 2019 Standard',
+                    '系统启动时间:     {date}', '域:               WORKGROUP']
+    }
+}
+WINDOW_TITLES = {
+    'en': ['N/A', 'OleMainThreadWndName', 'Default IME', 'Task Manager', 'Document1 - Word', 'Inbox - Outlook'],
+    'zh': ['暂缺', 'OleMainThreadWndName', '默认输入法', '任务管理器', '文档1 - Word', '收件箱 - Outlook']
+}
+
+def parse_size(text):
+    """'100MB' -> 字节数"""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def format_size(size):
+    """字节数 -> '100MB'（用于文件名）"""
+    for unit in ('GB', 'MB', 'KB'):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f'{size // SIZE_UNITS[unit]}{unit}'
+    return f'{size}B'
+
+def random_process(rng):
+    if rng.random() < SUSPICIOUS_RATE:
+        return rng.choice(SUSPICIOUS_PROCESS_NAMES)
+    return rng.choice(PROCESS_NAMES)
+
+def random_ip(rng, public_rate=0.6):
+    if rng.random() < public_rate:
+        return f'{rng.choice(PUBLIC_PREFIXES)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+    return f'{rng.choice(PRIVATE_PREFIXES)}.{rng.randint(1, 254)}'
+
+def random_date(rng):
+    return f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}.{rng.randint(0, 999):03d}'
+
+def gen_tasklist(rng, text, verbose=False):
+    """一次 tasklist（或 tasklist /v）的输出"""
+    lines = ['', text['tasklist_v_header' if verbose else 'tasklist_header'],
+             '========================= ======== ================ =========== ============' +
+             (' =============== ================================================== ============ ========================================================================' if verbose else '')]
+    for _ in range(rng.randint(80, 200)):
+        name = random_process(rng)
+        session = rng.choice(['Services', 'Console'])
+        row = f'{name:<25} {rng.randint(4, 65000):>8} {session:<16} {0 if session == "Services" else 1:>11} {rng.randint(8, 900000):>10,} K'
+        if verbose:
+            user = rng.choice(['NT AUTHORITY\\SYSTEM', 'NT AUTHORITY\\LOCAL SERVICE', f'WIN-SRV01\\{rng.choice(USER_NAMES)}', text['na']])
+            row += (f' {rng.choice([text["status"], text["unknown"]]):<15} {user:<50} '
+                    f'{rng.randint(0, 9)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} {rng.choice(WINDOW_TITLES[text["lang"]])}')
+        lines.append(row)
+    return '\n'.join(lines) + '\n'
+
+def gen_netstat(rng, text):
+    """一次 netstat -ano 的输出"""
+    lines = ['', text['netstat_title'], '', text['netstat_header']]
+    for _ in range(rng.randint(100, 300)):
+        local = f'{rng.choice(PRIVATE_PREFIXES)}.{rng.randint(1, 254)}:{rng.randint(1024, 65535)}'
+        if rng.random() < 0.15:
+            lines.append(f'  TCP    0.0.0.0:{rng.choice(COMMON_PORTS):<16} 0.0.0.0:0              LISTENING       {rng.randint(4, 65000)}')
+            continue
+        if rng.random() < 0.1:
+            lines.append(f'  UDP    0.0.0.0:{rng.randint(1024, 65535):<16} *:*                                    {rng.randint(4, 65000)}')
+            continue
+        port = rng.choice(SUSPICIOUS_PORTS) if rng.random() < SUSPICIOUS_RATE else rng.choice(COMMON_PORTS)
+        remote = f'{random_ip(rng)}:{port}'
+        lines.append(f'  TCP    {local:<22} {remote:<22} {rng.choice(STATES):<15} {rng.randint(4, 65000)}')
+    return '\n'.join(lines) + '\n'
+
+def gen_wevtutil(rng, text, first_record=0):
+    """wevtutil qe Security /f:text 的一批记录"""
+    lines = []
+    for n in range(first_record, first_record + rng.randint(20, 60)):
+        event_id = rng.choice(EVENT_IDS)
+        failed = event_id == '4625'
+        lines += [text['event'].format(n=n),
+                  f'  {text["log_name"]}: Security',
+                  f'  {text["source"]}: Microsoft-Windows-Security-Auditing',
+                  f'  {text["date"]}: {random_date(rng)}',
+                  f'  {text["event_id"]}: {event_id}',
+                  f'  {text["task"]}: {text["logon"]}',
+                  f'  {text["level"]}: {text["info"]}',
+                  f'  {text["computer"]}: WIN-SRV01',
+                  f'  {text["description"]}: ',
+                  text['failed'] if failed else text['success'],
+                  '',
+                  text['subject'],
+                  '\tSecurity ID:\t\tS-1-5-18',
+                  f'\t{text["account_name"]}:\t\tWIN-SRV01$',
+                  f'\t{text["account_domain"]}:\t\tWORKGROUP',
+                  '',
+                  text['new_logon'],
+                  f'\t{text["account_name"]}:\t\t{rng.choice(USER_NAMES)}',
+                  f'\t{text["account_domain"]}:\t\tWIN-SRV01',
+                  '',
+                  text['network'],
+                  f'\t{text["source_address"]}:\t{random_ip(rng, 0.5) if event_id in ("4624", "4625") else "-"}',
+                  '']
+    return '\n'.join(lines) + '\n'
+
+def gen_net_user(rng, text):
+    """net user 与 net localgroup administrators 的输出"""
+    users = rng.sample(USER_NAMES, rng.randint(4, len(USER_NAMES)))
+    lines = ['C:\\> net user', '', text['user_accounts'].format(host='WIN-SRV01'), '', '-' * 79]
+    for i in range(0, len(users), 3):
+        lines.append(''.join(f'{name:<25}' for name in users[i:i + 3]).rstrip())
+    lines += [text['completed'], '', 'C:\\> net localgroup administrators', text['alias'], text['comment'], '',
+              text['members'], '', '-' * 79]
+    lines += [name for name in users if rng.random() < 0.3] or ['Administrator']
+    lines += [text['completed'], '']
+    return '\n'.join(lines) + '\n'
+
+def gen_mixed(rng, text, first_record=0):
+    """system_info_collector 风格的综合输出：各段依次出现"""
+    titles = text['titles']
+    parts = [text['section'].format(title=titles[4])]
+    parts += [line.format(host='WIN-SRV01', date=random_date(rng)) for line in text['sysinfo']]
+    parts.append(text['section'].format(title=titles[0]))
+    parts.append(gen_tasklist(rng, text, verbose=rng.random() < 0.5))
+    parts.append(text['section'].format(title=titles[1]))
+    parts.append(gen_netstat(rng, text))
+    parts.append(text['section'].format(title=titles[2]))
+    parts.append(gen_net_user(rng, text))
+    parts.append(text['section'].format(title=titles[3]))
+    parts.append(gen_wevtutil(rng, text, first_record))
+    return '\n'.join(parts) + '\n'
+
+def iter_corpus_blocks(kind, lang, seed):
+    """无限产出某类语料的文本块"""
+    rng = random.Random(f'{seed}-{kind}-{lang}')
+    text = dict(TEXT[lang], lang=lang)
+    record = 0
+    while True:
+        if kind == 'tasklist':
+            yield gen_tasklist(rng, text)
+        elif kind == 'tasklist_v':
+            yield gen_tasklist(rng, text, verbose=True)
+        elif kind == 'netstat':
+            yield gen_netstat(rng, text)
+        elif kind == 'wevtutil':
+            block = gen_wevtutil(rng, text, record)
+            record += block.count(text['event'].split('[')[0] + '[')
+            yield block
+        elif kind == 'net_user':
+            yield gen_net_user(rng, text)
+        else:
+            block = gen_mixed(rng, text, record)
+            record += 60
+            yield block
+
+def corpus_path(folder, kind, encoding, size):
+    return os.path.join(folder, f'{kind}_{encoding.replace("-", "")}_{format_size(size)}.txt')
+
+def generate_corpus_file(path, kind, encoding, size, seed=CORPUS_SEED):
+    """生成一个语料文件（按整块写入，大小略超过目标值后停止；Windows 换行）"""
+    lang = 'zh' if encoding == 'gbk' else 'en'
+    tmp_path = path + '.tmp'
+    written = 0
+    with open(tmp_path, 'wb') as f:
+        for block in iter_corpus_blocks(kind, lang, seed):
+            data = block.replace('\n', '\r\n').encode(encoding)
+            f.write(data)
+            written += len(data)
+            if written >= size:
+                break
+    os.replace(tmp_path, path)
+    return written
+
+def ensure_corpus(folder, kinds, encodings, sizes, seed=CORPUS_SEED):
+    """确保语料存在（已存在的文件不重新生成），返回 [(路径, 类型, 编码, 目标大小)]"""
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for size in sizes:
+        for kind in kinds:
+            for encoding in encodings:
+                path = corpus_path(folder, kind, encoding, size)
+                if not os.path.exists(path):
+                    print(f'生成语料: {path}', flush=True)
+                    generate_corpus_file(path, kind, encoding, size, seed)
+                files.append((path, kind, encoding, size))
+    return files
+
+# ==================== 测量 ====================
+
+def peak_rss_bytes():
+    """本进程的峰值常驻内存（字节），无法获取时返回 None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil
+        return getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    except ImportError:
+        return None
+
+def prepare_case(benchmark, path, server):
+    """准备一次测量：返回无参数的可调用对象，调用一次即完成一次测量"""
+    if benchmark == 'detect_encoding':
+        def run():
+            server._detect_encoding_cached.cache_clear()
+            return server.detect_encoding(path)
+        return run
+    if benchmark == 'read_file_with_encoding':
+        return lambda: server.read_file_with_encoding(path)
+    if benchmark in ('analyze_processes', 'analyze_network_connections', 'analyze_users', 'analyze_security_events'):
+        # 解码不计入分析耗时（read_file_with_encoding 单独测量）
+        content = server.read_file_with_encoding(path)
+        function = getattr(server, benchmark)
+        return lambda: function(content)
+    if benchmark == 'analyze_file':
+        return lambda: server.analyze_file(path)
+    if benchmark == 'upload':
+        app = server.create_app()
+        app.config['MAX_CONTENT_LENGTH'] = None
+        client = app.test_client()
+
+        def run():
+            # 清空结果缓存，保证每次都完整分析
+            shutil.rmtree(server.CACHE_FOLDER, ignore_errors=True)
+            os.makedirs(server.CACHE_FOLDER)
+            with open(path, 'rb') as f:
+                response = client.post('/upload', data={'file': (f, os.path.basename(path))})
+            if response.status_code != 202:
+                raise RuntimeError(f'上传失败: {response.status_code} {response.get_data(as_text=True)}')
+            job_url = response.get_json()['status_url']
+            deadline = time.monotonic() + UPLOAD_TIMEOUT
+            while time.monotonic() < deadline:
+                job = client.get(job_url).get_json()
+                if job['status'] == 'done':
+                    return job
+                if job['status'] == 'failed':
+                    raise RuntimeError(job['error'])
+                time.sleep(0.02)
+            raise RuntimeError('等待分析完成超时')
+        return run
+    raise ValueError(f'未知的基准: {benchmark}')
+
+def run_case(benchmark, path, repeat):
+    """在当前进程中测量一个 (基准, 输入)，返回结果字典（由子进程调用，峰值内存只包含本次测量）"""
+    workdir = tempfile.mkdtemp(prefix='winxy_bench_')
+    path = os.path.abspath(path)
+    os.chdir(workdir)  # 上传、报告、任务库都写在临时目录中
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import logging
+    logging.disable(logging.INFO)
+    import winxy_web_server as server
+
+    try:
+        run = prepare_case(benchmark, path, server)
+        baseline = peak_rss_bytes()  # 不计入准备阶段（如 analyze_* 预先解码的内容）
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        peak = peak_rss_bytes()
+    finally:
+        os.chdir(os.path.dirname(path))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    size = os.path.getsize(path)
+    best = min(timings)
+    return {
+        'seconds': best,
+        'seconds_all': timings,
+        'throughput_mb_s': round(size / best / SIZE_UNITS['MB'], 3) if best > 0 else None,
+        'peak_rss_bytes': peak,
+        'peak_rss_delta_bytes': peak - baseline if peak is not None and baseline is not None else None
+    }
+
+def run_case_subprocess(benchmark, path, repeat):
+    """在独立子进程中测量，保证峰值内存互不影响"""
+    command = [sys.executable, os.path.abspath(__file__), '_case', benchmark, os.path.abspath(path), '--repeat', str(repeat)]
+    completed = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if completed.returncode != 0:
+        raise RuntimeError((completed.stderr or completed.stdout).strip().splitlines()[-1:] or '子进程失败')
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def git_revision():
+    """当前代码的 git 提交号，无法获取时返回 None"""
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        return completed.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(args):
+    """生成（或复用）语料并依次测量全部组合，结果写入 JSON"""
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    kinds = args.kinds.split(',')
+    encodings = args.encodings.split(',')
+    benchmarks = args.benchmarks.split(',')
+    max_inmemory = parse_size(args.max_inmemory)
+    for name in benchmarks:
+        if name not in BENCHMARKS:
+            raise SystemExit(f'未知的基准: {name}（可选: {", ".join(BENCHMARKS)}）')
+
+    files = ensure_corpus(args.corpus, kinds, encodings, sizes)
+    results = []
+    for path, kind, encoding, target_size in files:
+        size = os.path.getsize(path)
+        for benchmark in benchmarks:
+            entry = {
+                'benchmark': benchmark,
+                'input': os.path.basename(path),
+                'kind': kind,
+                'encoding': encoding,
+                'size_bytes': size
+            }
+            if benchmark in IN_MEMORY_BENCHMARKS and size > max_inmemory:
+                entry['skipped'] = f'超过 --max-inmemory（{args.max_inmemory}），需要整体解码到内存'
+            else:
+                try:
+                    entry.update(run_case_subprocess(benchmark, path, args.repeat))
+                except (RuntimeError, ValueError) as e:
+                    entry['error'] = str(e)
+            results.append(entry)
+            print(format_result(entry), flush=True)
+
+    report = {
+        'created': datetime.datetime.now().isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': args.repeat,
+        'results': results
+    }
+    output = args.output or os.path.join(RESULTS_FOLDER, f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已保存: {output}')
+    return report
+
+def format_result(entry):
+    head = f"{entry['benchmark']:<28} {entry['input']:<32}"
+    if 'skipped' in entry:
+        return f'{head} 跳过: {entry["skipped"]}'
+    if 'error' in entry:
+        return f'{head} 失败: {entry["error"]}'
+    peak = entry.get('peak_rss_delta_bytes')
+    peak_text = f'{peak / SIZE_UNITS["MB"]:8.1f} MB' if peak is not None else '       ?   '
+    return f"{head} {entry['seconds']:9.3f} s {entry['throughput_mb_s'] or 0:9.2f} MB/s  峰值内存 +{peak_text}"
+
+# ==================== 结果对比 ====================
+
+def compare_results(old_path, new_path, threshold=DEFAULT_THRESHOLD):
+    """对比两次结果，打印耗时和峰值内存的变化，返回回退项列表"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = {(r['benchmark'], r['input']): r for r in json.load(f)['results']}
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)['results']
+
+    regressions = []
+    print(f"{'基准':<28} {'输入':<32} {'耗时变化':>10} {'内存变化':>10}")
+    for entry in new:
+        before = old.get((entry['benchmark'], entry['input']))
+        if not before or 'seconds' not in before or 'seconds' not in entry:
+            continue
+        time_change = (entry['seconds'] - before['seconds']) * 100 / before['seconds'] if before['seconds'] else 0.0
+        memory_change = None
+        if before.get('peak_rss_delta_bytes') and entry.get('peak_rss_delta_bytes') is not None:
+            memory_change = (entry['peak_rss_delta_bytes'] - before['peak_rss_delta_bytes']) * 100 / before['peak_rss_delta_bytes']
+        regressed = time_change > threshold or (memory_change is not None and memory_change > threshold)
+        if regressed:
+            regressions.append({'benchmark': entry['benchmark'], 'input': entry['input'],
+                                'time_change_percent': round(time_change, 1),
+                                'memory_change_percent': round(memory_change, 1) if memory_change is not None else None})
+        memory_text = f'{memory_change:+9.1f}%' if memory_change is not None else '         -'
+        print(f"{entry['benchmark']:<28} {entry['input']:<32} {time_change:+9.1f}% {memory_text}{'  <-- 回退' if regressed else ''}")
+
+    print(f'\n共 {len(regressions)} 项回退（阈值 {threshold}%）')
+    return regressions
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description='Windows紧急响应系统 - 分析器基准测试')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='生成语料')
+    run = commands.add_parser('run', help='生成（或复用）语料并运行基准测试')
+    for sub in (generate, run):
+        sub.add_argument('--sizes', default=DEFAULT_SIZES, help=f'语料大小，逗号分隔（默认 {DEFAULT_SIZES}，可加 1GB）')
+        sub.add_argument('--kinds', default=','.join(CORPUS_KINDS), help='语料类型，逗号分隔')
+        sub.add_argument('--encodings', default=','.join(CORPUS_ENCODINGS), help='编码，逗号分隔')
+        sub.add_argument('--corpus', default=CORPUS_FOLDER, help='语料目录')
+    run.add_argument('--benchmarks', default=','.join(BENCHMARKS), help='要运行的基准，逗号分隔')
+    run.add_argument('--repeat', type=int, default=3, help='每项重复次数（取最快一次）')
+    run.add_argument('--max-inmemory', default=DEFAULT_MAX_INMEMORY, help='需要整体读入内存的基准的文件大小上限')
+    run.add_argument('--output', help='结果文件路径（默认 benchmarks/results/bench_<时间>.json）')
+
+    compare = commands.add_parser('compare', help='对比两次结果')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='回退阈值（百分比）')
+
+    case = commands.add_parser('_case')  # 内部使用：在子进程中测量一项
+    case.add_argument('benchmark')
+    case.add_argument('path')
+    case.add_argument('--repeat', type=int, default=1)
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        sizes = [parse_size(size) for size in args.sizes.split(',')]
+        ensure_corpus(args.corpus, args.kinds.split(','), args.encodings.split(','), sizes)
+    elif args.command == 'run':
+        run_suite(args)
+    elif args.command == 'compare':
+        return 1 if compare_results(args.old, args.new, args.threshold) else 0
+    else:
+        print(json.dumps(run_case(args.benchmark, args.path, args.repeat)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
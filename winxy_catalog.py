@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 报告目录
+版本: 1.0
+用途: 用嵌入式 SQLite 索引分析报告的元数据，支持分页、排序和过滤查询
+"""
+
+import os
+import json
+import gzip
+import sqlite3
+import contextlib
+import datetime
+
+# 可排序字段：API 参数名 -> 列名
+SORT_COLUMNS = {
+    'created': 'created_at',
+    'score': 'threat_score',
+    'level': 'threat_level',
+    'size': 'size',
+    'filename': 'filename',
+    'source': 'source_name'
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reports (
+    filename TEXT PRIMARY KEY,
+    source_name TEXT,
+    content_hash TEXT,
+    ruleset_version TEXT,
+    threat_score INTEGER,
+    threat_level TEXT,
+    total_processes INTEGER,
+    suspicious_processes INTEGER,
+    total_connections INTEGER,
+    external_connections INTEGER,
+    suspicious_connections INTEGER,
+    total_users INTEGER,
+    admin_users INTEGER,
+    failed_logins INTEGER,
+    size INTEGER,
+    upload_time TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_level_created ON reports (threat_level, created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_score ON reports (threat_score);
+CREATE INDEX IF NOT EXISTS idx_reports_hash ON reports (content_hash);
+'''
+
+COLUMNS = ['filename', 'source_name', 'content_hash', 'ruleset_version', 'threat_score', 'threat_level',
+           'total_processes', 'suspicious_processes', 'total_connections', 'external_connections',
+           'suspicious_connections', 'total_users', 'admin_users', 'failed_logins', 'size',
+           'upload_time', 'created_at']
+
+def report_row(filename, analysis_results, size, created_at, ruleset_version=None):
+    """从分析结果中提取需要索引的元数据"""
+    file_info = analysis_results.get('file_info', {})
+    threat = analysis_results.get('threat_assessment', {})
+    processes = analysis_results.get('processes', {})
+    network = analysis_results.get('network', {})
+    users = analysis_results.get('users', {})
+    security = analysis_results.get('security', {})
+
+    return {
+        'filename': filename,
+        'source_name': file_info.get('name'),
+        'content_hash': file_info.get('sha256'),
+        'ruleset_version': ruleset_version,
+        'threat_score': threat.get('score'),
+        'threat_level': threat.get('level'),
+        'total_processes': processes.get('total_processes'),
+        'suspicious_processes': processes.get('suspicious_processes'),
+        'total_connections': network.get('total_connections'),
+        'external_connections': network.get('external_connections'),
+        'suspicious_connections': network.get('suspicious_connections'),
+        'total_users': users.get('total_users'),
+        'admin_users': users.get('admin_users'),
+        'failed_logins': security.get('failed_logins'),
+        'size': size,
+        'upload_time': file_info.get('upload_time'),
+        'created_at': created_at
+    }
+
+class ReportCatalog:
+    """报告目录（每次操作使用独立连接，可在多线程、多进程间共享）"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """打开连接，正常退出时提交，最后总是关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add_report(self, filename, analysis_results, size, created_at, ruleset_version=None):
+        """写入或更新一条报告记录"""
+        row = report_row(filename, analysis_results, size, created_at, ruleset_version)
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        with self._connect() as conn:
+            conn.execute(f"INSERT OR REPLACE INTO reports ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                         [row[c] for c in COLUMNS])
+
+    def remove_report(self, filename):
+        """删除一条报告记录"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM reports WHERE filename = ?', (filename,))
+
+    def count(self):
+        """报告总数"""
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM reports').fetchone()[0]
+
+    def totals(self):
+        """报告总数和压缩后的总大小（字节）"""
+        with self._connect() as conn:
+            count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reports').fetchone()
+        return count, size
+
+    def rebuild_from_folder(self, reports_folder):
+        """扫描报告目录，把尚未索引的报告补录到目录中（用于首次启用或迁移）"""
+        with self._connect() as conn:
+            known = {row[0] for row in conn.execute('SELECT filename FROM reports')}
+
+        added = 0
+        for stored_name in os.listdir(reports_folder):
+            # 压缩报告以 <逻辑文件名>.gz 存储，旧版报告为未压缩的 .json
+            compressed = stored_name.endswith('.json.gz')
+            filename = stored_name[:-3] if compressed else stored_name
+            if not filename.endswith('.json') or filename in known:
+                continue
+            filepath = os.path.join(reports_folder, stored_name)
+            opener = gzip.open if compressed else open
+            try:
+                with opener(filepath, 'rt', encoding='utf-8') as f:
+                    analysis_results = json.load(f)
+                stat = os.stat(filepath)
+            except (OSError, ValueError):
+                continue
+            self.add_report(filename, analysis_results, stat.st_size, stat.st_ctime)
+            known.add(filename)
+            added += 1
+        return added
+
+    def query(self, page=1, per_page=50, sort='created', order='desc', level=None,
+              since=None, until=None, min_score=None, max_score=None, source=None):
+        """分页查询报告，返回 (记录列表, 符合条件的总数)"""
+        conditions = []
+        params = []
+        if level:
+            conditions.append('threat_level = ?')
+            params.append(level)
+        if since is not None:
+            conditions.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('created_at < ?')
+            params.append(until)
+        if min_score is not None:
+            conditions.append('threat_score >= ?')
+            params.append(min_score)
+        if max_score is not None:
+            conditions.append('threat_score <= ?')
+            params.append(max_score)
+        if source:
+            conditions.append('source_name LIKE ?')
+            params.append(f'%{source}%')
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        column = SORT_COLUMNS.get(sort, 'created_at')
+        direction = 'ASC' if order == 'asc' else 'DESC'
+
+        with self._connect() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM reports {where}', params).fetchone()[0]
+            rows = conn.execute(
+                f'SELECT * FROM reports {where} ORDER BY {column} {direction}, filename {direction} LIMIT ? OFFSET ?',
+                params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+
+        return [self._public(row) for row in rows], total
+
+    @staticmethod
+    def _public(row):
+        """报告记录的对外表示（保留原 /reports 的 filename、size、created 字段）"""
+        record = dict(row)
+        record['created'] = datetime.datetime.fromtimestamp(record.pop('created_at')).isoformat()
+        return record
@@ -898,7 +898,7 @@ echo [提示] 按Ctrl+C停止服务器
 echo.
 
 start http://localhost:12000
-python winxy_web_server.py
+python winxy_serve.py
 
 echo.
 echo [信息] Web服务器已停止
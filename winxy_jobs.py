@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 分析任务存储
+版本: 1.0
+用途: 用嵌入式 SQLite 保存分析任务状态。多进程部署时上传、执行和轮询可能落在不同的
+      工作进程上，任务状态必须放在进程之外才能被任意进程查询。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import contextlib
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT,
+    content_hash TEXT,
+    owner_pid INTEGER,
+    created_at REAL,
+    updated_at REAL,
+    finished_at REAL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS idx_jobs_hash_status ON jobs (content_hash, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+'''
+
+def is_process_alive(pid):
+    """判断本机进程是否存在（Windows 上 os.kill 会直接结束进程，只在 POSIX 上检查）"""
+    if not pid or pid == os.getpid() or os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobStore:
+    """任务存储（每次操作使用独立连接，可在多线程、多进程间共享）"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self, immediate=False):
+        """打开连接，正常退出时提交，最后总是关闭；immediate 时一开始就取得写锁"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA synchronous=NORMAL')  # 任务状态丢失最后几次更新可以接受
+        try:
+            with conn:
+                if immediate:
+                    conn.execute('BEGIN IMMEDIATE')
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert(conn, job):
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO jobs (job_id, status, content_hash, owner_pid, created_at, updated_at, finished_at, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (job['job_id'], job['status'], job.get('content_hash'), os.getpid(), job['created_at'], now,
+             job.get('finished_at'), json.dumps(job, ensure_ascii=False))
+        )
+
+    def add(self, job):
+        """写入一个新任务（由当前进程执行）"""
+        with self._connect() as conn:
+            self._insert(conn, job)
+
+    def add_unless_running(self, job):
+        """相同内容没有正在分析的任务时写入新任务并返回 None，否则返回正在分析的任务ID"""
+        with self._connect(immediate=True) as conn:
+            row = conn.execute(
+                'SELECT job_id FROM jobs WHERE content_hash = ? AND status IN (?, ?) LIMIT 1',
+                (job['content_hash'],) + ACTIVE_STATUSES
+            ).fetchone()
+            if row:
+                return row['job_id']
+            self._insert(conn, job)
+            return None
+
+    def update(self, job_id, **fields):
+        """更新任务字段"""
+        with self._connect(immediate=True) as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None:
+                return
+            job = json.loads(row['data'])
+            job.update(fields)
+            conn.execute(
+                'UPDATE jobs SET status = ?, updated_at = ?, finished_at = ?, data = ? WHERE job_id = ?',
+                (job['status'], time.time(), job.get('finished_at'), json.dumps(job, ensure_ascii=False), job_id)
+            )
+
+    def get(self, job_id):
+        """读取任务，不存在时返回 None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def active_count(self):
+        """排队和执行中的任务数（所有进程）"""
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', ACTIVE_STATUSES).fetchone()[0]
+
+    def status_counts(self):
+        """各状态的任务数（所有进程）"""
+        with self._connect() as conn:
+            return {row['status']: row['n'] for row in conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')}
+
+    def purge(self, retention_seconds):
+        """删除超过保留时间的已结束任务，并把所属进程已退出的未完成任务标记为失败"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (now - retention_seconds,))
+            orphans = [row['job_id'] for row in conn.execute(
+                'SELECT job_id, owner_pid FROM jobs WHERE status IN (?, ?)', ACTIVE_STATUSES
+            ) if not is_process_alive(row['owner_pid'])]
+        for job_id in orphans:
+            self.update(job_id, status='failed', error='分析进程已退出，请重新上传', finished_at=now)
+        return len(orphans)
+
+    def fail_active(self, error):
+        """把全部未完成任务标记为失败（服务启动时调用：上次运行留下的任务不会再有进程执行）"""
+        with self._connect() as conn:
+            job_ids = [row['job_id'] for row in conn.execute(
+                'SELECT job_id FROM jobs WHERE status IN (?, ?)', ACTIVE_STATUSES)]
+        now = time.time()
+        for job_id in job_ids:
+            self.update(job_id, status='failed', error=error, finished_at=now)
+        return len(job_ids)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 运行指标
+版本: 1.0
+用途: 计数器与直方图，以 Prometheus 文本格式输出。
+      多进程部署时每个工作进程只在内存中累加自己的指标，定期把快照写入共享的 SQLite，
+      /metrics 由任意工作进程读出全部快照求和后输出，结果与单进程部署一致。
+"""
+
+import os
+import json
+import time
+import uuid
+import bisect
+import sqlite3
+import threading
+import contextlib
+
+# 耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 大小直方图的桶上限（字节）：1KB 到 4GB，每档 x4
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(12))
+# 吞吐量直方图的桶上限（字节/秒）：64KB/s 到 1GB/s，每档 x2
+THROUGHPUT_BUCKETS = tuple(64 * 1024 * 2 ** i for i in range(15))
+
+PUBLISH_INTERVAL = 1.0  # 后台线程把快照写入共享存储的间隔（秒）
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS metric_snapshots (
+    instance TEXT PRIMARY KEY,
+    pid INTEGER,
+    updated_at REAL,
+    data TEXT
+);
+'''
+
+def format_value(value):
+    """Prometheus 数值格式"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def escape_label(value):
+    """转义标签值中的反斜杠、双引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(pairs):
+    """[(名称, 值), ...] -> {a="1",b="2"}"""
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+class Metric:
+    """一个指标族：按标签值组合分别累加
+
+    counter 每组标签保存一个数值；histogram 保存 [各桶计数..., 总和, 次数]，
+    桶计数不累积（输出时再累加），合并快照只需逐项相加。
+    """
+
+    def __init__(self, registry, name, help_text, kind, label_names=(), buckets=None):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) if buckets else None
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def inc(self, amount=1, **labels):
+        """计数器加 amount"""
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self.registry.dirty = True
+
+    def observe(self, value, **labels):
+        """直方图记录一次观测值"""
+        key = self._key(labels)
+        with self.registry.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 3)
+            entry[bisect.bisect_left(self.buckets, value)] += 1
+            entry[-2] += value
+            entry[-1] += 1
+            self.registry.dirty = True
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """记录 with 代码块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self, values):
+        """按 Prometheus 文本格式输出（values 为合并后的 标签元组 -> 值）"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        for key in sorted(values):
+            pairs = list(zip(self.label_names, key))
+            value = values[key]
+            if self.kind != 'histogram':
+                lines.append(f'{self.name}{format_labels(pairs)} {format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), value[:-2]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(pairs + [("le", format_value(float(bound)))])} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(pairs)} {format_value(value[-2])}')
+            lines.append(f'{self.name}_count{format_labels(pairs)} {value[-1]}')
+        return lines
+
+class MetricsRegistry:
+    """本进程的指标集合"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.instance = None
+        self._publisher = None
+        self.reset()
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Metric(self, name, help_text, 'counter', label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(Metric(self, name, help_text, 'histogram', label_names, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def reset(self):
+        """清空本进程的指标并换一个实例ID（fork 出的子进程调用，避免重复计入父进程的值）"""
+        self.lock = threading.Lock()
+        self._publish_lock = threading.Lock()  # 保证后写入的快照总是更新的
+        for metric in self.metrics.values():
+            metric.values = {}
+        self.instance = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.dirty = False
+        self._publisher = None  # 线程不会随 fork 复制
+
+    def snapshot(self):
+        """本进程的指标快照：{指标名: [[标签值列表, 值], ...]}"""
+        with self.lock:
+            return {name: [[list(key), value] for key, value in metric.values.items()]
+                    for name, metric in self.metrics.items() if metric.values}
+
+    def publish(self, store):
+        """指标有变化时把快照写入共享存储"""
+        with self._publish_lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            store.publish(self.instance, self.snapshot())
+
+    def start_publisher(self, store, on_error=None):
+        """启动后台线程，每 PUBLISH_INTERVAL 秒写入一次快照（每个进程一个，已启动时直接返回）"""
+        with self.lock:
+            if self._publisher is not None:
+                return
+            self._publisher = threading.Thread(target=self._publish_loop, args=(store, on_error),
+                                               name='winxy-metrics', daemon=True)
+        self._publisher.start()
+
+    def _publish_loop(self, store, on_error):
+        pid = os.getpid()
+        while os.getpid() == pid:
+            time.sleep(PUBLISH_INTERVAL)
+            try:
+                self.publish(store)
+            except sqlite3.Error as e:
+                if on_error:
+                    on_error(e)
+
+    def render(self, snapshots, extra_lines=()):
+        """合并所有进程的快照并输出 Prometheus 文本"""
+        merged = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, entries in snapshot.items():
+                target = merged.get(name)
+                if target is None:
+                    continue  # 其他版本的进程留下的指标
+                for key, value in entries:
+                    key = tuple(key)
+                    current = target.get(key)
+                    if current is None:
+                        target[key] = list(value) if isinstance(value, list) else value
+                    elif isinstance(value, list):
+                        if len(value) == len(current):
+                            target[key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        target[key] = current + value
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.extend(metric.render(merged[name]))
+        lines.extend(extra_lines)
+        return '\n'.join(lines) + '\n'
+
+def gauge_lines(name, help_text, values):
+    """在抓取时计算的瞬时值（不需要跨进程合并），values 为 [(标签对列表, 值), ...]"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+    lines.extend(f'{name}{format_labels(pairs)} {format_value(value)}' for pairs, value in values)
+    return lines
+
+class MetricsStore:
+    """各工作进程的指标快照（每次操作使用独立连接，可在多线程、多进程间共享）
+
+    已退出工作进程的快照保留到服务重启，计数器在整个运行期间保持单调递增。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """打开连接，正常退出时提交，最后总是关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def publish(self, instance, snapshot):
+        """写入（替换）一个进程实例的快照"""
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO metric_snapshots (instance, pid, updated_at, data) VALUES (?, ?, ?, ?)',
+                         (instance, os.getpid(), time.time(), json.dumps(snapshot)))
+
+    def collect(self):
+        """读取全部进程实例的快照"""
+        with self._connect() as conn:
+            return [json.loads(row[0]) for row in conn.execute('SELECT data FROM metric_snapshots')]
+
+    def clear(self):
+        """删除全部快照（服务启动时调用，指标从零开始）"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM metric_snapshots')
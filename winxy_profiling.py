@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 按需性能剖析
+版本: 1.0
+用途: 对单次分析同时运行 cProfile（CPU 耗时）和 tracemalloc（内存分配），
+      把原始 pstats 和便于阅读的摘要保存在报告旁边，用于在生产环境中定位
+      病态输入导致的慢正则、内存暴涨等问题，无需重新部署。
+"""
+
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+import datetime
+import threading
+import tracemalloc
+
+PROFILE_TOP_FUNCTIONS = 40  # 摘要中保留的函数数
+PROFILE_TOP_ALLOCATIONS = 25  # 摘要中保留的内存分配位置数
+TRACEMALLOC_FRAMES = 1  # 每个分配记录的调用栈深度
+
+# tracemalloc 是进程级的：多个剖析同时进行时由第一个启动、最后一个停止
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+        tracemalloc.reset_peak()
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+def function_label(func):
+    """(文件, 行号, 函数名) -> 文件:行号(函数名)"""
+    filename, lineno, name = func
+    if filename == '~':
+        return name  # 内置函数
+    return f'{os.path.basename(filename)}:{lineno}({name})'
+
+class AnalysisProfiler:
+    """with 代码块内的 CPU 剖析和内存分配跟踪
+
+    cProfile 只记录当前线程；tracemalloc 记录整个进程，同一进程中并发执行的其他分析
+    产生的分配也会计入。子进程中执行的代码不会被记录，调用方应在剖析时走串行路径。
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.wall_seconds = 0.0
+        self.peak_bytes = 0
+        self.current_bytes = 0
+        self.snapshot = None
+        self._start = None
+
+    def __enter__(self):
+        _start_tracemalloc()
+        self._start = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.disable()
+        self.wall_seconds = time.perf_counter() - self._start
+        try:
+            self.current_bytes, self.peak_bytes = tracemalloc.get_traced_memory()
+            self.snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+        finally:
+            _stop_tracemalloc()
+        return False
+
+    def top_functions(self, sort_key):
+        """按 sort_key（cumulative/tottime）排序的前 PROFILE_TOP_FUNCTIONS 个函数"""
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        rows = []
+        for func, (primitive_calls, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                'function': function_label(func),
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'total_seconds': round(total, 6),
+                'cumulative_seconds': round(cumulative, 6)
+            })
+        key = 'cumulative_seconds' if sort_key == 'cumulative' else 'total_seconds'
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:PROFILE_TOP_FUNCTIONS]
+
+    def top_allocations(self):
+        """按分配位置汇总的前 PROFILE_TOP_ALLOCATIONS 个内存占用（剖析结束时仍存活的对象）"""
+        if self.snapshot is None:
+            return []
+        return [{
+            'location': f'{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}',
+            'size_bytes': stat.size,
+            'count': stat.count
+        } for stat in self.snapshot.statistics('lineno')[:PROFILE_TOP_ALLOCATIONS]]
+
+    def summary(self, **info):
+        """剖析摘要（JSON 可序列化），info 中的字段原样写入"""
+        result = dict(info)
+        result.update({
+            'created': datetime.datetime.now().isoformat(),
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_by_cumulative': self.top_functions('cumulative'),
+            'cpu_by_self': self.top_functions('tottime'),
+            'memory': {
+                'peak_bytes': self.peak_bytes,
+                'current_bytes': self.current_bytes,
+                'top_allocations': self.top_allocations()
+            }
+        })
+        return result
+
+    def save(self, base_path, **info):
+        """写出 <base_path>.pstats（可用 pstats/snakeviz 打开）和 <base_path>.profile（JSON 摘要），返回摘要"""
+        summary = self.summary(**info)
+        self.profiler.dump_stats(base_path + '.pstats')
+        tmp_path = base_path + '.profile.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, base_path + '.profile')
+        return summary
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 生产环境启动器
+版本: 1.0
+用途: 以生产服务器运行 Web 界面。工作进程数、线程数、请求超时和上传大小上限取自
+      config.json 的 web_interface 段，命令行参数可以覆盖。
+      - gunicorn（Linux/macOS）：预先 fork 多个工作进程，主进程先加载规则、威胁情报和
+        IP 索引再 fork，工作进程写时复制共享；支持 HUP 平滑重启工作进程
+      - waitress（Windows）：单进程多线程
+      - flask：开发服务器，仅在以上两者都未安装时使用
+      配置了投递目录（watch_folder）时每个工作进程启动一个监视线程，通过租约保证只有一个在轮询。
+用法: python winxy_serve.py [--server auto|gunicorn|waitress|flask] [--workers N] [--threads N]
+"""
+
+import os
+import sys
+import argparse
+
+SERVERS = ('auto', 'gunicorn', 'waitress', 'flask')
+
+def parse_args(argv=None):
+    """解析命令行参数（未指定的参数使用 config.json 中的值）"""
+    parser = argparse.ArgumentParser(description='Windows紧急响应系统 - 生产环境启动器')
+    parser.add_argument('--config', help='配置文件路径（默认 config.json）')
+    parser.add_argument('--server', choices=SERVERS, help='服务器类型（默认 auto）')
+    parser.add_argument('--host', help='监听地址')
+    parser.add_argument('--port', type=int, help='监听端口')
+    parser.add_argument('--workers', type=int, help='工作进程数（仅 gunicorn）')
+    parser.add_argument('--threads', type=int, help='每个工作进程的线程数')
+    parser.add_argument('--timeout', type=int, help='请求超时（秒）')
+    parser.add_argument('--watch-folder', help='自动分析的投递目录（空字符串表示不监视）')
+    return parser.parse_args(argv)
+
+def choose_server(requested):
+    """auto 时按平台选择已安装的生产服务器"""
+    if requested != 'auto':
+        return requested
+    if os.name == 'posix':
+        try:
+            import gunicorn  # noqa: F401
+            return 'gunicorn'
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return 'waitress'
+    except ImportError:
+        return 'flask'
+
+def run_gunicorn(app, settings, post_worker_init=None):
+    """gunicorn：预加载应用后 fork 工作进程（gthread 工作模式），post_worker_init 在每个工作进程启动后调用"""
+    from gunicorn.app.base import BaseApplication
+
+    class WinxyApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': f"{settings['host']}:{settings['port']}",
+        'workers': settings['workers'],
+        'threads': settings['threads'],
+        'worker_class': 'gthread',
+        'timeout': settings['timeout_seconds'],
+        'graceful_timeout': settings['graceful_timeout_seconds'],
+        'preload_app': True
+    }
+    if post_worker_init:
+        options['post_worker_init'] = lambda worker: post_worker_init()
+    WinxyApplication(app, options).run()
+
+def run_waitress(app, settings):
+    """waitress：Windows 上的生产服务器（单进程多线程）"""
+    from waitress import serve
+    max_mb = settings['max_upload_size_mb']
+    serve(app, host=settings['host'], port=settings['port'], threads=settings['threads'],
+          channel_timeout=settings['timeout_seconds'],
+          max_request_body_size=int(max_mb * 1024 * 1024) if max_mb else 1 << 62)
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    if args.config:
+        os.environ['WINXY_CONFIG'] = args.config
+
+    # 导入即加载编译好的规则、威胁情报和 IP 索引（gunicorn 下发生在 fork 之前）
+    import winxy_web_server as server
+
+    app = server.create_app(args.config)
+    settings = app.config['WINXY_SETTINGS']
+    for key, value in (('server', args.server), ('host', args.host), ('port', args.port), ('workers', args.workers),
+                       ('threads', args.threads), ('timeout_seconds', args.timeout), ('watch_folder', args.watch_folder)):
+        if value is not None:
+            settings[key] = value
+
+    server_name = choose_server(settings['server'])
+    if server_name == 'gunicorn' and os.name != 'posix':
+        print("[错误] gunicorn 不支持 Windows，请使用 --server waitress")
+        return 1
+
+    if server_name == 'gunicorn':
+        description = f"gunicorn，{settings['workers']} 个工作进程 × {settings['threads']} 线程"
+    elif server_name == 'waitress':
+        description = f"waitress，{settings['threads']} 线程"
+    else:
+        description = "Flask 开发服务器（未安装 gunicorn/waitress，请执行 pip install waitress）"
+    server.print_banner(settings, description)
+    server.preload_shared_state()
+
+    try:
+        if server_name == 'gunicorn':
+            # 监视线程不能在主进程中启动（线程不会随 fork 复制）
+            run_gunicorn(app, settings, lambda: server.start_drop_watcher(settings))
+        elif server_name == 'waitress':
+            server.start_drop_watcher(settings)
+            run_waitress(app, settings)
+        else:
+            server.start_drop_watcher(settings)
+            app.run(host=settings['host'], port=settings['port'], debug=False, threaded=True)
+    except ImportError as e:
+        print(f"[错误] 缺少服务器模块: {e}，请执行 pip install {server_name}")
+        return 1
+    except KeyboardInterrupt:
+        print("\n服务器已停止")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windows紧急响应系统 - 投递目录检查点
+版本: 1.0
+用途: 跳板机上的采集脚本把输出写入共享目录，服务定期轮询该目录并自动分析新文件。
+      每个文件保存一个字节偏移检查点和扫描器状态，持续追加的日志只分析新追加的部分，
+      计数和列表在原有扫描状态上继续累加，不必重新分析整个文件。
+      扫描器状态以 JSON 保存（计数与截断后的列表），大小有上限，读取时不会执行任何代码。
+      多个工作进程通过租约保证同一时刻只有一个进程在轮询。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import contextlib
+
+HEAD_FINGERPRINT_BYTES = 4096  # 用文件开头这么多字节判断文件是否被替换（日志轮转、重新采集）
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS checkpoints (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    offset INTEGER,
+    head_hash TEXT,
+    encoding TEXT,
+    version TEXT,
+    report_name TEXT,
+    report_file TEXT,
+    char_count INTEGER,
+    updated_at REAL,
+    scanner_state TEXT
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT,
+    expires_at REAL
+);
+'''
+
+CHECKPOINT_FIELDS = ('path', 'size', 'mtime_ns', 'offset', 'head_hash', 'encoding', 'version',
+                     'report_name', 'report_file', 'char_count', 'updated_at')
+
+def head_fingerprint(file_path, length):
+    """文件开头 length 字节（最多 HEAD_FINGERPRINT_BYTES）的 SHA-256"""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read(min(length, HEAD_FINGERPRINT_BYTES))).hexdigest()
+
+def iter_drop_files(folder, allowed):
+    """递归列出投递目录中可分析的文件 (路径, stat)，跳过隐藏文件和写入中的临时文件"""
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.') or name.endswith(('.tmp', '.part')) or not allowed(name):
+                continue
+            path = os.path.join(root, name)
+            try:
+                yield path, os.stat(path)
+            except OSError:
+                continue  # 列出后被删除
+
+class CheckpointStore:
+    """检查点存储（每次操作使用独立连接，可在多线程、多进程间共享）
+
+    扫描器状态由调用方提供 JSON 可序列化的字典（LineScanner.state），
+    分析逻辑版本变化后旧状态不再使用，文件从头重新分析。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(checkpoints)')}
+            if 'scanner_state' not in columns:
+                conn.execute('ALTER TABLE checkpoints ADD COLUMN scanner_state TEXT')
+            if 'scanner' in columns:
+                # 旧版本以 pickle 保存扫描器：不再读取并清除，这些文件下次从头分析
+                conn.execute('UPDATE checkpoints SET scanner = NULL WHERE scanner IS NOT NULL')
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """打开连接，正常退出时提交，最后总是关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, path, with_state=False):
+        """读取检查点，不存在时返回 None；with_state 时同时读取扫描器状态（键 scanner_state，无效时为 None）"""
+        columns = ', '.join(CHECKPOINT_FIELDS + (('scanner_state',) if with_state else ()))
+        with self._connect() as conn:
+            row = conn.execute(f'SELECT {columns} FROM checkpoints WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return None
+        checkpoint = dict(row)
+        if with_state:
+            try:
+                state = json.loads(checkpoint['scanner_state']) if checkpoint['scanner_state'] else None
+            except ValueError:
+                state = None
+            checkpoint['scanner_state'] = state if isinstance(state, dict) else None
+        return checkpoint
+
+    def save(self, checkpoint, scanner_state):
+        """写入（替换）检查点和扫描器状态"""
+        row = dict(checkpoint, updated_at=time.time())
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO checkpoints ({', '.join(CHECKPOINT_FIELDS)}, scanner_state) "
+                f"VALUES ({', '.join('?' for _ in CHECKPOINT_FIELDS)}, ?)",
+                [row.get(field) for field in CHECKPOINT_FIELDS] + [json.dumps(scanner_state, ensure_ascii=False)]
+            )
+
+    def paths(self):
+        """全部有检查点的文件路径"""
+        with self._connect() as conn:
+            return [row['path'] for row in conn.execute('SELECT path FROM checkpoints')]
+
+    def remove(self, path):
+        """删除检查点（文件已从投递目录移走）"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM checkpoints WHERE path = ?', (path,))
+
+    def acquire_lease(self, name, owner, ttl):
+        """取得或续期租约：无人持有、已过期或本来就由 owner 持有时返回 True"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT owner, expires_at FROM leases WHERE name = ?', (name,)).fetchone()
+            if row and row['owner'] != owner and row['expires_at'] > now:
+                return False
+            conn.execute('INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)',
+                         (name, owner, now + ttl))
+            return True
+
+    def release_lease(self, name, owner):
+        """释放 owner 持有的租约"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
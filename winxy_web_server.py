@@ -7,332 +7,1296 @@ Windows紧急响应系统 - Web服务器
 """
 
 import os
+import io
+import codecs
+import copy
+import functools
 import json
 import re
 import datetime
 import hashlib
+import hmac
+import gzip
+import threading
+import time
+import uuid
+import zipfile
+import sqlite3
+import tarfile
+from xml.sax.saxutils import unescape as xml_unescape
 import chardet
-from flask import Flask, render_template_string, request, jsonify, send_file
+from winxy_catalog import ReportCatalog
+from winxy_jobs import JobStore
+from winxy_watch import CheckpointStore, head_fingerprint, iter_drop_files
+from winxy_profiling import AnalysisProfiler
+from winxy_metrics import MetricsRegistry, MetricsStore, gauge_lines, SIZE_BUCKETS, THROUGHPUT_BUCKETS
+from clientjiancha.ioc_matcher import load_matcher
+from clientjiancha.rule_engine import RuleEngine
+from clientjiancha.ip_index import load_ip_index
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from flask import Flask, Blueprint, current_app, g, render_template_string, request, jsonify, send_file, Response, Request
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import logging
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)
+# 路由注册在蓝图上，由 create_app() 创建应用（见文件末尾）
+web = Blueprint('winxy', __name__)
 
 # 配置
 UPLOAD_FOLDER = 'uploads'
 REPORTS_FOLDER = 'reports'
+CACHE_FOLDER = os.path.join(REPORTS_FOLDER, 'cache')  # 分析结果缓存索引
+CATALOG_DB = os.path.join(REPORTS_FOLDER, 'catalog.db')  # 报告目录（SQLite）
+JOBS_DB = os.path.join(REPORTS_FOLDER, 'jobs.db')  # 分析任务状态（SQLite，多进程共享）
+METRICS_DB = os.path.join(REPORTS_FOLDER, 'metrics.db')  # 各工作进程的指标快照（SQLite）
+WATCH_DB = os.path.join(REPORTS_FOLDER, 'watch.db')  # 投递目录各文件的分析检查点（SQLite）
+IOC_FEEDS_FOLDER = 'ioc_feeds'  # 威胁情报目录（每个 .txt/.csv 文件一类情报）
+IP_DATA_FOLDER = 'ip_data'  # 离线 ASN/地理位置/黑名单数据（CSV/TSV）
+CONFIG_FILE = os.environ.get('WINXY_CONFIG', 'config.json')  # 检测规则、评分权重、威胁等级和 Web 服务配置（规则修改后自动重新加载）
+REPORT_COMPRESSION_LEVEL = 6  # 报告 gzip 压缩级别
 ALLOWED_EXTENSIONS = {'txt', 'log', 'csv', 'json'}
+FALLBACK_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'latin1']
+STREAM_CHUNK_SIZE = 64 * 1024  # 流式读取的块大小（字节）
+STREAM_MAX_LINE_CHARS = 1024 * 1024  # 流式分析时单行最大字符数，超长行会被切分
+ENCODING_SAMPLE_SIZE = 64 * 1024  # 编码检测：读取文件开头的字节数
+ENCODING_SAMPLE_WINDOWS = 3  # 编码检测：额外从文件内部抽取的窗口数
+ENCODING_WINDOW_SIZE = 16 * 1024  # 编码检测：每个内部窗口的字节数
+ENCODING_MIN_CONFIDENCE = 0.5  # chardet 置信度低于此值时改用候选编码列表
 
 # 确保目录存在
-for folder in [UPLOAD_FOLDER, REPORTS_FOLDER]:
+for folder in [UPLOAD_FOLDER, REPORTS_FOLDER, CACHE_FOLDER, IOC_FEEDS_FOLDER, IP_DATA_FOLDER]:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
+# ==================== 运行指标 ====================
+# 各进程在内存中累加，定期写入 METRICS_DB，/metrics 汇总全部工作进程后以 Prometheus 文本格式输出
+
+METRICS = MetricsRegistry()
+REQUEST_SECONDS = METRICS.histogram('winxy_http_request_duration_seconds', 'HTTP 请求耗时（秒）', ('route', 'method'))
+REQUESTS_TOTAL = METRICS.counter('winxy_http_requests_total', 'HTTP 请求数', ('route', 'method', 'status'))
+UPLOAD_BYTES = METRICS.histogram('winxy_upload_size_bytes', '上传大小（字节）', ('kind',), SIZE_BUCKETS)
+STAGE_SECONDS = METRICS.histogram('winxy_analysis_stage_seconds', '分析各阶段耗时（秒）', ('stage',))
+ANALYZER_SECONDS = METRICS.histogram('winxy_analyzer_seconds', '单次扫描中各分析器的耗时（秒，按行采样估算，并行分片的耗时相加）', ('analyzer',))
+ANALYZED_BYTES = METRICS.counter('winxy_analyzed_bytes_total', '已分析的字节数')
+ANALYSIS_THROUGHPUT = METRICS.histogram('winxy_analysis_throughput_bytes_per_second', '单个文件的分析吞吐量（字节/秒）',
+                                        buckets=THROUGHPUT_BUCKETS)
+JOBS_FINISHED = METRICS.counter('winxy_analysis_jobs_total', '已结束的分析任务数', ('result',))
+WATCH_SCANS = METRICS.counter('winxy_watch_scans_total', '投递目录文件的分析次数（full 为从头分析，incremental 为只分析追加部分）', ('mode',))
+
+metrics_store = None
+
+def get_metrics_store():
+    """获取指标快照存储"""
+    global metrics_store
+    if metrics_store is None:
+        metrics_store = MetricsStore(METRICS_DB)
+    return metrics_store
+
+def publish_metrics(force=False):
+    """确保本进程的后台指标写入线程已启动；force 时立即写入一次"""
+    try:
+        store = get_metrics_store()
+        METRICS.start_publisher(store, lambda e: logger.warning(f"写入指标快照失败: {e}"))
+        if force:
+            METRICS.publish(store)
+    except sqlite3.Error as e:
+        logger.warning(f"写入指标快照失败: {e}")
+
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def detect_encoding(file_path):
-    """检测文件编码"""
+# 常见 BOM（UTF-32 必须排在 UTF-16 之前，二者前缀相同）
+ENCODING_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# 采样检测只看到部分内容，检测结果换成可安全解码全文的超集编码
+ENCODING_SUPERSETS = {'ascii': 'utf-8', 'gb2312': 'gbk'}
+
+def read_encoding_sample(file_path):
+    """读取编码检测样本：文件开头一段，加上文件内部均匀分布的几个窗口"""
+    windows = []
+    with open(file_path, 'rb') as f:
+        prefix = f.read(ENCODING_SAMPLE_SIZE)
+        size = os.fstat(f.fileno()).st_size
+        if size > ENCODING_SAMPLE_SIZE + ENCODING_SAMPLE_WINDOWS * ENCODING_WINDOW_SIZE:
+            for i in range(1, ENCODING_SAMPLE_WINDOWS + 1):
+                f.seek(size * i // (ENCODING_SAMPLE_WINDOWS + 1))
+                windows.append(f.read(ENCODING_WINDOW_SIZE))
+    return prefix, windows
+
+def is_valid_utf8(data, partial_start=False):
+    """判断字节串是否为合法 UTF-8（允许首尾被截断的多字节字符）"""
+    if partial_start:
+        # 窗口可能从字符中间开始，跳过开头最多3个续字节
+        skip = 0
+        while skip < 3 and skip < len(data) and 0x80 <= data[skip] <= 0xBF:
+            skip += 1
+        data = data[skip:]
     try:
-        with open(file_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            return result['encoding'] or 'utf-8'
-    except:
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def sniff_encoding(prefix, windows=()):
+    """根据采样判断编码：BOM -> UTF-8 合法性 -> chardet"""
+    for bom, name in ENCODING_BOMS:
+        if prefix.startswith(bom):
+            return name
+    
+    if is_valid_utf8(prefix) and all(is_valid_utf8(w, partial_start=True) for w in windows):
         return 'utf-8'
+    
+    sample = prefix + b''.join(windows)
+    result = chardet.detect(sample)
+    if result['encoding'] and (result['confidence'] or 0) >= ENCODING_MIN_CONFIDENCE:
+        encoding = result['encoding'].lower()
+        return ENCODING_SUPERSETS.get(encoding, encoding)
+    
+    # chardet 把握不大时，取第一个能完整解码样本的候选编码
+    # （内部窗口可能从字符中间开始，从其第一个换行之后再解码）
+    parts = [prefix] + [w[w.find(b'\n') + 1:] for w in windows]
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            for part in parts:
+                codecs.getincrementaldecoder(encoding)().decode(part, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'utf-8'
 
-def read_file_with_encoding(file_path):
-    """使用检测到的编码读取文件"""
-    encoding = detect_encoding(file_path)
+@functools.lru_cache(maxsize=256)
+def _detect_encoding_cached(file_path, size, mtime_ns):
+    """按 (路径, 大小, 修改时间) 缓存检测结果，同一文件在一次请求内只检测一次"""
+    return sniff_encoding(*read_encoding_sample(file_path))
+
+def detect_encoding(file_path):
+    """检测文件编码（只读取有限的采样，不读整个文件）"""
     try:
-        with open(file_path, 'r', encoding=encoding) as f:
-            return f.read()
+        stat = os.stat(file_path)
+        return _detect_encoding_cached(os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
     except:
-        # 如果检测的编码失败，尝试常见编码
-        for enc in ['utf-8', 'gbk', 'gb2312', 'latin1']:
-            try:
-                with open(file_path, 'r', encoding=enc) as f:
-                    return f.read()
-            except:
-                continue
-        return ""
+        return 'utf-8'
 
-def analyze_processes(content):
-    """分析进程信息"""
-    processes = []
-    suspicious_processes = []
-    
-    # 匹配进程信息的正则表达式
-    process_patterns = [
-        r'(\w+\.exe)\s+(\d+)\s+(\w+)\s+(\d+)\s+(\d+,?\d*)\s+K',  # tasklist格式
-        r'Name:\s*(\w+\.exe).*?ProcessId:\s*(\d+)',  # wmic格式
-        r'PID:\s*(\d+).*?Name:\s*(\w+\.exe)',  # 其他格式
-    ]
-    
-    for pattern in process_patterns:
-        matches = re.finditer(pattern, content, re.IGNORECASE | re.MULTILINE)
-        for match in matches:
-            if len(match.groups()) >= 2:
-                process_name = match.group(1)
-                pid = match.group(2)
-                
-                process_info = {
-                    'name': process_name,
-                    'pid': pid,
-                    'suspicious': False,
-                    'reason': ''
-                }
-                
-                # 检查可疑进程
-                suspicious_names = ['cmd.exe', 'powershell.exe', 'nc.exe', 'netcat.exe', 
-                                  'psexec.exe', 'mimikatz.exe', 'procdump.exe']
+class DecodedLineReader:
+    """用增量解码器按行解码文件
+
+    换行符统一为 \\n（与文本模式 read() 一致），超长行按 STREAM_MAX_LINE_CHARS 切分。
+    bytes_read 记录已成功解码的字节数，解码失败时即为出错块的起始位置。
+    """
+    
+    def __init__(self, file_path, encoding, start=0, end=None):
+        self.file_path = file_path
+        self.encoding = encoding
+        self.start = start
+        self.end = end  # 不含；None 表示读到文件末尾
+        self.bytes_read = 0
+    
+    def __iter__(self):
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(self.encoding)(), translate=True)
+        pending = ''
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.start)
+            while True:
+                size = STREAM_CHUNK_SIZE
+                if self.end is not None:
+                    size = min(size, self.end - self.start - self.bytes_read)
+                chunk = f.read(size) if size > 0 else b''
+                text = pending + decoder.decode(chunk, final=not chunk)
+                self.bytes_read += len(chunk)
                 
-                if process_name.lower() in [s.lower() for s in suspicious_names]:
-                    process_info['suspicious'] = True
-                    process_info['reason'] = '可疑进程名称'
-                    suspicious_processes.append(process_info)
+                lines = text.split('\n')
+                pending = lines.pop()
+                for line in lines:
+                    line += '\n'
+                    while len(line) > STREAM_MAX_LINE_CHARS:
+                        yield line[:STREAM_MAX_LINE_CHARS]
+                        line = line[STREAM_MAX_LINE_CHARS:]
+                    yield line
+                while len(pending) > STREAM_MAX_LINE_CHARS:
+                    yield pending[:STREAM_MAX_LINE_CHARS]
+                    pending = pending[STREAM_MAX_LINE_CHARS:]
                 
-                processes.append(process_info)
+                if not chunk:
+                    break
+        if pending:
+            yield pending
+
+def next_fallback_encoding(file_path, tried, failed_offset):
+    """解码失败后选择下一个候选编码：跳过已尝试的编码和在出错块上同样解码失败的编码"""
+    with open(file_path, 'rb') as f:
+        start = max(0, failed_offset - ENCODING_WINDOW_SIZE)
+        f.seek(start)
+        window = f.read(failed_offset - start + STREAM_CHUNK_SIZE)
+    # 从出错块之前的最后一个换行处开始，保证从字符边界开始解码
+    window = window[window.rfind(b'\n', 0, failed_offset - start) + 1:]
     
-    return {
-        'total_processes': len(processes),
-        'suspicious_processes': len(suspicious_processes),
-        'process_list': processes[:50],  # 限制显示数量
-        'suspicious_list': suspicious_processes
+    for enc in FALLBACK_ENCODINGS:
+        if enc in tried:
+            continue
+        try:
+            codecs.getincrementaldecoder(enc)().decode(window, final=False)
+        except UnicodeDecodeError:
+            tried.add(enc)
+            continue
+        return enc
+    return None
+
+def iter_decoding_attempts(file_path, encoding=None, end=None):
+    """依次产生 (编码, 行读取器)；调用方在 UnicodeDecodeError 时继续迭代即可换编码重试
+
+    end 不为 None 时只读取文件开头到 end（不含）的字节。
+    """
+    encoding = encoding or detect_encoding(file_path)
+    tried = set()
+    while encoding:
+        tried.add(encoding)
+        reader = DecodedLineReader(file_path, encoding, 0, end)
+        yield encoding, reader
+        encoding = next_fallback_encoding(file_path, tried, reader.bytes_read)
+
+def read_file_with_encoding(file_path):
+    """使用检测到的编码读取文件"""
+    for encoding, reader in iter_decoding_attempts(file_path):
+        try:
+            return ''.join(reader)
+        except (UnicodeDecodeError, LookupError):
+            # 如果检测的编码失败，尝试常见编码
+            continue
+    return ""
+
+# 匹配进程信息的正则表达式：(前置过滤关键字, 正则, 尾部前置过滤关键字, 未完成记录的尾部正则)
+# 尾部前置过滤关键字为 ':' 结尾时，未完成的记录必然以它结尾（其后只有空白），只检查行尾即可
+# 原实现在全文上运行这些正则，\s 可以匹配换行，记录可能跨行（如 "Name:" 与进程名分在两行）。
+# 逐行扫描时，行尾与尾部正则匹配的部分（只差空白之后的内容）带到下一行与之拼接后再匹配。
+# 行中不含关键字时不可能匹配，不含尾部关键字时不可能留下未完成的记录，不必运行对应的正则。
+PROCESS_PATTERNS = [
+    ('.exe', re.compile(r'(\w+\.exe)\s+(\d+)\s+(\w+)\s+(\d+)\s+(\d+,?\d*)\s+K', re.IGNORECASE | re.MULTILINE),  # tasklist格式
+     '.exe', re.compile(r'\w+\.exe(?:\s+\d+(?:\s+\w+(?:\s+\d+(?:\s+\d+,?\d*)?)?)?)?\s*$', re.IGNORECASE)),
+    ('processid:', re.compile(r'Name:\s*(\w+\.exe).*?ProcessId:\s*(\d+)', re.IGNORECASE | re.MULTILINE),  # wmic格式
+     'name:', re.compile(r'Name:\s*(?:\w+\.exe.*?ProcessId:\s*)?$', re.IGNORECASE)),
+    ('pid:', re.compile(r'PID:\s*(\d+).*?Name:\s*(\w+\.exe)', re.IGNORECASE | re.MULTILINE),  # 其他格式
+     'pid:', re.compile(r'PID:\s*(?:\d+.*?Name:\s*)?$', re.IGNORECASE)),
+]
+
+# 匹配网络连接的正则表达式（及未完成记录的尾部正则）
+NETSTAT_PATTERN = re.compile(
+    r'(TCP|UDP)\s+(\d+\.\d+\.\d+\.\d+):(\d+)\s+(\d+\.\d+\.\d+\.\d+):(\d+)\s+(\w+)\s+(\d+)', re.IGNORECASE)
+NETSTAT_TAIL_PATTERN = re.compile(
+    r'(?:TCP|UDP)(?:\s+\d+\.\d+\.\d+\.\d+:\d+(?:\s+\d+\.\d+\.\d+\.\d+:\d+(?:\s+\w+)?)?)?\s*$', re.IGNORECASE)
+
+RECORD_CARRY_MAX_CHARS = 4096  # 跨行记录最多带到下一行的字符数，超出即放弃该记录
+
+# 威胁情报：进程名、端口、IP 等情报与 clientjiancha 收集脚本共用，启动时编译一次；
+# config.json 中的可疑进程名和端口由 current_ioc_matcher 按当前规则集加入
+IOC_MATCHER = load_matcher(IOC_FEEDS_FOLDER)
+_ioc_matcher = IOC_MATCHER
+
+# IP 地址分类：内置保留地址段 + config.json 中的企业内网网段 + 离线富化数据，查询结果按 IP 缓存
+IP_INDEX = load_ip_index(folder=IP_DATA_FOLDER)
+_ip_index = IP_INDEX
+
+# 安全事件记录解析（wevtutil qe /f:text 与 /f:xml）
+HIGH_SEVERITY_EVENT_IDS = {'4625', '4648', '4719'}
+EVENT_COUNTERS = {'4625': 'failed_logins', '4624': 'successful_logins', '6005': 'system_starts'}
+EVENT_RECORD_MAX_LINES = 200  # 单条记录最多行数，超出即视为记录结束
+EVENT_RECORD_MAX_CHARS = 64 * 1024  # XML 记录最多缓存的字符数（System 段在记录开头）
+SECURITY_EVENT_LIMIT = 100  # 报告中保留的事件详情条数
+EVENT_KEYWORDS = ('event', '事件')  # 记录头、Event ID 行和 XML 标签都包含其中之一
+TEXT_RECORD_HEADERS = ('event[', '事件[')
+# /f:text 字段名（小写） -> 事件字段
+TEXT_EVENT_FIELDS = {
+    'event id': 'event_id', '事件 id': 'event_id',
+    'date': 'timestamp', '日期': 'timestamp',
+    'account name': 'account', '帐户名称': 'account', '账户名称': 'account', '帐户名': 'account', '账户名': 'account',
+    'source network address': 'source_ip', 'network address': 'source_ip',
+    '源网络地址': 'source_ip', '网络地址': 'source_ip'
+}
+# 行首的记录头或 "字段名:"（在小写行上匹配，只有字面量分支，不会回溯）
+EVENT_LINE_PATTERN = re.compile(r'\s*(%s)[ \t]*([:：]?)' % '|'.join(
+    re.escape(key) for key in sorted(TEXT_RECORD_HEADERS + tuple(TEXT_EVENT_FIELDS), key=len, reverse=True)))
+# system_info_collector.py 把 wevtutil 输出保存为 JSON 字符串，需要先反转义
+JSON_ESCAPE_PATTERN = re.compile(r'\\(u[0-9a-fA-F]{4}|.)', re.DOTALL)
+JSON_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}
+XML_ENTITIES = {'&quot;': '"', '&apos;': "'"}
+
+def build_process_info(match):
+    """根据正则匹配结果构建进程信息"""
+    process_name = match.group(1)
+    pid = match.group(2)
+    
+    process_info = {
+        'name': process_name,
+        'pid': pid,
+        'suspicious': False,
+        'reason': ''
     }
+    
+    # 检查可疑进程
+    if current_ioc_matcher().match_name(process_name):
+        process_info['suspicious'] = True
+        process_info['reason'] = '可疑进程名称'
+    
+    return process_info
 
-def analyze_network_connections(content):
-    """分析网络连接"""
-    connections = []
-    external_connections = []
-    suspicious_connections = []
-    
-    # 匹配网络连接的正则表达式
-    netstat_pattern = r'(TCP|UDP)\s+(\d+\.\d+\.\d+\.\d+):(\d+)\s+(\d+\.\d+\.\d+\.\d+):(\d+)\s+(\w+)\s+(\d+)'
-    
-    matches = re.finditer(netstat_pattern, content, re.IGNORECASE)
-    for match in matches:
-        protocol = match.group(1)
-        local_ip = match.group(2)
-        local_port = match.group(3)
-        remote_ip = match.group(4)
-        remote_port = match.group(5)
-        state = match.group(6)
-        pid = match.group(7)
-        
-        connection_info = {
-            'protocol': protocol,
-            'local_ip': local_ip,
-            'local_port': local_port,
-            'remote_ip': remote_ip,
-            'remote_port': remote_port,
-            'state': state,
-            'pid': pid,
-            'suspicious': False,
-            'reason': ''
-        }
-        
-        # 检查是否为外部连接
-        if not remote_ip.startswith(('127.', '0.0.0.0', '::1')):
-            external_connections.append(connection_info)
-            
-            # 检查可疑端口
-            suspicious_ports = ['4444', '6666', '1337', '31337', '8080', '9999']
-            if remote_port in suspicious_ports:
-                connection_info['suspicious'] = True
-                connection_info['reason'] = f'可疑端口: {remote_port}'
-                suspicious_connections.append(connection_info)
-        
-        connections.append(connection_info)
+def current_ioc_matcher():
+    """返回加入当前可疑进程名和端口的情报匹配器（列表随 config.json 变化时重建，情报目录数据共享）"""
+    global _ioc_matcher
+    ruleset = RULE_ENGINE.current()
+    indicators = (ruleset.suspicious_process_names, ruleset.suspicious_ports)
+    if _ioc_matcher.rule_indicators != indicators:
+        _ioc_matcher = IOC_MATCHER.with_rule_indicators(*indicators)
+    return _ioc_matcher
+
+def current_ip_index():
+    """返回使用当前企业内网网段的 IP 索引（网段随 config.json 变化时重建，离线数据共享）"""
+    global _ip_index
+    networks = RULE_ENGINE.current().internal_networks
+    if _ip_index.internal_networks != networks:
+        _ip_index = IP_INDEX.with_internal_networks(networks)
+    return _ip_index
+
+def is_external_ip(remote_ip):
+    """判断远程地址是否为外部地址（不属于保留地址段和企业内网网段）"""
+    return current_ip_index().is_external(remote_ip)
+
+def build_connection_info(match):
+    """根据netstat匹配结果构建连接信息"""
+    protocol, local_ip, local_port, remote_ip, remote_port, state, pid = match.groups()
     
-    return {
-        'total_connections': len(connections),
-        'external_connections': len(external_connections),
-        'suspicious_connections': len(suspicious_connections),
-        'connection_list': connections[:50],
-        'external_list': external_connections,
-        'suspicious_list': suspicious_connections
+    connection_info = {
+        'protocol': protocol,
+        'local_ip': local_ip,
+        'local_port': local_port,
+        'remote_ip': remote_ip,
+        'remote_port': remote_port,
+        'state': state,
+        'pid': pid,
+        'suspicious': False,
+        'reason': ''
     }
+    
+    # 地址范围和离线富化信息（ASN、组织、国家）
+    ip_info = current_ip_index().lookup(remote_ip) or {}
+    connection_info['remote_scope'] = ip_info.get('scope')
+    for key in ('asn', 'org', 'country'):
+        if ip_info.get(key):
+            connection_info[f'remote_{key}'] = ip_info[key]
+    
+    # 检查威胁情报IP、黑名单和可疑端口（仅针对外部连接）
+    if ip_info.get('external', True):
+        ioc_matcher = current_ioc_matcher()
+        if ioc_matcher.match_ip(remote_ip):
+            connection_info['suspicious'] = True
+            connection_info['reason'] = f'威胁情报IP: {remote_ip}'
+        elif ip_info.get('blocklist'):
+            connection_info['suspicious'] = True
+            connection_info['reason'] = f"黑名单IP: {remote_ip} ({ip_info['blocklist']})"
+        elif ioc_matcher.match_port(remote_port):
+            connection_info['suspicious'] = True
+            connection_info['reason'] = f'可疑端口: {remote_port}'
+    
+    return connection_info
 
-def analyze_users(content):
-    """分析用户信息"""
-    users = []
-    admin_users = []
-    hidden_users = []
-    
-    # 匹配用户信息
-    user_patterns = [
-        r'User accounts for \\\\.*?\n\n(.*?)\n',  # net user格式
-        r'(\w+)\s+.*?Administrator',  # 管理员用户
-        r'UserList.*?(\w+)\s+REG_DWORD\s+0x0',  # 隐藏用户
-    ]
-    
-    # 简单的用户提取
-    lines = content.split('\n')
-    for line in lines:
-        if 'net user' in line.lower() or 'user accounts' in line.lower():
-            # 提取用户名
-            words = line.split()
-            for word in words:
-                if len(word) > 2 and word.isalnum():
-                    users.append({
-                        'name': word,
-                        'type': 'standard',
-                        'hidden': False
-                    })
-    
-    # 检查管理员用户
-    admin_pattern = r'Administrators.*?\n(.*?)\n'
-    admin_matches = re.finditer(admin_pattern, content, re.IGNORECASE | re.DOTALL)
-    for match in admin_matches:
-        admin_section = match.group(1)
-        admin_names = re.findall(r'(\w+)', admin_section)
-        for name in admin_names:
-            if len(name) > 2:
-                admin_users.append({
-                    'name': name,
-                    'type': 'administrator',
-                    'hidden': False
-                })
+def build_security_event(fields):
+    """根据解析出的记录字段构建安全事件"""
+    event_id = fields['event_id']
+    timestamp = fields.get('timestamp', 'Unknown')
+    if len(timestamp) >= 19 and timestamp[4] == '-':
+        timestamp = timestamp[:19]  # 精确到秒，去掉毫秒和时区
     
     return {
-        'total_users': len(set([u['name'] for u in users])),
-        'admin_users': len(admin_users),
-        'hidden_users': len(hidden_users),
-        'user_list': users[:20],
-        'admin_list': admin_users,
-        'hidden_list': hidden_users
+        'event_id': event_id,
+        'timestamp': timestamp,
+        'account': fields.get('account'),
+        'source_ip': fields.get('source_ip'),
+        'severity': 'High' if event_id in HIGH_SEVERITY_EVENT_IDS else 'Medium'
     }
 
-def analyze_security_events(content):
-    """分析安全事件"""
-    events = {
-        'failed_logins': 0,
-        'successful_logins': 0,
-        'system_starts': 0,
-        'security_events': []
-    }
+def find_xml_event_start(lower, pos):
+    """查找 <Event> 开始标签（跳过 <EventID>、<EventData> 等），返回位置或 -1"""
+    while True:
+        start = lower.find('<event', pos)
+        if start < 0 or lower[start + 6:start + 7] in ('', ' ', '>', '/', '\t', '\r', '\n'):
+            return start
+        pos = start + 6
+
+def xml_attribute(text, name, pos=0):
+    """读取 pos 之后第一个 name= 属性的值，返回 (值, 结束位置)，找不到时返回 (None, -1)"""
+    start = text.find(name + '=', pos)
+    if start < 0:
+        return None, -1
+    quote = text[start + len(name) + 1:start + len(name) + 2]
+    end = text.find(quote, start + len(name) + 2) if quote in ('"', "'") else -1
+    if end < 0:
+        return None, -1
+    return text[start + len(name) + 2:end], end
+
+def xml_element_text(text, tag, pos=0):
+    """读取 pos 之后第一个 <tag ...>文本</tag> 的文本，返回 (文本, 结束位置)"""
+    start = text.find('<' + tag, pos)
+    if start < 0:
+        return None, -1
+    close = text.find('>', start)
+    if close < 0 or text[close - 1] == '/':
+        return '', close
+    end = text.find('<', close)
+    if end < 0:
+        return None, -1
+    return xml_unescape(text[close + 1:end].strip(), XML_ENTITIES), end
+
+def extract_xml_event_fields(text):
+    """从一条 /f:xml 事件记录中提取字段（只用线性查找，不做正则回溯）"""
+    fields = {}
+    event_id, _ = xml_element_text(text, 'EventID')
+    if event_id:
+        fields['event_id'] = event_id
+    timestamp, _ = xml_attribute(text, 'SystemTime')
+    if timestamp:
+        fields['timestamp'] = timestamp
     
-    # 统计失败登录 (Event ID 4625)
-    failed_login_pattern = r'Event ID.*?4625'
-    events['failed_logins'] = len(re.findall(failed_login_pattern, content, re.IGNORECASE))
+    data = {}
+    pos = 0
+    while True:
+        name, pos = xml_attribute(text, '<Data Name', pos)
+        if name is None:
+            break
+        close = text.find('>', pos)
+        if close < 0:
+            break
+        if text[close - 1] == '/':
+            data[name], pos = '', close
+            continue
+        end = text.find('<', close)
+        if end < 0:
+            break
+        data[name], pos = xml_unescape(text[close + 1:end].strip(), XML_ENTITIES), end
     
-    # 统计成功登录 (Event ID 4624)
-    success_login_pattern = r'Event ID.*?4624'
-    events['successful_logins'] = len(re.findall(success_login_pattern, content, re.IGNORECASE))
+    for name in ('TargetUserName', 'SubjectUserName'):
+        if data.get(name, '-') not in ('', '-'):
+            fields['account'] = data[name]
+            break
+    if data.get('IpAddress', '-') not in ('', '-'):
+        fields['source_ip'] = data['IpAddress']
+    return fields
+
+def iter_json_strings(line):
+    """逐个产出一行 JSON 文本中的字符串字面量（未反转义）"""
+    pos = 0
+    while True:
+        start = line.find('"', pos)
+        if start < 0:
+            return
+        end = start + 1
+        while True:
+            end = line.find('"', end)
+            if end < 0:
+                return
+            backslashes = 0
+            while line[end - 1 - backslashes] == '\\':
+                backslashes += 1
+            if backslashes % 2 == 0:
+                break
+            end += 1
+        yield line[start + 1:end]
+        pos = end + 1
+
+def unescape_json_text(text):
+    """反转义 JSON 字符串内容"""
+    def replace(match):
+        escape = match.group(1)
+        if len(escape) == 5:
+            return chr(int(escape[1:], 16))
+        return JSON_ESCAPES.get(escape, escape)
+    return JSON_ESCAPE_PATTERN.sub(replace, text)
+
+def open_record_tail(tail_pattern, text, pos):
+    """text 中 pos 之后可能在下一行继续的未完成记录（需要带到下一行的部分），没有时返回空字符串"""
+    match = tail_pattern.search(text, pos)
+    if match is None or len(text) - match.start() > RECORD_CARRY_MAX_CHARS:
+        return ''
+    return text[match.start():]
+
+def extract_admin_names(admin_section):
+    """从管理员组成员行中提取用户名"""
+    return [{
+        'name': name,
+        'type': 'administrator',
+        'hidden': False
+    } for name in re.findall(r'(\w+)', admin_section) if len(name) > 2]
+
+def extract_user_names(line):
+    """从 net user 输出行中提取用户名"""
+    if 'net user' in line.lower() or 'user accounts' in line.lower():
+        return [{
+            'name': word,
+            'type': 'standard',
+            'hidden': False
+        } for word in line.split() if len(word) > 2 and word.isalnum()]
+    return []
+
+def capped(items, limit):
+    """检查点中保存的列表：(前 limit 条, 截掉的条数)"""
+    return items[:limit], max(0, len(items) - limit)
+
+def restore_analyzer_state(analyzer, state):
+    """把检查点中的状态写回分析器，只接受分析器已有的属性"""
+    for key, value in state.items():
+        if key in vars(analyzer):
+            setattr(analyzer, key, value)
+
+# ==================== 单遍扫描分析 ====================
+# 内容只按行遍历一次：每行转换一次小写，按分派表中的关键字前置过滤后，
+# 交给感兴趣的分析器做增量分析。上传文件按行增量解码后走同一条路径，
+# 除结果列表本身外，内存占用与文件大小无关。
+
+class StreamProcessAnalyzer:
+    """进程分析（增量版本）"""
     
-    # 统计系统启动 (Event ID 6005)
-    system_start_pattern = r'Event ID.*?6005'
-    events['system_starts'] = len(re.findall(system_start_pattern, content, re.IGNORECASE))
+    keywords = ('.exe', 'name:', 'pid:')
     
-    # 提取安全事件详情
-    event_pattern = r'Event ID.*?(\d+).*?(\d{4}-\d{2}-\d{2}.*?\d{2}:\d{2}:\d{2})'
-    event_matches = re.finditer(event_pattern, content, re.IGNORECASE)
+    def __init__(self):
+        self.total = 0
+        # 原实现按模式依次扫描全文，这里按模式分桶以保持相同的输出顺序
+        self.process_lists = [[] for _ in PROCESS_PATTERNS]
+        self.suspicious_lists = [[] for _ in PROCESS_PATTERNS]
+        # 每个模式上一行留下的未完成记录
+        self.carries = ['' for _ in PROCESS_PATTERNS]
+        self.suspicious_dropped = 0  # 保存检查点时截掉的可疑进程数
     
-    for match in event_matches:
-        event_id = match.group(1)
-        timestamp = match.group(2) if len(match.groups()) > 1 else 'Unknown'
-        
-        events['security_events'].append({
-            'event_id': event_id,
-            'timestamp': timestamp,
-            'severity': 'High' if event_id in ['4625', '4648', '4719'] else 'Medium'
-        })
+    def feed(self, line, lower):
+        carries = self.carries
+        for index, (keyword, pattern, tail_keyword, tail_pattern) in enumerate(PROCESS_PATTERNS):
+            carry = carries[index]
+            if carry:
+                text = carry + line
+                matchable = open_tail = True
+            else:
+                text = line
+                matchable = keyword in lower
+                if tail_keyword[-1] == ':':
+                    open_tail = lower.rstrip().endswith(':') and tail_keyword in lower
+                else:
+                    open_tail = tail_keyword in lower
+                if not matchable and not open_tail:
+                    continue
+            end = 0
+            for match in (pattern.finditer(text) if matchable else ()):
+                end = match.end()
+                process_info = build_process_info(match)
+                self.total += 1
+                if len(self.process_lists[index]) < 50:
+                    self.process_lists[index].append(process_info)
+                if process_info['suspicious']:
+                    self.suspicious_lists[index].append(process_info)
+            carries[index] = open_record_tail(tail_pattern, text, end) if open_tail else ''
+        # 有未完成的记录时需要无条件接收下一行
+        return any(carries)
+    
+    def merge(self, other):
+        """合并后一个分片的结果"""
+        self.total += other.total
+        for mine, theirs in zip(self.process_lists, other.process_lists):
+            mine.extend(theirs[:50 - len(mine)])
+        for mine, theirs in zip(self.suspicious_lists, other.suspicious_lists):
+            mine.extend(theirs)
+        self.suspicious_dropped += other.suspicious_dropped
+        self.carries = list(other.carries)
+    
+    def state(self, limit):
+        """检查点状态（JSON 可序列化，列表最多保留 limit 条，计数不变）"""
+        buckets = [capped(bucket, limit) for bucket in self.suspicious_lists]
+        return {
+            'total': self.total,
+            'process_lists': self.process_lists,
+            'suspicious_lists': [bucket for bucket, _ in buckets],
+            'suspicious_dropped': self.suspicious_dropped + sum(dropped for _, dropped in buckets),
+            'carries': self.carries
+        }
+    
+    def restore(self, state):
+        restore_analyzer_state(self, state)
     
-    return events
+    def result(self):
+        suspicious_list = [p for bucket in self.suspicious_lists for p in bucket]
+        return {
+            'total_processes': self.total,
+            'suspicious_processes': len(suspicious_list) + self.suspicious_dropped,
+            'process_list': [p for bucket in self.process_lists for p in bucket][:50],  # 限制显示数量
+            'suspicious_list': suspicious_list
+        }
 
-def calculate_threat_level(analysis_results):
-    """计算威胁等级"""
-    score = 0
-    issues = []
+class StreamNetworkAnalyzer:
+    """网络连接分析（增量版本）"""
     
-    # 检查可疑进程
-    if analysis_results['processes']['suspicious_processes'] > 0:
-        score += analysis_results['processes']['suspicious_processes'] * 20
-        issues.append(f"发现 {analysis_results['processes']['suspicious_processes']} 个可疑进程")
-    
-    # 检查外部连接
-    if analysis_results['network']['external_connections'] > 10:
-        score += 15
-        issues.append(f"外部连接数量较多 ({analysis_results['network']['external_connections']})")
-    
-    # 检查可疑连接
-    if analysis_results['network']['suspicious_connections'] > 0:
-        score += analysis_results['network']['suspicious_connections'] * 25
-        issues.append(f"发现 {analysis_results['network']['suspicious_connections']} 个可疑网络连接")
-    
-    # 检查管理员用户
-    if analysis_results['users']['admin_users'] > 3:
-        score += 10
-        issues.append(f"管理员用户数量较多 ({analysis_results['users']['admin_users']})")
-    
-    # 检查失败登录
-    if analysis_results['security']['failed_logins'] > 10:
-        score += analysis_results['security']['failed_logins']
-        issues.append(f"失败登录尝试较多 ({analysis_results['security']['failed_logins']})")
-    
-    # 确定威胁等级
-    if score >= 80:
-        level = "严重"
-        color = "red"
-    elif score >= 50:
-        level = "高"
-        color = "orange"
-    elif score >= 20:
-        level = "中"
-        color = "yellow"
-    else:
-        level = "低"
-        color = "green"
+    keywords = ('tcp', 'udp')
     
-    return {
-        'score': score,
-        'level': level,
-        'color': color,
-        'issues': issues
-    }
+    def __init__(self):
+        self.total = 0
+        self.connection_list = []
+        self.external_list = []
+        self.suspicious_list = []
+        self.carry = ''  # 上一行留下的未完成记录
+        self.external_dropped = 0  # 保存检查点时截掉的条数
+        self.suspicious_dropped = 0
+    
+    def feed(self, line, lower):
+        text = self.carry + line if self.carry else line
+        end = 0
+        for match in NETSTAT_PATTERN.finditer(text):
+            end = match.end()
+            connection_info = build_connection_info(match)
+            self.total += 1
+            if len(self.connection_list) < 50:
+                self.connection_list.append(connection_info)
+            
+            # 检查是否为外部连接
+            if connection_info['remote_scope'] in (None, 'public'):
+                self.external_list.append(connection_info)
+                if connection_info['suspicious']:
+                    self.suspicious_list.append(connection_info)
+        self.carry = open_record_tail(NETSTAT_TAIL_PATTERN, text, end)
+        return bool(self.carry)
+    
+    def merge(self, other):
+        """合并后一个分片的结果"""
+        self.total += other.total
+        self.connection_list.extend(other.connection_list[:50 - len(self.connection_list)])
+        self.external_list.extend(other.external_list)
+        self.suspicious_list.extend(other.suspicious_list)
+        self.external_dropped += other.external_dropped
+        self.suspicious_dropped += other.suspicious_dropped
+        self.carry = other.carry
+    
+    def state(self, limit):
+        """检查点状态（JSON 可序列化，列表最多保留 limit 条，计数不变）"""
+        external_list, external_dropped = capped(self.external_list, limit)
+        suspicious_list, suspicious_dropped = capped(self.suspicious_list, limit)
+        return {
+            'total': self.total,
+            'connection_list': self.connection_list,
+            'external_list': external_list,
+            'suspicious_list': suspicious_list,
+            'external_dropped': self.external_dropped + external_dropped,
+            'suspicious_dropped': self.suspicious_dropped + suspicious_dropped,
+            'carry': self.carry
+        }
+    
+    def restore(self, state):
+        restore_analyzer_state(self, state)
+    
+    def result(self):
+        return {
+            'total_connections': self.total,
+            'external_connections': len(self.external_list) + self.external_dropped,
+            'suspicious_connections': len(self.suspicious_list) + self.suspicious_dropped,
+            'connection_list': self.connection_list,
+            'external_list': self.external_list,
+            'suspicious_list': self.suspicious_list
+        }
 
-def generate_recommendations(analysis_results, threat_assessment):
-    """生成安全建议"""
-    recommendations = []
-    
-    if analysis_results['processes']['suspicious_processes'] > 0:
-        recommendations.append({
-            'priority': 'High',
-            'category': '进程安全',
-            'description': '发现可疑进程，建议立即检查进程合法性',
-            'action': '使用 tasklist /v 查看详细进程信息，必要时使用 taskkill 终止可疑进程'
-        })
+class StreamUserAnalyzer:
+    """用户分析（增量版本）"""
     
-    if analysis_results['network']['suspicious_connections'] > 0:
-        recommendations.append({
-            'priority': 'High',
-            'category': '网络安全',
-            'description': '发现可疑网络连接，可能存在恶意通信',
-            'action': '使用 netstat -ano 检查连接详情，考虑阻断可疑IP'
-        })
+    keywords = ('net user', 'user accounts', 'administrators')
     
-    if analysis_results['users']['admin_users'] > 3:
-        recommendations.append({
-            'priority': 'Medium',
-            'category': '用户管理',
-            'description': '管理员账户数量较多，建议审查权限分配',
-            'action': '使用 net localgroup Administrators 检查管理员列表'
-        })
+    def __init__(self):
+        self.user_names = set()
+        self.user_list = []
+        self.admin_list = []
+        self.hidden_list = []
+        # 上一行命中了 "Administrators"，下一行即为成员行
+        self.admin_pending = False
+        # 保存检查点时截掉的条数（截掉的用户名之后再次出现会被重复计数）
+        self.names_dropped = 0
+        self.admin_dropped = 0
+        self.hidden_dropped = 0
     
-    if analysis_results['security']['failed_logins'] > 10:
-        recommendations.append({
-            'priority': 'Medium',
-            'category': '访问控制',
-            'description': '检测到多次登录失败，可能存在暴力破解攻击',
-            'action': '检查事件日志，考虑启用账户锁定策略'
-        })
+    def feed(self, line, lower):
+        for user in extract_user_names(line):
+            self.user_names.add(user['name'])
+            if len(self.user_list) < 20:
+                self.user_list.append(user)
+        
+        # 等价于 r'Administrators.*?\n(.*?)\n' (DOTALL)：触发行与成员行都必须以换行结尾
+        terminated = line.endswith('\n')
+        if self.admin_pending:
+            self.admin_pending = False
+            if terminated:
+                self.admin_list.extend(extract_admin_names(line[:-1]))
+        elif terminated and 'administrators' in lower:
+            self.admin_pending = True
+        
+        # 返回 True 表示无论下一行是否命中关键字都需要交给本分析器
+        return self.admin_pending
+    
+    def merge(self, other):
+        """合并后一个分片的结果"""
+        self.user_names |= other.user_names
+        self.user_list.extend(other.user_list[:20 - len(self.user_list)])
+        self.admin_list.extend(other.admin_list)
+        self.hidden_list.extend(other.hidden_list)
+        self.names_dropped += other.names_dropped
+        self.admin_dropped += other.admin_dropped
+        self.hidden_dropped += other.hidden_dropped
+        self.admin_pending = other.admin_pending
+    
+    def state(self, limit):
+        """检查点状态（JSON 可序列化，列表最多保留 limit 条，计数不变）"""
+        user_names, names_dropped = capped(sorted(self.user_names), limit)
+        admin_list, admin_dropped = capped(self.admin_list, limit)
+        hidden_list, hidden_dropped = capped(self.hidden_list, limit)
+        return {
+            'user_names': user_names,
+            'user_list': self.user_list,
+            'admin_list': admin_list,
+            'hidden_list': hidden_list,
+            'admin_pending': self.admin_pending,
+            'names_dropped': self.names_dropped + names_dropped,
+            'admin_dropped': self.admin_dropped + admin_dropped,
+            'hidden_dropped': self.hidden_dropped + hidden_dropped
+        }
+    
+    def restore(self, state):
+        restore_analyzer_state(self, state)
+        self.user_names = set(self.user_names)
+    
+    def result(self):
+        return {
+            'total_users': len(self.user_names) + self.names_dropped,
+            'admin_users': len(self.admin_list) + self.admin_dropped,
+            'hidden_users': len(self.hidden_list) + self.hidden_dropped,
+            'user_list': self.user_list,
+            'admin_list': self.admin_list,
+            'hidden_list': self.hidden_list
+        }
+
+class StreamSecurityAnalyzer:
+    """安全事件分析（增量版本）
+
+    按记录解析 wevtutil qe 的 /f:text 与 /f:xml 输出：以 Event[N]: 行或 <Event> 标签为记录边界，
+    在一遍扫描中提取事件ID、时间、账户和源地址，每行只处理一次。
+    """
+    
+    keywords = EVENT_KEYWORDS
+    
+    def __init__(self):
+        self.events = {
+            'failed_logins': 0,
+            'successful_logins': 0,
+            'system_starts': 0,
+            'total_events': 0,
+            'security_events': []
+        }
+        self.record = None  # 尚未结束的记录
+    
+    def feed(self, line, lower):
+        if '"event[' in lower:
+            # JSON 中保存的 wevtutil 输出：逐个字符串反转义后按行处理
+            for text in iter_json_strings(line):
+                if 'event' in text.lower():
+                    for part in io.StringIO(unescape_json_text(text), newline='\n'):
+                        self.feed_line(part, part.lower())
+        else:
+            self.feed_line(line, lower)
+        # 记录未结束时需要无条件接收下一行
+        return self.record is not None
+    
+    def feed_line(self, line, lower):
+        match = EVENT_LINE_PATTERN.match(lower)
+        key = match.group(1) if match else None
+        if key in TEXT_RECORD_HEADERS:
+            self.close_record()
+            self.record = {'format': 'text', 'lines': 0, 'fields': {}}
+        elif (self.record is not None and self.record['format'] == 'xml') or (
+                '<event' in lower and find_xml_event_start(lower, 0) >= 0):
+            self.feed_xml(line, lower, 0)
+            return
+        elif key and match.group(2):
+            field = TEXT_EVENT_FIELDS[key]
+            value = line[match.end():].strip()
+            if field == 'event_id':
+                value = value.split(None, 1)[0] if value else ''
+                if not value.isdigit() or len(value) > 5:
+                    value = ''
+                elif self.record is None or 'event_id' in self.record['fields']:
+                    # 没有 Event[N]: 记录头的输出：每个 Event ID 行开始一条新记录
+                    self.close_record()
+                    self.record = {'format': 'text', 'lines': 0, 'fields': {}}
+            if self.record is not None and value not in ('', '-'):
+                if field == 'account':
+                    # 描述中最后一个账户名才是目标账户（之前的是 Subject）
+                    self.record['fields']['account'] = value
+                else:
+                    self.record['fields'].setdefault(field, value)
+        
+        record = self.record
+        if record is not None:
+            # 记录行数达到上限时强制结束，保证单条记录的开销有界
+            record['lines'] += 1
+            if record['lines'] >= EVENT_RECORD_MAX_LINES:
+                self.close_record()
+    
+    def feed_xml(self, line, lower, pos):
+        """处理一行中 pos 之后的 XML 片段：<Event> 开始新记录，</Event> 结束记录"""
+        while True:
+            record = self.record
+            if record is not None and record['format'] == 'xml':
+                next_start = find_xml_event_start(lower, pos)
+                end = lower.find('</event>', pos)
+                if end >= 0 and (next_start < 0 or end < next_start):
+                    self.append_xml(line[pos:end + 8])
+                    self.close_record()
+                    pos = end + 8
+                    continue
+                if next_start < 0:
+                    self.append_xml(line[pos:])
+                    record['lines'] += 1
+                    if record['lines'] >= EVENT_RECORD_MAX_LINES:
+                        self.close_record()
+                    return
+                # 上一条记录缺少结束标签
+                self.append_xml(line[pos:next_start])
+                pos = next_start
+            
+            start = find_xml_event_start(lower, pos)
+            if start < 0:
+                return
+            self.close_record()
+            self.record = {'format': 'xml', 'lines': 0, 'chunks': [line[start:start + 6]], 'chars': 6}
+            pos = start + 6
+    
+    def append_xml(self, text):
+        record = self.record
+        room = EVENT_RECORD_MAX_CHARS - record['chars']
+        if room > 0:
+            record['chunks'].append(text[:room])
+            record['chars'] += min(len(text), room)
+    
+    def close_record(self):
+        if self.record is not None:
+            self.add_event(self.events, self.record)
+            self.record = None
+    
+    @staticmethod
+    def add_event(events, record):
+        if record['format'] == 'xml':
+            fields = extract_xml_event_fields(''.join(record['chunks']))
+        else:
+            fields = record['fields']
+        event_id = fields.get('event_id')
+        if not event_id:
+            return
+        
+        # 统计失败登录 (4625)、成功登录 (4624)、系统启动 (6005)
+        events['total_events'] += 1
+        counter = EVENT_COUNTERS.get(event_id)
+        if counter:
+            events[counter] += 1
+        if len(events['security_events']) < SECURITY_EVENT_LIMIT:
+            events['security_events'].append(build_security_event(fields))
+    
+    def merge(self, other):
+        """合并后一个分片的结果（分片边界保证边界处没有跨分片的记录）"""
+        self.close_record()
+        for key in ('failed_logins', 'successful_logins', 'system_starts', 'total_events'):
+            self.events[key] += other.events[key]
+        self.events['security_events'].extend(
+            other.events['security_events'][:SECURITY_EVENT_LIMIT - len(self.events['security_events'])])
+        self.record = other.record
+    
+    def state(self, limit):
+        """检查点状态（JSON 可序列化；事件详情和未结束的记录本身有上限）"""
+        return {'events': self.events, 'record': self.record}
+    
+    def restore(self, state):
+        restore_analyzer_state(self, state)
+    
+    def result(self):
+        # 不修改扫描状态：尚未结束的记录在副本上结算
+        events = dict(self.events, security_events=list(self.events['security_events']))
+        if self.record is not None:
+            self.add_event(events, self.record)
+        return events
+
+# 分析结果中的段名 -> 增量分析器
+ANALYZERS = {
+    'processes': StreamProcessAnalyzer,
+    'network': StreamNetworkAnalyzer,
+    'users': StreamUserAnalyzer,
+    'security': StreamSecurityAnalyzer
+}
+
+ANALYZER_TIMING_SAMPLE = 32  # 每 N 行对分析器耗时计时一次，乘以 N 估算总耗时（逐行计时会拖慢扫描约 8%）
+
+class LineScanner:
+    """单遍扫描器：通过关键字分派表把每一行交给感兴趣的分析器"""
+    
+    def __init__(self, sections=None):
+        self.analyzers = {name: ANALYZERS[name]() for name in (sections or ANALYZERS)}
+        self.dispatch_table = [(analyzer.keywords, analyzer) for analyzer in self.analyzers.values()]
+        self.follow = ()  # 要求无条件接收下一行的分析器
+        self.countdown = ANALYZER_TIMING_SAMPLE
+        self.sampled_seconds = dict.fromkeys(self.analyzers, 0.0)
+    
+    def feed(self, line):
+        self.countdown -= 1
+        if not self.countdown:
+            self.countdown = ANALYZER_TIMING_SAMPLE
+            return self.feed_timed(line)
+        lower = line.lower()
+        follow = self.follow
+        wanted = []
+        for keywords, analyzer in self.dispatch_table:
+            if analyzer not in follow:
+                for keyword in keywords:
+                    if keyword in lower:
+                        break
+                else:
+                    continue
+            if analyzer.feed(line, lower):
+                wanted.append(analyzer)
+        self.follow = wanted
+    
+    def feed_timed(self, line):
+        """与 feed 相同，另外记录每个分析器处理这一行的耗时（分派判断计入该分析器）"""
+        lower = line.lower()
+        follow = self.follow
+        wanted = []
+        for name, analyzer in self.analyzers.items():
+            start = time.perf_counter()
+            if analyzer in follow or any(keyword in lower for keyword in analyzer.keywords):
+                if analyzer.feed(line, lower):
+                    wanted.append(analyzer)
+            self.sampled_seconds[name] += time.perf_counter() - start
+        self.follow = wanted
+    
+    def analyzer_seconds(self):
+        """各分析器的估算耗时（秒）"""
+        return {name: seconds * ANALYZER_TIMING_SAMPLE for name, seconds in self.sampled_seconds.items()}
+    
+    def merge(self, other):
+        """按文件顺序合并后一个分片的扫描结果"""
+        for name, analyzer in self.analyzers.items():
+            analyzer.merge(other.analyzers[name])
+            self.sampled_seconds[name] += other.sampled_seconds[name]
+        self.follow = [self.analyzers[name] for name, analyzer in other.analyzers.items()
+                       if analyzer in other.follow]
+    
+    def results(self):
+        return {name: analyzer.result() for name, analyzer in self.analyzers.items()}
+    
+    def state(self, limit):
+        """可保存为 JSON 的扫描状态：计数、每个列表最多 limit 条，以及跨行记录的续接状态"""
+        return {
+            'analyzers': {name: analyzer.state(limit) for name, analyzer in self.analyzers.items()},
+            'follow': [name for name, analyzer in self.analyzers.items() if analyzer in self.follow],
+            'countdown': self.countdown
+        }
+    
+    @classmethod
+    def from_state(cls, state):
+        """从 state() 的结果恢复扫描器（分析器耗时从 0 开始统计）"""
+        scanner = cls([name for name in state['analyzers'] if name in ANALYZERS])
+        for name, analyzer in scanner.analyzers.items():
+            analyzer.restore(state['analyzers'][name])
+        scanner.follow = [scanner.analyzers[name] for name in state['follow'] if name in scanner.analyzers]
+        scanner.countdown = max(1, int(state['countdown']))
+        return scanner
+
+def scan_content(content, sections=None):
+    """对已在内存中的内容做单遍扫描（只按 \\n 切分，与原正则语义一致）"""
+    scanner = LineScanner(sections)
+    for line in io.StringIO(content, newline='\n'):
+        scanner.feed(line)
+    return scanner.results()
+
+def analyze_processes(content):
+    """分析进程信息"""
+    return scan_content(content, ['processes'])['processes']
+
+def analyze_network_connections(content):
+    """分析网络连接"""
+    return scan_content(content, ['network'])['network']
+
+def analyze_users(content):
+    """分析用户信息"""
+    return scan_content(content, ['users'])['users']
+
+def analyze_security_events(content):
+    """分析安全事件"""
+    return scan_content(content, ['security'])['security']
+
+def scan_file_streaming(file_path, encoding=None, progress=None, end=None):
+    """流式扫描文件，返回 (扫描器, 实际使用的编码, 解码后的字符数)
+
+    progress 为可选回调，每读完一个数据块以 (已处理的字节数, 扫描器) 调用一次；end 不为 None 时只扫描到该偏移。
+    """
+    for enc, reader in iter_decoding_attempts(file_path, encoding, end):
+        scanner = LineScanner()
+        char_count = 0
+        reported = 0
+        try:
+            for line in reader:
+                char_count += len(line)
+                scanner.feed(line)
+                if progress and reader.bytes_read != reported:
+                    reported = reader.bytes_read
+                    progress(reported, scanner)
+        except (UnicodeDecodeError, LookupError):
+            # 解码失败时换下一个候选编码重新扫描
+            continue
+        
+        return scanner, enc, char_count
+    
+    return None, None, 0
+
+# ==================== 并行分析（map-reduce） ====================
+# 大文件按行边界切成若干分片，由进程池分别扫描，再按文件顺序合并。
+# 合并规则与逐行扫描完全一致（计数相加、列表拼接后再截断），结果与串行路径相同。
+
+PARALLEL_WORKERS = os.cpu_count() or 1  # 并行分析的进程数
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024  # 超过此大小的文件才启用并行分析
+PARALLEL_SHARD_BYTES = 16 * 1024 * 1024  # 每个分片的目标大小
+
+_shard_executor = None
+_shard_executor_lock = threading.Lock()
+
+def get_shard_executor():
+    """延迟创建分片分析进程池"""
+    global _shard_executor
+    with _shard_executor_lock:
+        if _shard_executor is None:
+            _shard_executor = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS)
+        return _shard_executor
+
+def is_shardable_encoding(encoding):
+    """能否在字节层面按 \\n 切分：换行必须编码为单字节 0x0A 且不会出现在多字节字符中"""
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    return not name.startswith(('utf-16', 'utf-32', 'utf-7')) and '\n'.encode(name) == b'\n'
+
+def previous_line_contains(f, line_start, needle):
+    """判断 line_start 之前的那一行是否包含 needle（ASCII 关键字，不区分大小写）"""
+    end = line_start - 1  # 跳过上一行末尾的换行符
+    overlap = b''
+    while end > 0:
+        begin = max(0, end - STREAM_CHUNK_SIZE)
+        f.seek(begin)
+        block = f.read(end - begin).lower()
+        newline = block.rfind(b'\n')
+        block = block[newline + 1:]
+        if needle in block + overlap:
+            return True
+        if newline >= 0:
+            return False
+        overlap = block[:len(needle) - 1]
+        end = begin
+    return False
+
+def record_continues(f, line_start, encoding):
+    """line_start 之前是否留下了可能在该行继续的进程或连接记录
+
+    跨行记录最多 RECORD_CARRY_MAX_CHARS 个字符，只需重新扫描之前一段内容（从完整的行开始）。
+    """
+    if line_start <= 0:
+        return False
+    if codecs.lookup(encoding).name == 'utf-8-sig':
+        encoding = 'utf-8'
+    begin = max(0, line_start - RECORD_CARRY_MAX_CHARS * 4)
+    f.seek(begin)
+    block = f.read(line_start - begin)
+    if begin > 0 and b'\n' in block:
+        block = block[block.index(b'\n') + 1:]
+    processes, network = StreamProcessAnalyzer(), StreamNetworkAnalyzer()
+    for line in io.StringIO(block.decode(encoding, errors='replace'), newline='\n'):
+        lower = line.lower()
+        processes.feed(line, lower)
+        network.feed(line, lower)
+    return any(processes.carries) or bool(network.carry)
+
+def encode_keywords(keywords, encoding):
+    """把关键字编码为字节串，跳过该编码无法表示的关键字（文件中也不可能出现）"""
+    if codecs.lookup(encoding).name == 'utf-8-sig':
+        encoding = 'utf-8'
+    encoded = []
+    for keyword in keywords:
+        try:
+            encoded.append(keyword.encode(encoding))
+        except UnicodeEncodeError:
+            pass
+    return tuple(encoded)
+
+def is_record_boundary(line, quiet_lines, headers):
+    """该行开始处能否切分事件记录：行本身是记录头，或此前连续 EVENT_RECORD_MAX_LINES 行没有事件关键字"""
+    if quiet_lines >= EVENT_RECORD_MAX_LINES:
+        return True
+    stripped = line.lstrip()
+    if stripped.startswith(b'<event'):
+        return stripped[6:7] in (b'', b' ', b'>', b'/', b'\t', b'\r', b'\n')
+    return stripped.startswith(headers) and b'"event[' not in line
+
+def find_last_line_end(file_path, start, end):
+    """[start, end) 中最后一个换行符之后的偏移，没有换行符时返回 start（只用于可按字节切分的编码）"""
+    with open(file_path, 'rb') as f:
+        while end > start:
+            begin = max(start, end - STREAM_CHUNK_SIZE)
+            f.seek(begin)
+            newline = f.read(end - begin).rfind(b'\n')
+            if newline >= 0:
+                return begin + newline + 1
+            end = begin
+    return start
+
+def find_shard_boundaries(file_path, shard_count, encoding='utf-8'):
+    """计算分片边界：每个边界都位于行首，且保证每个分片开始时扫描器处于初始状态
+
+    - 上一行不含 Administrators（用户分析器在该行之后需要读取下一行）
+    - 之前没有可能在该行继续的进程或连接记录（如行尾的 "Name:"）
+    - 不落在事件记录中间：边界行是记录头，或之前足够多的行里没有事件关键字
+      （记录最多 EVENT_RECORD_MAX_LINES 行，此时任何记录都已结束）
+    """
+    size = os.path.getsize(file_path)
+    keywords = encode_keywords(EVENT_KEYWORDS, encoding)
+    headers = encode_keywords(TEXT_RECORD_HEADERS, encoding)
+    boundaries = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, shard_count):
+            offset = max(size * i // shard_count, boundaries[-1])
+            f.seek(offset)
+            if offset > 0:
+                f.readline()  # 跳到下一行行首
+            quiet_lines = 0
+            while True:
+                line_start = f.tell()
+                if line_start >= size:
+                    break
+                line = f.readline().lower()
+                if is_record_boundary(line, quiet_lines, headers) and \
+                        not previous_line_contains(f, line_start, b'administrators') and \
+                        not record_continues(f, line_start, encoding):
+                    break
+                f.seek(line_start + len(line))
+                quiet_lines = 0 if any(keyword in line for keyword in keywords) else quiet_lines + 1
+            if boundaries[-1] < line_start < size:
+                boundaries.append(line_start)
+    boundaries.append(size)
+    return boundaries
+
+def scan_file_range(scanner, file_path, encoding, start, end):
+    """把文件的一个字节区间（start 位于行首）送入已有的扫描器，返回解码后的字符数"""
+    if start > 0 and codecs.lookup(encoding).name == 'utf-8-sig':
+        encoding = 'utf-8'  # BOM 只出现在文件开头
+    char_count = 0
+    for line in DecodedLineReader(file_path, encoding, start, end):
+        char_count += len(line)
+        scanner.feed(line)
+    return char_count
+
+def scan_file_shard(file_path, encoding, start, end):
+    """进程池工作函数：扫描文件的一个字节区间，返回 (扫描器, 字符数)"""
+    scanner = LineScanner()
+    return scanner, scan_file_range(scanner, file_path, encoding, start, end)
+
+def scan_file_parallel(file_path, encoding, progress=None):
+    """并行扫描大文件，返回值与 scan_file_streaming 相同；无法并行时返回 None"""
+    if PARALLEL_WORKERS < 2 or not is_shardable_encoding(encoding):
+        return None
+    
+    size = os.path.getsize(file_path)
+    shard_count = max(2, -(-size // PARALLEL_SHARD_BYTES))
+    boundaries = find_shard_boundaries(file_path, shard_count, encoding)
+    if len(boundaries) < 3:
+        return None
+    
+    executor = get_shard_executor()
+    futures = [executor.submit(scan_file_shard, file_path, encoding, start, end)
+               for start, end in zip(boundaries, boundaries[1:])]
+    
+    # 按完成顺序汇报进度，按文件顺序合并：从文件开头起连续完成的分片立即合并，
+    # 进度回调拿到的扫描器即为这部分已合并的结果
+    done_bytes = 0
+    shard_sizes = {future: end - start for future, start, end in zip(futures, boundaries, boundaries[1:])}
+    scanner = None
+    char_count = 0
+    merged = 0
+    try:
+        for future in as_completed(futures):
+            future.result()
+            done_bytes += shard_sizes[future]
+            while merged < len(futures) and futures[merged].done():
+                shard_scanner, shard_chars = futures[merged].result()
+                if scanner is None:
+                    scanner = shard_scanner
+                else:
+                    scanner.merge(shard_scanner)
+                char_count += shard_chars
+                merged += 1
+            if progress:
+                progress(done_bytes, scanner)
+    except (UnicodeDecodeError, LookupError):
+        # 某个分片解码失败：交给串行路径按候选编码重试
+        for future in futures:
+            future.cancel()
+        return None
+    
+    return scanner, encoding, char_count
+
+def scan_file(file_path, encoding=None, progress=None, parallel=True):
+    """扫描文件：大文件走并行路径，否则（或并行失败时）走流式串行路径，返回 (扫描器, 编码, 字符数)"""
+    encoding = encoding or detect_encoding(file_path)
+    if parallel and os.path.getsize(file_path) >= PARALLEL_MIN_BYTES:
+        parallel = scan_file_parallel(file_path, encoding, progress)
+        if parallel is not None:
+            return parallel
+    return scan_file_streaming(file_path, encoding, progress)
+
+def analyze_file(file_path, encoding=None, progress=None):
+    """分析文件，返回 (分析结果, 编码, 字符数)"""
+    scanner, encoding, char_count = scan_file(file_path, encoding, progress)
+    return (scanner.results() if scanner else None), encoding, char_count
+
+# 检测规则由 config.json 编译而来，配置文件变化时自动替换，评估时不再解析配置
+RULE_ENGINE = RuleEngine(CONFIG_FILE)
+
+def threat_metrics(analysis_results):
+    """提取规则引擎评估所需的指标"""
+    return {
+        'suspicious_processes': analysis_results['processes']['suspicious_processes'],
+        'external_connections': analysis_results['network']['external_connections'],
+        'suspicious_connections': analysis_results['network']['suspicious_connections'],
+        'admin_users': analysis_results['users']['admin_users'],
+        'hidden_users': analysis_results['users']['hidden_users'],
+        'failed_logins': analysis_results['security']['failed_logins']
+    }
+
+def calculate_threat_level(analysis_results, ruleset=None):
+    """计算威胁等级"""
+    ruleset = ruleset or RULE_ENGINE.current()
+    assessment = ruleset.assess(threat_metrics(analysis_results))
+    return {
+        'score': assessment['score'],
+        'level': assessment['level'],
+        'color': assessment['color'],
+        'issues': assessment['issues'],
+        'findings': assessment['findings']
+    }
+
+def generate_recommendations(analysis_results, threat_assessment, ruleset=None):
+    """生成安全建议"""
+    ruleset = ruleset or RULE_ENGINE.current()
+    recommendations = ruleset.recommendations(threat_assessment['findings'])
     
     # 通用建议
     recommendations.extend([
@@ -352,128 +1316,1265 @@ def generate_recommendations(analysis_results, threat_assessment):
     
     return recommendations
 
-@app.route('/')
+@web.route('/')
 def index():
     """主页"""
     return render_template_string(INDEX_TEMPLATE)
 
-@app.route('/upload', methods=['POST'])
+# ==================== 内容寻址存储与结果缓存 ====================
+# 上传文件按 SHA-256 存储，相同内容只保存一份；分析结果按 (内容哈希, 规则版本) 缓存，
+# 重复上传直接返回已有报告。
+
+ANALYSIS_LOGIC_VERSION = '5'  # 分析逻辑变化时递增以使缓存失效
+
+def ruleset_version(ruleset=None):
+    """规则版本：分析逻辑版本 + 威胁情报指纹 + IP 离线数据指纹 + 检测规则指纹，任何一项变化都会使缓存失效"""
+    ruleset = ruleset or RULE_ENGINE.current()
+    return f'{ANALYSIS_LOGIC_VERSION}-{current_ioc_matcher().version}-{IP_INDEX.version}-{ruleset.version}'
+
+def commit_upload(tmp_path, content_hash):
+    """把写完的临时文件移入内容寻址存储，返回最终路径（相同内容已存在时删除临时文件）"""
+    filepath = os.path.join(UPLOAD_FOLDER, content_hash)
+    if os.path.exists(filepath):
+        # 相同内容已存在，不占用额外磁盘空间
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, filepath)
+    return filepath
+
+def store_stream(stream, max_bytes=None):
+    """边写盘边计算 SHA-256，按内容哈希保存数据流，返回 (文件路径, 内容哈希, 大小)
+
+    超过 max_bytes 时抛出 ValueError，已写入的临时文件会被删除。
+    """
+    tmp_path = os.path.join(UPLOAD_FOLDER, f".upload_{uuid.uuid4().hex}.tmp")
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise ValueError('上传内容超过大小上限')
+                sha256.update(chunk)
+                out.write(chunk)
+        
+        filepath = commit_upload(tmp_path, sha256.hexdigest())
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    return filepath, sha256.hexdigest(), size
+
+class IngestFile:
+    """multipart 解析器直接写入的上传文件
+
+    请求体按块到达时直接写入上传目录的临时文件，同一遍中计算 SHA-256 并截取编码检测样本
+    （开头一段和按预计大小分布在内部的几个窗口），保存和分析前都不必再读一遍文件。
+    其余文件操作（read/seek 等，供归档解压使用）转交给底层文件。
+    """
+    
+    def __init__(self, expected_size=None):
+        self.tmp_path = os.path.join(UPLOAD_FOLDER, f".upload_{uuid.uuid4().hex}.tmp")
+        self.file = open(self.tmp_path, 'w+b')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.prefix = bytearray()
+        # 内部窗口的起点按预计大小计算（分布方式与 read_encoding_sample 相同）
+        self.window_starts = []
+        if expected_size and expected_size > ENCODING_SAMPLE_SIZE + ENCODING_SAMPLE_WINDOWS * ENCODING_WINDOW_SIZE:
+            self.window_starts = [expected_size * i // (ENCODING_SAMPLE_WINDOWS + 1)
+                                  for i in range(1, ENCODING_SAMPLE_WINDOWS + 1)]
+        self.windows = [bytearray() for _ in self.window_starts]
+        self.committed = None
+    
+    def write(self, data):
+        start = self.size
+        self.size += len(data)
+        self.sha256.update(data)
+        if len(self.prefix) < ENCODING_SAMPLE_SIZE:
+            self.prefix += data[:ENCODING_SAMPLE_SIZE - len(self.prefix)]
+        for window_start, window in zip(self.window_starts, self.windows):
+            if len(window) < ENCODING_WINDOW_SIZE and start < window_start + ENCODING_WINDOW_SIZE and self.size > window_start:
+                offset = max(window_start + len(window) - start, 0)
+                window += data[offset:offset + ENCODING_WINDOW_SIZE - len(window)]
+        return self.file.write(data)
+    
+    def __getattr__(self, name):
+        if name == 'file':
+            raise AttributeError(name)  # 打开临时文件失败时避免无限递归
+        return getattr(self.file, name)
+    
+    def encoding_sample(self):
+        """编码检测样本 (开头, [窗口...])，与 read_encoding_sample 的返回值格式相同
+
+        预计大小未知或偏差太大、内部窗口没有截满时返回 None，由分析时从文件读取。
+        """
+        if self.size <= ENCODING_SAMPLE_SIZE + ENCODING_SAMPLE_WINDOWS * ENCODING_WINDOW_SIZE:
+            return bytes(self.prefix), []
+        if not self.windows or any(len(window) < ENCODING_WINDOW_SIZE for window in self.windows):
+            return None
+        return bytes(self.prefix), [bytes(window) for window in self.windows]
+    
+    def commit(self):
+        """写入完成后移入内容寻址存储，返回 (文件路径, 内容哈希, 大小)；重复调用返回同一结果"""
+        if self.committed is None:
+            self.file.close()
+            content_hash = self.sha256.hexdigest()
+            self.committed = (commit_upload(self.tmp_path, content_hash), content_hash, self.size)
+        return self.committed
+    
+    def discard(self):
+        """关闭并删除未提交的临时文件（请求结束、超出大小上限或解析失败时）"""
+        self.file.close()
+        if self.committed is None and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+class UploadRequest(Request):
+    """上传文件直接流式写入上传目录（不再先落到系统临时文件再复制一遍）
+
+    请求体大小由 MAX_CONTENT_LENGTH 限制：声明的 Content-Length 超限时在读取请求体之前、
+    分块传输时在累计字节超限的那一刻抛出 413，已写入的部分在请求结束时删除。
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        ingest = IngestFile(content_length or total_content_length)
+        self.__dict__.setdefault('ingest_files', []).append(ingest)
+        return ingest
+    
+    def close(self):
+        super().close()
+        for ingest in self.__dict__.get('ingest_files', ()):
+            ingest.discard()
+
+def save_upload(file):
+    """按内容哈希保存上传文件，返回 (文件路径, 内容哈希, 大小)"""
+    if isinstance(file.stream, IngestFile):
+        return file.stream.commit()  # 接收时已写盘并计算哈希，只需改名
+    return store_stream(file.stream)
+
+def upload_encoding_sample(file):
+    """接收上传时截取的编码检测样本，没有时返回 None（分析时从文件读取）"""
+    if isinstance(file.stream, IngestFile):
+        return file.stream.encoding_sample()
+    return None
+
+def cache_entry_path(content_hash, version=None):
+    """结果缓存条目路径"""
+    return os.path.join(CACHE_FOLDER, f"{content_hash}_{version or ruleset_version()}.json")
+
+def lookup_cached_report(content_hash):
+    """按 (内容哈希, 规则版本) 查找已有报告，返回缓存条目或 None"""
+    try:
+        with open(cache_entry_path(content_hash), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if report_storage_path(entry.get('report_file', ''))[0] is None:
+        return None
+    return entry
+
+def store_cached_report(content_hash, report_file, threat_level, version=None):
+    """记录缓存条目（先写临时文件再原子替换）"""
+    path = cache_entry_path(content_hash, version)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'report_file': report_file, 'threat_level': threat_level}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# ==================== 报告存储 ====================
+# 报告以 gzip 压缩保存为 <逻辑文件名>.gz，对外仍使用 analysis_*.json 这个逻辑文件名；
+# 旧版未压缩的 .json 报告照常读取。客户端接受 gzip 时直接返回压缩字节。
+
+def report_storage_path(filename):
+    """按逻辑文件名查找报告的存储路径，返回 (路径, 是否压缩)，不存在时返回 (None, False)"""
+    filepath = os.path.join(REPORTS_FOLDER, filename)
+    if os.path.exists(filepath + '.gz'):
+        return filepath + '.gz', True
+    if filename.endswith('.json') and os.path.exists(filepath):
+        return filepath, False
+    return None, False
+
+def write_report(report_filename, analysis_results):
+    """压缩写出报告（先写临时文件再原子替换），返回存储大小"""
+    report_path = os.path.join(REPORTS_FOLDER, report_filename + '.gz')
+    tmp_path = f"{report_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as raw:
+        # 固定 mtime，相同内容得到相同字节
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=REPORT_COMPRESSION_LEVEL, mtime=0) as gz:
+            with io.TextIOWrapper(gz, encoding='utf-8') as f:
+                json.dump(analysis_results, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, report_path)
+    return os.path.getsize(report_path)
+
+def load_report(filename):
+    """读取并解析报告，不存在时返回 None"""
+    filepath, compressed = report_storage_path(filename)
+    if filepath is None:
+        return None
+    opener = gzip.open if compressed else open
+    with opener(filepath, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def send_report(filename, as_attachment=False):
+    """返回报告内容：支持 ETag/Last-Modified 条件请求；客户端接受 gzip 时直接发送压缩字节"""
+    filepath, compressed = report_storage_path(filename)
+    if filepath is None:
+        return None
+    
+    # send_file 会把相对路径解析到应用目录，这里统一用绝对路径
+    filepath = os.path.abspath(filepath)
+    stat = os.stat(filepath)
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    last_modified = datetime.datetime.fromtimestamp(stat.st_mtime, datetime.timezone.utc)
+    
+    if not compressed:
+        return send_file(filepath, mimetype='application/json', as_attachment=as_attachment,
+                         download_name=filename, etag=etag, last_modified=last_modified)
+    
+    if request.accept_encodings['gzip']:
+        response = send_file(filepath, mimetype='application/json', as_attachment=as_attachment,
+                             download_name=filename, etag=f"{etag}-gzip", last_modified=last_modified)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        # 不接受 gzip 的客户端：仅在需要发送正文时才解压
+        response = Response(mimetype='application/json')
+        response.set_etag(f"{etag}-identity")
+        response.last_modified = last_modified
+        response = response.make_conditional(request)
+        if response.status_code == 200:
+            with gzip.open(filepath, 'rb') as f:
+                response.set_data(f.read())
+            if as_attachment:
+                response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    
+    response.vary.add('Accept-Encoding')
+    return response
+
+# ==================== 报告目录 ====================
+# 报告元数据（来源、哈希、威胁评分、各项计数、时间）索引在 SQLite 中，
+# 报告写出时同步更新；首次启用时从已有报告文件补录。
+
+REPORTS_DEFAULT_PAGE_SIZE = 50
+REPORTS_MAX_PAGE_SIZE = 500
+
+catalog = None
+catalog_lock = threading.Lock()
+
+def get_catalog():
+    """获取报告目录（首次使用时创建并补录已有报告）"""
+    global catalog
+    with catalog_lock:
+        if catalog is None:
+            catalog = ReportCatalog(CATALOG_DB)
+            added = catalog.rebuild_from_folder(REPORTS_FOLDER)
+            if added:
+                logger.info(f"报告目录补录 {added} 份已有报告")
+        return catalog
+
+def parse_time_filter(value):
+    """解析时间过滤参数：ISO 时间或相对时长（如 24h、7d、30m），返回时间戳"""
+    if not value:
+        return None
+    units = {'m': 60, 'h': 3600, 'd': 86400}
+    if value[-1] in units and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * units[value[-1]]
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+def record_scan_metrics(scanners, total_bytes, seconds):
+    """记录一次扫描的字节数、吞吐量和各分析器耗时"""
+    ANALYZED_BYTES.inc(total_bytes)
+    if seconds > 0:
+        ANALYSIS_THROUGHPUT.observe(total_bytes / seconds)
+    for scanner in scanners:
+        for name, analyzer_seconds in scanner.analyzer_seconds().items():
+            ANALYZER_SECONDS.observe(analyzer_seconds, analyzer=name)
+
+def analyze_upload(filepath, original_name, report_name, content_hash=None, progress=None, parallel=True,
+                   encoding_sample=None):
+    """分析已保存的上传文件并写出报告，返回 (分析结果, 报告文件名)
+
+    encoding_sample 为接收上传时截取的编码检测样本，提供时不再从文件读取。
+    """
+    # 流式解码并分析，不把整个文件读入内存
+    # 编码只检测一次（采样），解码失败时才换用候选编码
+    with STAGE_SECONDS.time(stage='detect_encoding'):
+        encoding = sniff_encoding(*encoding_sample) if encoding_sample else detect_encoding(filepath)
+    size = os.path.getsize(filepath)
+    start = time.perf_counter()
+    scanner, encoding, char_count = scan_file(filepath, encoding, progress, parallel)
+    scan_seconds = time.perf_counter() - start
+    # 解码与各分析器在同一遍扫描中交替进行，整体记为 scan 阶段，分析器耗时单独采样
+    STAGE_SECONDS.observe(scan_seconds, stage='scan')
+    if not char_count:
+        raise ValueError('无法读取文件内容或文件为空')
+    record_scan_metrics([scanner], size, scan_seconds)
+    if progress:
+        progress(size, scanner, final=True)
+    stream_results = scanner.results()
+    
+    file_info = {
+        'name': original_name,
+        'size': size,
+        'encoding': encoding,
+        'sha256': content_hash,
+        'upload_time': datetime.datetime.now().isoformat()
+    }
+    return build_report(stream_results, file_info, report_name)
+
+def build_report(stream_results, file_info, report_name):
+    """在扫描结果上补充威胁评估和处置建议并保存报告，返回 (分析结果, 报告文件名)"""
+    analysis_results = {'file_info': file_info}
+    analysis_results.update(stream_results)
+    
+    # 同一份报告的评估、建议和版本号使用同一个规则集
+    ruleset = RULE_ENGINE.current()
+    analysis_results['ruleset_version'] = ruleset_version(ruleset)
+    
+    # 威胁评估
+    with STAGE_SECONDS.time(stage='threat_assessment'):
+        threat_assessment = calculate_threat_level(analysis_results, ruleset)
+    analysis_results['threat_assessment'] = threat_assessment
+    
+    # 生成建议
+    with STAGE_SECONDS.time(stage='recommendations'):
+        recommendations = generate_recommendations(analysis_results, threat_assessment, ruleset)
+    analysis_results['recommendations'] = recommendations
+    
+    # 保存分析报告
+    report_filename = f"analysis_{report_name}.json"
+    with STAGE_SECONDS.time(stage='report_write'):
+        stored_size = write_report(report_filename, analysis_results)
+    
+    # 写入报告目录，/reports 不再需要逐个 stat 报告文件
+    with STAGE_SECONDS.time(stage='catalog'):
+        get_catalog().add_report(report_filename, analysis_results, stored_size, time.time(),
+                                 analysis_results['ruleset_version'])
+    
+    logger.info(f"分析完成，报告保存至: {report_filename}")
+    return analysis_results, report_filename
+
+# ==================== 分析任务队列 ====================
+# /upload 只负责保存文件并入队，分析在有界线程池中执行，客户端通过任务ID轮询状态。
+
+ANALYSIS_WORKERS = 4  # 每个进程同时执行分析的任务数
+MAX_QUEUED_JOBS = 100  # 排队+执行中的任务上限（所有进程合计），超出时拒绝新上传
+JOB_RETENTION_SECONDS = 3600  # 已结束任务保留的时间
+JOB_PROGRESS_INTERVAL = 0.5  # 进度写入任务存储的最小间隔（秒）
+PARTIAL_FINDINGS_LIMIT = 20  # 阶段性结果中保留的可疑进程/连接数
+
+job_store = None
+jobs_lock = threading.Lock()
+_job_executor = None
+
+def get_job_store():
+    """获取任务存储（任务状态放在 SQLite 中，任意工作进程都能查询）"""
+    global job_store
+    with jobs_lock:
+        if job_store is None:
+            job_store = JobStore(JOBS_DB)
+        return job_store
+
+def get_job_executor():
+    """延迟创建线程池（多进程部署时每个进程在 fork 之后各自创建）"""
+    global _job_executor
+    with jobs_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='winxy-analysis')
+        return _job_executor
+
+def update_job(job_id, **fields):
+    """更新任务状态"""
+    get_job_store().update(job_id, **fields)
+
+def partial_findings(scanner):
+    """扫描中途的阶段性结果：各项计数、按当前计数估算的威胁评分和最先发现的可疑项"""
+    results = scanner.results()
+    metrics = threat_metrics(results)
+    assessment = RULE_ENGINE.current().assess(metrics)
+    metrics.update(total_processes=results['processes']['total_processes'],
+                   total_connections=results['network']['total_connections'],
+                   total_events=results['security']['total_events'])
+    return {
+        'score': assessment['score'],
+        'level': assessment['level'],
+        'counts': metrics,
+        'suspicious_processes': results['processes']['suspicious_list'][:PARTIAL_FINDINGS_LIMIT],
+        'suspicious_connections': results['network']['suspicious_list'][:PARTIAL_FINDINGS_LIMIT]
+    }
+
+def analyzer_summaries(scanner):
+    """扫描结束时各分析器的结果摘要（计数字段）和估算耗时"""
+    seconds = scanner.analyzer_seconds()
+    return [{
+        'name': name,
+        'seconds': round(seconds[name], 3),
+        'summary': {key: value for key, value in result.items() if isinstance(value, int)}
+    } for name, result in scanner.results().items()]
+
+def job_progress_updater(job_id, total_bytes):
+    """返回进度回调：按时间间隔节流，避免大文件分析时频繁写任务存储
+
+    回调参数为已处理的字节数；传入扫描器时同时写入阶段性结果（供 /jobs/<id>/events 推送），
+    final 表示扫描结束，总是写入并记录各分析器的结果摘要。
+    """
+    last_update = [0.0]
+    
+    def progress(bytes_processed, scanner=None, final=False):
+        now = time.monotonic()
+        if not final and now - last_update[0] < JOB_PROGRESS_INTERVAL:
+            return
+        last_update[0] = now
+        fields = {
+            'bytes_processed': bytes_processed,
+            'progress': round(bytes_processed * 100 / total_bytes, 1) if total_bytes else 100.0
+        }
+        if scanner is not None:
+            fields['partial'] = partial_findings(scanner)
+        if final:
+            fields['stage'] = 'report'
+            fields['analyzers'] = analyzer_summaries(scanner)
+        update_job(job_id, **fields)
+    
+    return progress
+
+def purge_finished_jobs():
+    """清理超过保留时间的已结束任务"""
+    get_job_store().purge(JOB_RETENTION_SECONDS)
+
+def active_job_count():
+    """排队和执行中的任务数"""
+    return get_job_store().active_count()
+
+def new_job(job_id, file_name, total_bytes, content_hash, **fields):
+    """创建任务记录"""
+    job = {
+        'job_id': job_id,
+        'status': 'queued',
+        'file_name': file_name,
+        'content_hash': content_hash,
+        'total_bytes': total_bytes,
+        'bytes_processed': 0,
+        'progress': 0.0,
+        'report_file': None,
+        'threat_level': None,
+        'cached': False,
+        'error': None,
+        'stage': None,
+        'partial': None,
+        'analyzers': [],
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None
+    }
+    job.update(fields)
+    return job
+
+def run_profiled_analysis(job_id, filepath, original_name, report_name, content_hash, progress, encoding_sample=None):
+    """在 cProfile 和 tracemalloc 下执行分析，剖析结果保存在报告旁边（分析失败时也保存）
+
+    剖析时走串行路径：进程池子进程中的调用无法被 cProfile 记录。
+    """
+    profile_name = f"analysis_{report_name}"
+    profiler = AnalysisProfiler()
+    error = None
+    try:
+        with profiler:
+            return analyze_upload(filepath, original_name, report_name, content_hash, progress, parallel=False,
+                                  encoding_sample=encoding_sample)
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        profiler.save(os.path.join(REPORTS_FOLDER, profile_name), job_id=job_id, file_name=original_name,
+                      size=os.path.getsize(filepath), sha256=content_hash, parallel=False, error=error)
+        update_job(job_id, profile_file=profile_name)
+        logger.info(f"性能剖析已保存: {profile_name}.profile / {profile_name}.pstats")
+
+def run_analysis_job(job_id, filepath, original_name, report_name, content_hash, profile=False, encoding_sample=None):
+    """在工作线程中执行分析任务"""
+    total_bytes = os.path.getsize(filepath)
+    update_job(job_id, status='running', stage='scan', started_at=time.time())
+    progress = job_progress_updater(job_id, total_bytes)
+    
+    try:
+        if profile:
+            analysis_results, report_filename = run_profiled_analysis(job_id, filepath, original_name, report_name,
+                                                                      content_hash, progress, encoding_sample)
+        else:
+            analysis_results, report_filename = analyze_upload(filepath, original_name, report_name, content_hash,
+                                                               progress, encoding_sample=encoding_sample)
+        threat_level = analysis_results['threat_assessment']['level']
+        store_cached_report(content_hash, report_filename, threat_level, analysis_results['ruleset_version'])
+        update_job(job_id, status='done', progress=100.0, bytes_processed=total_bytes,
+                   report_file=report_filename, threat_level=threat_level, finished_at=time.time())
+        JOBS_FINISHED.inc(result='done')
+    except Exception as e:
+        logger.error(f"文件分析错误: {str(e)}")
+        update_job(job_id, status='failed', error=f'分析失败: {str(e)}', finished_at=time.time())
+        JOBS_FINISHED.inc(result='failed')
+    finally:
+        publish_metrics(force=True)
+
+def public_job(job):
+    """任务状态的对外表示"""
+    info = {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'file_name': job['file_name'],
+        'total_bytes': job['total_bytes'],
+        'bytes_processed': job['bytes_processed'],
+        'progress': job['progress'],
+        'report_file': job['report_file'],
+        'threat_level': job['threat_level'],
+        'cached': job['cached'],
+        'error': job['error'],
+        'stage': job.get('stage'),
+        'partial': job.get('partial'),
+        'analyzers': job.get('analyzers', []),
+        'created': datetime.datetime.fromtimestamp(job['created_at']).isoformat(),
+        'queue_depth': active_job_count() if job['status'] == 'queued' else 0
+    }
+    if 'files' in job:
+        info['files'] = job['files']
+    if job.get('profile'):
+        info['profile_url'] = f"/jobs/{job['job_id']}/profile"
+    return info
+
+def is_admin_request():
+    """请求是否携带正确的管理员令牌（X-Winxy-Admin-Token 或 Authorization: Bearer），未配置 admin_token 时一律拒绝"""
+    token = current_app.config['WINXY_SETTINGS'].get('admin_token') or ''
+    supplied = request.headers.get('X-Winxy-Admin-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if not supplied and authorization.startswith('Bearer '):
+        supplied = authorization[7:].strip()
+    return bool(token) and hmac.compare_digest(token.encode('utf-8'), supplied.encode('utf-8'))
+
+def profiling_requested():
+    """是否要求对本次分析做性能剖析（X-Winxy-Profile 头或 profile 查询参数）"""
+    value = request.headers.get('X-Winxy-Profile') or request.args.get('profile') or ''
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+@web.route('/upload', methods=['POST'])
 def upload_file():
-    """文件上传和分析"""
+    """文件上传，分析任务入队后立即返回任务ID"""
     try:
-        if 'file' not in request.files:
+        # 只看请求头就能拒绝的情况先处理，不必接收请求体
+        profile = profiling_requested()
+        if profile and not is_admin_request():
+            return jsonify({'error': '性能剖析仅限管理员（需要 X-Winxy-Admin-Token）'}), 403
+        
+        purge_finished_jobs()
+        if active_job_count() >= MAX_QUEUED_JOBS:
+            return jsonify({'error': '分析队列已满，请稍后重试'}), 503
+        
+        # 接收请求体：边接收边写盘、计算哈希并截取编码检测样本
+        with STAGE_SECONDS.time(stage='receive'):
+            files = request.files
+        if 'file' not in files:
             return jsonify({'error': '没有选择文件'}), 400
         
-        file = request.files['file']
+        file = files['file']
         if file.filename == '':
             return jsonify({'error': '没有选择文件'}), 400
         
         if file and allowed_file(file.filename):
-            # 生成安全的文件名
-            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{file.filename}"
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            
-            # 保存文件
-            file.save(filepath)
-            logger.info(f"文件上传成功: {filename}")
+            # 保存文件（按内容哈希存储，相同内容只保存一份）
+            with STAGE_SECONDS.time(stage='save'):
+                filepath, content_hash, total_bytes = save_upload(file)
+            UPLOAD_BYTES.observe(total_bytes, kind='file')
+            logger.info(f"文件上传成功: {file.filename} ({content_hash})")
             
-            # 读取文件内容
-            content = read_file_with_encoding(filepath)
-            if not content:
+            if total_bytes == 0:
                 return jsonify({'error': '无法读取文件内容或文件为空'}), 400
             
-            # 执行分析
-            analysis_results = {
-                'file_info': {
-                    'name': file.filename,
-                    'size': os.path.getsize(filepath),
-                    'encoding': detect_encoding(filepath),
-                    'upload_time': datetime.datetime.now().isoformat()
-                },
-                'processes': analyze_processes(content),
-                'network': analyze_network_connections(content),
-                'users': analyze_users(content),
-                'security': analyze_security_events(content)
-            }
-            
-            # 威胁评估
-            threat_assessment = calculate_threat_level(analysis_results)
-            analysis_results['threat_assessment'] = threat_assessment
-            
-            # 生成建议
-            recommendations = generate_recommendations(analysis_results, threat_assessment)
-            analysis_results['recommendations'] = recommendations
+            job_id = uuid.uuid4().hex
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            report_name = f"{timestamp}_{job_id[:8]}"
             
-            # 保存分析报告
-            report_filename = f"analysis_{timestamp}.json"
-            report_path = os.path.join(REPORTS_FOLDER, report_filename)
-            with open(report_path, 'w', encoding='utf-8') as f:
-                json.dump(analysis_results, f, ensure_ascii=False, indent=2)
+            # 相同内容在当前规则版本下已分析过：直接返回已有报告（要求剖析时必须重新分析）
+            cached = None if profile else lookup_cached_report(content_hash)
+            if cached:
+                get_job_store().add(new_job(job_id, file.filename, total_bytes, content_hash,
+                                            status='done', progress=100.0, bytes_processed=total_bytes,
+                                            report_file=cached['report_file'], threat_level=cached.get('threat_level'),
+                                            cached=True, finished_at=time.time()))
+                JOBS_FINISHED.inc(result='cached')
+                logger.info(f"命中分析缓存: {cached['report_file']}")
+                return jsonify({
+                    'success': True,
+                    'job_id': job_id,
+                    'cached': True,
+                    'report_file': cached['report_file'],
+                    'status_url': f'/jobs/{job_id}',
+                    'result_url': f'/jobs/{job_id}/result'
+                })
             
-            logger.info(f"分析完成，报告保存至: {report_filename}")
+            # 相同内容正在分析中（可能在其他工作进程）：复用该任务；剖析任务总是单独执行
+            if profile:
+                get_job_store().add(new_job(job_id, file.filename, total_bytes, content_hash, profile=True, profile_file=None))
+                running_id = None
+            else:
+                running_id = get_job_store().add_unless_running(new_job(job_id, file.filename, total_bytes, content_hash))
+            if running_id:
+                job_id = running_id
+            else:
+                get_job_executor().submit(run_analysis_job, job_id, filepath, file.filename, report_name, content_hash, profile,
+                                          upload_encoding_sample(file))
             
             return jsonify({
                 'success': True,
-                'analysis': analysis_results,
-                'report_file': report_filename
-            })
+                'job_id': job_id,
+                'status_url': f'/jobs/{job_id}',
+                'result_url': f'/jobs/{job_id}/result'
+            }), 202
         
         else:
             return jsonify({'error': '不支持的文件类型'}), 400
     
+    except RequestEntityTooLarge:
+        raise  # 交给 413 错误处理器
     except Exception as e:
-        logger.error(f"文件分析错误: {str(e)}")
-        return jsonify({'error': f'分析失败: {str(e)}'}), 500
+        logger.error(f"文件上传错误: {str(e)}")
+        return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
-@app.route('/reports')
-def list_reports():
-    """列出所有报告"""
+# ==================== 批量与归档上传 ====================
+# 一次上传多个文件，或上传整个采集目录的 zip/tar 归档。归档成员逐个流式写入内容寻址存储，
+# 不会整体解压到内存；各成员在进程池中并发扫描并生成各自的报告，
+# 扫描器再按成员顺序合并，生成一份主机汇总报告。
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+BATCH_MAX_FILES = 500  # 单批最多分析的文件数
+BATCH_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 单批解压后的总大小上限（防止压缩炸弹）
+
+def is_archive(filename):
+    """是否为支持的归档格式"""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def iter_archive_members(file):
+    """逐个产出归档中可分析的成员 (成员名, 数据流)，调用方必须在取下一个成员前读完当前数据流"""
+    if file.filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(file.stream) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and allowed_file(info.filename):
+                    with archive.open(info) as stream:
+                        yield info.filename, stream
+    else:
+        # 流式模式按顺序读取，不回溯、不缓存成员数据
+        with tarfile.open(fileobj=file.stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile() and allowed_file(member.name):
+                    yield member.name, archive.extractfile(member)
+
+def iter_batch_members(files):
+    """展开上传的文件列表：归档逐个产出成员，普通文件直接产出"""
+    for file in files:
+        if is_archive(file.filename):
+            yield from iter_archive_members(file)
+        elif allowed_file(file.filename):
+            yield file.filename, file.stream
+
+def save_batch_members(files):
+    """把批量上传的所有成员保存到内容寻址存储，返回成员列表（跳过空文件）"""
+    members = []
+    total_bytes = 0
+    for name, stream in iter_batch_members(files):
+        if len(members) >= BATCH_MAX_FILES:
+            raise ValueError(f'文件数量超过上限 ({BATCH_MAX_FILES})')
+        if isinstance(stream, IngestFile):
+            # 普通文件接收时已写盘并计算哈希，只需检查总大小后改名
+            if total_bytes + stream.size > BATCH_MAX_BYTES:
+                raise ValueError('上传内容超过大小上限')
+            filepath, content_hash, size = stream.commit()
+        else:
+            filepath, content_hash, size = store_stream(stream, BATCH_MAX_BYTES - total_bytes)
+        total_bytes += size
+        if size:
+            members.append({'name': name, 'filepath': filepath, 'sha256': content_hash, 'size': size})
+    return members
+
+def scan_batch_members(members, progress=None):
+    """并发扫描批量成员，按成员顺序返回 [(扫描器, 编码, 字符数)]
+
+    小文件整体作为一个分片提交到进程池；大文件在当前线程调用 scan_file，由其自行分片。
+    已完成的成员合并到一个汇总扫描器中随进度回调传出（成员自身的扫描器不修改），
+    批量任务扫描期间也能推送阶段性结果。
+    """
+    scans = [None] * len(members)
+    pending = {}
+    done_bytes = 0
+    running = LineScanner()  # 已完成成员的汇总，仅用于进度推送
+    
+    for index, member in enumerate(members):
+        if PARALLEL_WORKERS >= 2 and member['size'] < PARALLEL_MIN_BYTES:
+            encoding = detect_encoding(member['filepath'])
+            future = get_shard_executor().submit(scan_file_shard, member['filepath'], encoding, 0, None)
+            pending[future] = (index, encoding)
+    pooled = {index for index, _ in pending.values()}
+    
+    for index, member in enumerate(members):
+        if index not in pooled:
+            scans[index] = scan_file(member['filepath'])
+            done_bytes += member['size']
+            if progress:
+                if scans[index][0] is not None:
+                    running.merge(scans[index][0])
+                progress(done_bytes, running)
+    
+    for future in as_completed(pending):
+        index, encoding = pending[future]
+        try:
+            scanner, char_count = future.result()
+            scans[index] = (scanner, encoding, char_count)
+        except (UnicodeDecodeError, LookupError):
+            # 检测到的编码解码失败：串行路径会按候选编码重试
+            scans[index] = scan_file_streaming(members[index]['filepath'], encoding)
+        done_bytes += members[index]['size']
+        if progress:
+            if scans[index][0] is not None:
+                running.merge(scans[index][0])
+            progress(done_bytes, running)
+    
+    return scans
+
+def run_batch_job(job_id, members, batch_name, report_name):
+    """在工作线程中执行批量分析任务：逐文件报告 + 主机汇总报告"""
+    total_bytes = sum(member['size'] for member in members)
+    update_job(job_id, status='running', stage='scan', started_at=time.time())
+    progress = job_progress_updater(job_id, total_bytes)
+    
     try:
-        reports = []
-        for filename in os.listdir(REPORTS_FOLDER):
-            if filename.endswith('.json'):
-                filepath = os.path.join(REPORTS_FOLDER, filename)
-                stat = os.stat(filepath)
-                reports.append({
-                    'filename': filename,
-                    'size': stat.st_size,
-                    'created': datetime.datetime.fromtimestamp(stat.st_ctime).isoformat()
-                })
+        start = time.perf_counter()
+        scans = scan_batch_members(members, progress)
+        scan_seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(scan_seconds, stage='scan')
+        record_scan_metrics([scan[0] for scan in scans if scan[0]], total_bytes, scan_seconds)
+        update_job(job_id, stage='report')
+        
+        host_scanner = None
+        summaries = []
+        for index, (member, (scanner, encoding, char_count)) in enumerate(zip(members, scans)):
+            summary = {
+                'name': member['name'],
+                'sha256': member['sha256'],
+                'size': member['size'],
+                'report_file': None,
+                'threat_level': None,
+                'cached': False,
+                'error': None
+            }
+            summaries.append(summary)
+            if not char_count:
+                summary['error'] = '无法读取文件内容或文件为空'
+                continue
+            
+            # 相同内容已有报告时直接复用；扫描器仍需参与主机汇总
+            cached = lookup_cached_report(member['sha256'])
+            if cached:
+                summary.update(report_file=cached['report_file'], threat_level=cached.get('threat_level'), cached=True)
+            else:
+                file_info = {
+                    'name': member['name'],
+                    'size': member['size'],
+                    'encoding': encoding,
+                    'sha256': member['sha256'],
+                    'upload_time': datetime.datetime.now().isoformat()
+                }
+                analysis_results, report_filename = build_report(scanner.results(), file_info, f"{report_name}_{index + 1:03d}")
+                threat_level = analysis_results['threat_assessment']['level']
+                store_cached_report(member['sha256'], report_filename, threat_level, analysis_results['ruleset_version'])
+                summary.update(report_file=report_filename, threat_level=threat_level)
+            
+            if host_scanner is None:
+                host_scanner = scanner
+            else:
+                host_scanner.merge(scanner)
+        
+        update_job(job_id, files=summaries)
+        if host_scanner is None:
+            raise ValueError('没有可分析的文件内容')
+        
+        host_info = {
+            'name': batch_name,
+            'size': total_bytes,
+            'encoding': None,
+            'sha256': None,
+            'upload_time': datetime.datetime.now().isoformat(),
+            'members': summaries
+        }
+        analysis_results, report_filename = build_report(host_scanner.results(), host_info, f"{report_name}_host")
+        update_job(job_id, status='done', progress=100.0, bytes_processed=total_bytes, report_file=report_filename,
+                   threat_level=analysis_results['threat_assessment']['level'], finished_at=time.time())
+        JOBS_FINISHED.inc(result='done')
+    except Exception as e:
+        logger.error(f"批量分析错误: {str(e)}")
+        update_job(job_id, status='failed', error=f'分析失败: {str(e)}', finished_at=time.time())
+        JOBS_FINISHED.inc(result='failed')
+    finally:
+        publish_metrics(force=True)
+
+@web.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """批量上传：多个文件（字段 files）或一个 zip/tar 归档，分析任务入队后立即返回任务ID"""
+    try:
+        purge_finished_jobs()
+        if active_job_count() >= MAX_QUEUED_JOBS:
+            return jsonify({'error': '分析队列已满，请稍后重试'}), 503
+        
+        with STAGE_SECONDS.time(stage='receive'):
+            files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+        if not files:
+            return jsonify({'error': '没有选择文件'}), 400
+        
+        try:
+            with STAGE_SECONDS.time(stage='save'):
+                members = save_batch_members(files)
+        except (zipfile.BadZipFile, tarfile.TarError):
+            return jsonify({'error': '归档文件损坏或格式不支持'}), 400
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 413
+        
+        if not members:
+            return jsonify({'error': '没有可分析的文件（支持的类型: ' + ', '.join(sorted(ALLOWED_EXTENSIONS)) + '）'}), 400
+        
+        batch_name = files[0].filename if len(files) == 1 else f'{len(files)} 个文件'
+        total_bytes = sum(member['size'] for member in members)
+        UPLOAD_BYTES.observe(total_bytes, kind='batch')
+        logger.info(f"批量上传成功: {batch_name}，共 {len(members)} 个文件")
+        
+        job_id = uuid.uuid4().hex
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        report_name = f"{timestamp}_{job_id[:8]}"
+        
+        get_job_store().add(new_job(job_id, batch_name, total_bytes, None, kind='batch', files=[
+            {'name': member['name'], 'sha256': member['sha256'], 'size': member['size']} for member in members
+        ]))
+        get_job_executor().submit(run_batch_job, job_id, members, batch_name, report_name)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'files': len(members),
+            'status_url': f'/jobs/{job_id}',
+            'result_url': f'/jobs/{job_id}/result'
+        }), 202
+    
+    except RequestEntityTooLarge:
+        raise  # 交给 413 错误处理器
+    except Exception as e:
+        logger.error(f"批量上传错误: {str(e)}")
+        return jsonify({'error': f'上传失败: {str(e)}'}), 500
+
+# ==================== 投递目录监视 ====================
+# web_interface.watch_folder 配置后，服务定期轮询该目录并自动分析其中的文件。
+# 每个文件保存字节偏移检查点和扫描器状态：持续追加的日志只扫描新追加的完整行，
+# 在原有扫描状态上继续累加后重写同一份报告，结果与重新分析整个文件相同。
+# 最后一行尚未写完时只计入本次报告，不写入检查点，下次追加后按完整行重新扫描。
+
+WATCH_LEASE_NAME = 'drop_folder'
+WATCH_LEASE_SECONDS = 300  # 租约有效期：持有者退出后其他工作进程最多等待这么久接手
+WATCH_STATE_LIST_LIMIT = 1000  # 检查点中每个结果列表最多保存的条数（计数不受影响），保证检查点大小有上限
+
+watch_store = None
+watch_lock = threading.Lock()
+_watch_thread = None
+
+def get_watch_store():
+    """获取投递目录检查点存储"""
+    global watch_store
+    with watch_lock:
+        if watch_store is None:
+            watch_store = CheckpointStore(WATCH_DB)
+        return watch_store
+
+def scan_state_version():
+    """扫描器状态的版本：分析逻辑、威胁情报（含 config.json 中的可疑进程名和端口）、IP 数据
+    或企业内网网段变化后旧状态不再使用。扫描时连接已按网段分类并保存在状态中，
+    网段变化后续用会让同一份报告混用新旧分类；只影响评估的阈值和权重不计入。"""
+    networks = json.dumps(RULE_ENGINE.current().internal_networks, ensure_ascii=False)
+    networks_hash = hashlib.sha256(networks.encode('utf-8')).hexdigest()[:12]
+    return f'{ANALYSIS_LOGIC_VERSION}-{current_ioc_matcher().version}-{IP_INDEX.version}-{networks_hash}'
+
+def can_resume(checkpoint, file_path, size, version):
+    """检查点能否续用：版本相同、编码可按行切分、文件没有变短且开头未被替换"""
+    return (checkpoint is not None and checkpoint['scanner_state'] is not None and checkpoint['version'] == version
+            and is_shardable_encoding(checkpoint['encoding']) and checkpoint['offset'] <= size
+            and head_fingerprint(file_path, checkpoint['offset']) == checkpoint['head_hash'])
+
+def analyze_drop_file(file_path, stat, display_name, store):
+    """分析投递目录中的一个文件（能续用检查点时只扫描追加部分），更新报告和检查点，返回报告文件名"""
+    size = stat.st_size
+    version = scan_state_version()
+    checkpoint = store.get(file_path, with_state=True)
+    start = time.perf_counter()
+    scanner = None
+    if can_resume(checkpoint, file_path, size, version):
+        try:
+            scanner = LineScanner.from_state(checkpoint['scanner_state'])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            logger.warning(f"投递目录检查点状态无效，从头分析: {display_name}")
+    if scanner is not None:
+        encoding = checkpoint['encoding']
+        offset = checkpoint['offset']
+        line_end = find_last_line_end(file_path, offset, size)
+        try:
+            char_count = checkpoint['char_count'] + scan_file_range(scanner, file_path, encoding, offset, line_end)
+        except (UnicodeDecodeError, LookupError):
+            scanner = None  # 追加部分与原编码不符：从头重新检测编码并分析
+    
+    if scanner is not None:
+        mode = 'incremental'
+        scanned_bytes = line_end - offset
+        report_name = checkpoint['report_name']
+    else:
+        mode = 'full'
+        encoding = detect_encoding(file_path)
+        line_end = find_last_line_end(file_path, 0, size) if is_shardable_encoding(encoding) else size
+        scanner, encoding, char_count = scan_file_streaming(file_path, encoding, end=line_end)
+        if scanner is None:
+            raise ValueError('无法解码文件内容')
+        scanned_bytes = line_end
+        report_name = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_watch_{uuid.uuid4().hex[:8]}"
+    
+    # 未写完的最后一行在扫描器副本上计入本次报告
+    report_scanner = scanner
+    report_chars = char_count
+    if line_end < size:
+        tail_scanner = copy.deepcopy(scanner)
+        try:
+            report_chars += scan_file_range(tail_scanner, file_path, encoding, line_end, size)
+            report_scanner = tail_scanner
+        except (UnicodeDecodeError, LookupError):
+            pass  # 最后一个多字节字符还没写完
+    scan_seconds = time.perf_counter() - start
+    STAGE_SECONDS.observe(scan_seconds, stage='scan')
+    record_scan_metrics([report_scanner], scanned_bytes + size - line_end, scan_seconds)
+    WATCH_SCANS.inc(mode=mode)
+    
+    report_filename = checkpoint['report_file'] if mode == 'incremental' else None
+    if report_chars:
+        file_info = {
+            'name': display_name,
+            'size': size,
+            'encoding': encoding,
+            'sha256': None,  # 文件仍在增长，不按内容缓存
+            'upload_time': datetime.datetime.now().isoformat(),
+            'source': 'watch_folder',
+            'incremental': mode == 'incremental'
+        }
+        _, report_filename = build_report(report_scanner.results(), file_info, report_name)
+    
+    store.save({
+        'path': file_path,
+        'size': size,
+        'mtime_ns': stat.st_mtime_ns,
+        'offset': line_end,
+        'head_hash': head_fingerprint(file_path, line_end),
+        'encoding': encoding,
+        'version': version,
+        'report_name': report_name,
+        'report_file': report_filename,
+        'char_count': char_count
+    }, scanner.state(WATCH_STATE_LIST_LIMIT))
+    logger.info(f"投递目录文件已分析（{'增量' if mode == 'incremental' else '完整'}，{scanned_bytes} 字节）: {display_name}")
+    return report_filename
+
+def poll_drop_folder(folder, store, owner=None, failed=None):
+    """轮询一次投递目录，分析新出现和有变化的文件，返回分析的文件数
+
+    owner 不为 None 时每个文件分析前续期租约，租约被其他进程取得时提前结束；
+    failed 记录分析失败的文件 (大小, 修改时间)，文件再次变化前不重试。
+    """
+    folder = os.path.abspath(folder)
+    failed = {} if failed is None else failed
+    seen = set()
+    analyzed = 0
+    for file_path, stat in iter_drop_files(folder, allowed_file):
+        seen.add(file_path)
+        state = (stat.st_size, stat.st_mtime_ns)
+        checkpoint = store.get(file_path)
+        if (checkpoint and (checkpoint['size'], checkpoint['mtime_ns']) == state) or failed.get(file_path) == state:
+            continue
+        if owner and not store.acquire_lease(WATCH_LEASE_NAME, owner, WATCH_LEASE_SECONDS):
+            break
+        try:
+            analyze_drop_file(file_path, stat, os.path.relpath(file_path, folder), store)
+            failed.pop(file_path, None)
+            analyzed += 1
+        except (OSError, ValueError) as e:
+            failed[file_path] = state
+            logger.error(f"投递目录文件分析失败: {file_path}: {e}")
+    
+    # 已移出投递目录的文件不再保留检查点（报告保留）
+    for file_path in store.paths():
+        if file_path.startswith(folder + os.sep) and file_path not in seen and not os.path.exists(file_path):
+            store.remove(file_path)
+    return analyzed
+
+def drop_watch_loop(folder, interval):
+    """后台线程：持有租约时每 interval 秒轮询一次投递目录（多个工作进程中只有一个在轮询）"""
+    store = get_watch_store()
+    owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    failed = {}
+    pid = os.getpid()
+    while os.getpid() == pid:
+        try:
+            if store.acquire_lease(WATCH_LEASE_NAME, owner, WATCH_LEASE_SECONDS):
+                if poll_drop_folder(folder, store, owner, failed):
+                    publish_metrics(force=True)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"轮询投递目录失败: {e}")
+        time.sleep(interval)
+
+def start_drop_watcher(settings):
+    """配置了 watch_folder 时启动投递目录监视线程（每个进程一个，已启动时直接返回），返回是否已启动"""
+    global _watch_thread
+    folder = settings.get('watch_folder')
+    if not folder:
+        return False
+    with watch_lock:
+        if _watch_thread is None:
+            os.makedirs(folder, exist_ok=True)
+            _watch_thread = threading.Thread(target=drop_watch_loop, args=(folder, settings['watch_interval_seconds']),
+                                             name='winxy-watch', daemon=True)
+            _watch_thread.start()
+            logger.info(f"投递目录监视已启动: {folder}（每 {settings['watch_interval_seconds']} 秒轮询）")
+    return True
+
+@web.route('/watch')
+def watch_status():
+    """投递目录各文件的检查点：已分析到的偏移和对应报告"""
+    settings = current_app.config['WINXY_SETTINGS']
+    if not settings.get('watch_folder'):
+        return jsonify({'enabled': False, 'files': []})
+    store = get_watch_store()
+    files = []
+    for file_path in sorted(store.paths()):
+        checkpoint = store.get(file_path)
+        if checkpoint:
+            files.append({key: checkpoint[key] for key in ('path', 'size', 'offset', 'encoding', 'report_file', 'updated_at')})
+    return jsonify({'enabled': True, 'folder': os.path.abspath(settings['watch_folder']), 'files': files})
+
+@web.route('/jobs/<job_id>')
+def get_job(job_id):
+    """查询分析任务状态和进度"""
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(public_job(job))
+
+# 进度推送（Server-Sent Events）：任务状态保存在共享的任务存储中，推送连接可以落在任意工作进程上，
+# 这里按间隔读取任务并只发送变化的部分
+SSE_POLL_INTERVAL = 0.5  # 读取任务状态的间隔（秒）
+SSE_KEEPALIVE_SECONDS = 15  # 没有事件时发送注释行的间隔，防止代理断开空闲连接
+SSE_MAX_SECONDS = 300  # 单个连接的最长时间，之后由浏览器 EventSource 自动重连（避免长期占用处理线程）
+SSE_PROGRESS_FIELDS = ('status', 'stage', 'progress', 'bytes_processed', 'total_bytes', 'queue_depth')
+
+def sse_event(event, data):
+    """一条 SSE 事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def iter_job_events(job_id):
+    """产生任务的 SSE 事件：progress（进度）、partial（阶段性结果）、analyzer（分析器完成），
+    最后以 done 或 failed 结束；每次连接先发送一次当前状态"""
+    store = get_job_store()
+    started = last_sent = time.monotonic()
+    sent_progress = sent_partial = None
+    sent_analyzers = 0
+    while True:
+        job = store.get(job_id)
+        if job is None:
+            yield sse_event('failed', {'error': '任务不存在'})
+            return
+        info = public_job(job)
+        events = []
+        progress = {key: info[key] for key in SSE_PROGRESS_FIELDS}
+        if progress != sent_progress:
+            events.append(('progress', progress))
+            sent_progress = progress
+        if info['partial'] and info['partial'] != sent_partial:
+            events.append(('partial', info['partial']))
+            sent_partial = info['partial']
+        for analyzer in info['analyzers'][sent_analyzers:]:
+            events.append(('analyzer', analyzer))
+        sent_analyzers = len(info['analyzers'])
+        if job['status'] in ('done', 'failed'):
+            events.append((job['status'], info))
+        
+        now = time.monotonic()
+        if events:
+            yield ''.join(sse_event(event, data) for event, data in events)
+            last_sent = now
+        elif now - last_sent >= SSE_KEEPALIVE_SECONDS:
+            yield ': keepalive\n\n'
+            last_sent = now
+        if job['status'] in ('done', 'failed') or now - started >= SSE_MAX_SECONDS:
+            return
+        time.sleep(SSE_POLL_INTERVAL)
+
+@web.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """以 Server-Sent Events 推送任务进度、阶段性结果和实时威胁评分，任务结束时关闭"""
+    if get_job_store().get(job_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return Response(iter_job_events(job_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@web.route('/jobs/<job_id>/result')
+def get_job_result(job_id):
+    """获取已完成任务的分析结果"""
+    try:
+        job = get_job_store().get(job_id)
+        if job is None:
+            return jsonify({'error': '任务不存在'}), 404
+        
+        if job['status'] == 'failed':
+            return jsonify({'success': False, 'error': job['error']}), 500
+        if job['status'] != 'done':
+            return jsonify(public_job(job)), 202
+        
+        analysis_results = load_report(job['report_file'])
+        if analysis_results is None:
+            return jsonify({'error': '报告不存在'}), 404
         
-        reports.sort(key=lambda x: x['created'], reverse=True)
-        return jsonify({'reports': reports})
+        return jsonify({
+            'success': True,
+            'analysis': analysis_results,
+            'report_file': job['report_file']
+        })
+    
+    except Exception as e:
+        logger.error(f"获取分析结果错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@web.route('/jobs/<job_id>/profile')
+def get_job_profile(job_id):
+    """获取剖析任务的性能剖析结果（仅限管理员）：默认返回 JSON 摘要，format=pstats 时下载原始 pstats 文件"""
+    if not is_admin_request():
+        return jsonify({'error': '性能剖析仅限管理员（需要 X-Winxy-Admin-Token）'}), 403
+    
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if not job.get('profile'):
+        return jsonify({'error': '该任务未启用性能剖析'}), 404
+    if not job.get('profile_file'):
+        if job['status'] in ('queued', 'running'):
+            return jsonify(public_job(job)), 202
+        return jsonify({'error': '剖析结果不存在'}), 404
+    
+    base_path = os.path.abspath(os.path.join(REPORTS_FOLDER, job['profile_file']))
+    if request.args.get('format') == 'pstats':
+        if not os.path.exists(base_path + '.pstats'):
+            return jsonify({'error': '剖析结果不存在'}), 404
+        return send_file(base_path + '.pstats', mimetype='application/octet-stream', as_attachment=True,
+                         download_name=job['profile_file'] + '.pstats')
+    if not os.path.exists(base_path + '.profile'):
+        return jsonify({'error': '剖析结果不存在'}), 404
+    return send_file(base_path + '.profile', mimetype='application/json')
+
+@web.route('/reports')
+def list_reports():
+    """列出报告（支持分页、排序和过滤）
+    
+    查询参数: page, per_page, sort (created/score/level/size/filename/source), order (asc/desc),
+    level, since/until (ISO 时间或 24h、7d 等相对时长), min_score, max_score, source
+    """
+    try:
+        args = request.args
+        page = max(args.get('page', 1, type=int), 1)
+        per_page = min(max(args.get('per_page', REPORTS_DEFAULT_PAGE_SIZE, type=int), 1), REPORTS_MAX_PAGE_SIZE)
+        try:
+            since = parse_time_filter(args.get('since'))
+            until = parse_time_filter(args.get('until'))
+        except ValueError:
+            return jsonify({'error': '时间参数格式无效'}), 400
+        
+        reports, total = get_catalog().query(
+            page=page,
+            per_page=per_page,
+            sort=args.get('sort', 'created'),
+            order=args.get('order', 'desc'),
+            level=args.get('level'),
+            since=since,
+            until=until,
+            min_score=args.get('min_score', type=int),
+            max_score=args.get('max_score', type=int),
+            source=args.get('source')
+        )
+        return jsonify({
+            'reports': reports,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page
+        })
     
     except Exception as e:
         logger.error(f"获取报告列表错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/reports/<filename>')
+@web.route('/reports/<filename>')
 def get_report(filename):
-    """获取特定报告"""
+    """获取特定报告（直接返回存储的字节，不再解析后重新序列化）"""
     try:
-        filepath = os.path.join(REPORTS_FOLDER, filename)
-        if not os.path.exists(filepath):
+        response = send_report(filename)
+        if response is None:
             return jsonify({'error': '报告不存在'}), 404
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            report = json.load(f)
-        
-        return jsonify(report)
+        return response
     
     except Exception as e:
         logger.error(f"获取报告错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/download/<filename>')
+@web.app_errorhandler(413)
+def request_too_large(e):
+    """上传内容超过 web_interface.max_upload_size_mb"""
+    limit = current_app.config.get('MAX_CONTENT_LENGTH') or 0
+    return jsonify({'error': f'上传内容超过大小上限（{limit // (1024 * 1024)} MB）'}), 413
+
+@web.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@web.after_app_request
+def record_request_metrics(response):
+    """按路由模板（而不是实际 URL）记录请求耗时，避免任务ID、报告名造成标签膨胀"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method)
+        REQUESTS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+    publish_metrics()
+    return response
+
+@web.route('/metrics')
+def metrics():
+    """Prometheus 指标（汇总全部工作进程）"""
+    publish_metrics(force=True)
+    status_counts = get_job_store().status_counts()
+    report_count, report_bytes = get_catalog().totals()
+    gauges = []
+    gauges += gauge_lines('winxy_jobs', '当前任务数（queued 即队列深度）',
+                          [([('status', status)], status_counts.get(status, 0)) for status in ('queued', 'running')])
+    gauges += gauge_lines('winxy_job_queue_limit', '排队+执行中任务数上限', [([], MAX_QUEUED_JOBS)])
+    gauges += gauge_lines('winxy_reports', '报告目录中的报告数', [([], report_count)])
+    gauges += gauge_lines('winxy_report_store_bytes', '报告占用的磁盘空间（压缩后，字节）', [([], report_bytes)])
+    return Response(METRICS.render(get_metrics_store().collect(), gauges),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@web.route('/download/<filename>')
 def download_report(filename):
     """下载报告"""
     try:
-        filepath = os.path.join(REPORTS_FOLDER, filename)
-        if not os.path.exists(filepath):
+        response = send_report(filename, as_attachment=True)
+        if response is None:
             return jsonify({'error': '文件不存在'}), 404
         
-        return send_file(filepath, as_attachment=True)
+        return response
     
     except Exception as e:
         logger.error(f"下载报告错误: {str(e)}")
@@ -599,6 +2700,11 @@ INDEX_TEMPLATE = '''
             padding: 40px;
         }
         
+        .partial-results {
+            text-align: left;
+            margin-top: 20px;
+        }
+        
         .spinner {
             border: 4px solid #f3f3f3;
             border-top: 4px solid #007bff;
@@ -782,7 +2888,11 @@ INDEX_TEMPLATE = '''
             <div class="analysis-section" id="analysisSection">
                 <div class="loading" id="loadingDiv">
                     <div class="spinner"></div>
-                    <div>正在分析文件，请稍候...</div>
+                    <div id="loadingText">正在分析文件，请稍候...</div>
+                    <div id="analyzersDiv"></div>
+                    <div class="partial-results" id="partialDiv">
+                        <!-- 分析过程中的阶段性结果 -->
+                    </div>
                 </div>
                 
                 <div class="results" id="resultsDiv">
@@ -799,6 +2909,10 @@ INDEX_TEMPLATE = '''
         const analysisSection = document.getElementById('analysisSection');
         const loadingDiv = document.getElementById('loadingDiv');
         const resultsDiv = document.getElementById('resultsDiv');
+        const loadingText = document.getElementById('loadingText');
+        const analyzersDiv = document.getElementById('analyzersDiv');
+        const partialDiv = document.getElementById('partialDiv');
+        const ANALYZER_NAMES = {processes: '进程分析', network: '网络连接分析', users: '用户分析', security: '安全事件分析'};
         
         // 拖拽事件
         uploadSection.addEventListener('dragover', (e) => {
@@ -835,13 +2949,121 @@ INDEX_TEMPLATE = '''
             analysisSection.style.display = 'block';
             loadingDiv.style.display = 'block';
             resultsDiv.style.display = 'none';
-            
-            // 上传文件
+            analyzersDiv.innerHTML = '';
+            partialDiv.innerHTML = '';
+            loadingText.textContent = '正在上传文件，请稍候...';
+
+            // 上传文件，服务器返回任务ID后轮询分析进度
             fetch('/upload', {
                 method: 'POST',
                 body: formData
             })
             .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    watchJob(data.job_id);
+                } else {
+                    loadingDiv.style.display = 'none';
+                    displayError(data.error);
+                }
+            })
+            .catch(error => {
+                loadingDiv.style.display = 'none';
+                displayError('上传失败: ' + error.message);
+            });
+        }
+
+        // 进度文字
+        function showProgress(job) {
+            if (job.status === 'queued') {
+                loadingText.textContent = `排队中，当前队列任务数: ${job.queue_depth}`;
+            } else if (job.stage === 'report') {
+                loadingText.textContent = '扫描完成，正在生成报告...';
+            } else {
+                loadingText.textContent = `正在分析文件... ${job.progress}%`;
+            }
+        }
+
+        // 通过 SSE 接收进度和阶段性结果，浏览器不支持或连接失败时退回轮询
+        function watchJob(jobId) {
+            if (!window.EventSource) {
+                pollJob(jobId);
+                return;
+            }
+            const source = new EventSource('/jobs/' + jobId + '/events');
+            let finished = false;
+            source.addEventListener('progress', (e) => showProgress(JSON.parse(e.data)));
+            source.addEventListener('partial', (e) => renderPartial(JSON.parse(e.data)));
+            source.addEventListener('analyzer', (e) => {
+                const analyzer = JSON.parse(e.data);
+                analyzersDiv.innerHTML += `<div>✅ ${ANALYZER_NAMES[analyzer.name] || analyzer.name} 完成（约 ${analyzer.seconds} 秒）</div>`;
+            });
+            source.addEventListener('done', () => {
+                finished = true;
+                source.close();
+                fetchJobResult(jobId);
+            });
+            source.addEventListener('failed', (e) => {
+                finished = true;
+                source.close();
+                loadingDiv.style.display = 'none';
+                displayError(JSON.parse(e.data).error);
+            });
+            source.onerror = () => {
+                // 服务器按时关闭连接后浏览器会自动重连；连接被拒绝（CLOSED）时改为轮询
+                if (!finished && source.readyState === EventSource.CLOSED) {
+                    pollJob(jobId);
+                }
+            };
+        }
+
+        // 显示分析过程中已发现的问题（实时评分只反映已扫描的部分）
+        function renderPartial(partial) {
+            let html = `
+                <div class="threat-level threat-${partial.level.toLowerCase()}">
+                    <p>实时评分: ${partial.score}/100（${partial.level}，分析尚未完成）</p>
+                    <p>已发现进程 ${partial.counts.total_processes} 个（可疑 ${partial.counts.suspicious_processes}），
+                       连接 ${partial.counts.total_connections} 个（可疑 ${partial.counts.suspicious_connections}），
+                       失败登录 ${partial.counts.failed_logins} 次</p>
+                </div>
+            `;
+            if (partial.suspicious_processes.length > 0) {
+                html += '<h3>已发现的可疑进程</h3>' + generateProcessTable({process_list: partial.suspicious_processes});
+            }
+            if (partial.suspicious_connections.length > 0) {
+                html += '<h3>已发现的可疑连接</h3>' + generateNetworkTable({external_list: partial.suspicious_connections});
+            }
+            partialDiv.innerHTML = html;
+        }
+
+        // 轮询分析任务状态
+        function pollJob(jobId) {
+            fetch('/jobs/' + jobId)
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'done') {
+                    fetchJobResult(jobId);
+                } else if (job.status === 'failed' || job.error) {
+                    loadingDiv.style.display = 'none';
+                    displayError(job.error);
+                } else {
+                    showProgress(job);
+                    if (job.partial) {
+                        renderPartial(job.partial);
+                    }
+                    setTimeout(() => pollJob(jobId), 1000);
+                }
+            })
+            .catch(error => {
+                loadingDiv.style.display = 'none';
+                displayError('获取任务状态失败: ' + error.message);
+            });
+        }
+
+        // 获取分析结果
+        function fetchJobResult(jobId) {
+            fetch('/jobs/' + jobId + '/result')
+            .then(response => response.json())
             .then(data => {
                 loadingDiv.style.display = 'none';
                 if (data.success) {
@@ -852,7 +3074,7 @@ INDEX_TEMPLATE = '''
             })
             .catch(error => {
                 loadingDiv.style.display = 'none';
-                displayError('上传失败: ' + error.message);
+                displayError('获取分析结果失败: ' + error.message);
             });
         }
         
@@ -933,6 +3155,13 @@ INDEX_TEMPLATE = '''
             resultsDiv.style.display = 'block';
         }
         
+        // 转义来自上传文件的文本，避免插入 innerHTML 时被当作 HTML 执行
+        function escapeHtml(value) {
+            return String(value ?? '').replace(/[&<>"']/g, ch => ({
+                '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+            })[ch]);
+        }
+        
         // 生成进程表格
         function generateProcessTable(processes) {
             let html = '<table class="data-table"><thead><tr><th>进程名</th><th>PID</th><th>状态</th><th>风险说明</th></tr></thead><tbody>';
@@ -940,10 +3169,10 @@ INDEX_TEMPLATE = '''
             processes.process_list.forEach(process => {
                 const rowClass = process.suspicious ? 'suspicious' : '';
                 html += `<tr class="${rowClass}">
-                    <td>${process.name}</td>
-                    <td>${process.pid}</td>
+                    <td>${escapeHtml(process.name)}</td>
+                    <td>${escapeHtml(process.pid)}</td>
                     <td>${process.suspicious ? '⚠️ 可疑' : '✅ 正常'}</td>
-                    <td>${process.reason || '-'}</td>
+                    <td>${escapeHtml(process.reason || '-')}</td>
                 </tr>`;
             });
             
@@ -953,17 +3182,19 @@ INDEX_TEMPLATE = '''
         
         // 生成网络连接表格
         function generateNetworkTable(network) {
-            let html = '<table class="data-table"><thead><tr><th>协议</th><th>本地地址</th><th>远程地址</th><th>状态</th><th>PID</th><th>风险说明</th></tr></thead><tbody>';
+            let html = '<table class="data-table"><thead><tr><th>协议</th><th>本地地址</th><th>远程地址</th><th>归属</th><th>状态</th><th>PID</th><th>风险说明</th></tr></thead><tbody>';
             
             network.external_list.forEach(conn => {
                 const rowClass = conn.suspicious ? 'suspicious' : '';
+                const owner = [conn.remote_country, conn.remote_asn ? `AS${conn.remote_asn}` : '', conn.remote_org].filter(Boolean).join(' ');
                 html += `<tr class="${rowClass}">
-                    <td>${conn.protocol}</td>
-                    <td>${conn.local_ip}:${conn.local_port}</td>
-                    <td>${conn.remote_ip}:${conn.remote_port}</td>
-                    <td>${conn.state}</td>
-                    <td>${conn.pid}</td>
-                    <td>${conn.reason || '-'}</td>
+                    <td>${escapeHtml(conn.protocol)}</td>
+                    <td>${escapeHtml(conn.local_ip)}:${escapeHtml(conn.local_port)}</td>
+                    <td>${escapeHtml(conn.remote_ip)}:${escapeHtml(conn.remote_port)}</td>
+                    <td>${escapeHtml(owner || '-')}</td>
+                    <td>${escapeHtml(conn.state)}</td>
+                    <td>${escapeHtml(conn.pid)}</td>
+                    <td>${escapeHtml(conn.reason || '-')}</td>
                 </tr>`;
             });
             
@@ -977,7 +3208,7 @@ INDEX_TEMPLATE = '''
             
             users.user_list.forEach(user => {
                 html += `<tr>
-                    <td>${user.name}</td>
+                    <td>${escapeHtml(user.name)}</td>
                     <td>${user.type === 'administrator' ? '👑 管理员' : '👤 普通用户'}</td>
                     <td>${user.hidden ? '🔒 隐藏' : '👁️ 可见'}</td>
                 </tr>`;
@@ -1007,13 +3238,15 @@ INDEX_TEMPLATE = '''
             `;
             
             if (security.security_events.length > 0) {
-                html += '<table class="data-table"><thead><tr><th>事件ID</th><th>时间</th><th>严重性</th></tr></thead><tbody>';
+                html += '<table class="data-table"><thead><tr><th>事件ID</th><th>时间</th><th>账户</th><th>源地址</th><th>严重性</th></tr></thead><tbody>';
                 
                 security.security_events.slice(0, 20).forEach(event => {
                     html += `<tr>
-                        <td>${event.event_id}</td>
-                        <td>${event.timestamp}</td>
-                        <td>${event.severity}</td>
+                        <td>${escapeHtml(event.event_id)}</td>
+                        <td>${escapeHtml(event.timestamp)}</td>
+                        <td>${escapeHtml(event.account || '-')}</td>
+                        <td>${escapeHtml(event.source_ip || '-')}</td>
+                        <td>${escapeHtml(event.severity)}</td>
                     </tr>`;
                 });
                 
@@ -1035,8 +3268,8 @@ INDEX_TEMPLATE = '''
                             ${rec.priority === 'High' ? '🔴' : rec.priority === 'Medium' ? '🟡' : '🟢'} 
                             ${rec.priority} - ${rec.category}
                         </div>
-                        <div><strong>问题:</strong> ${rec.description}</div>
-                        <div><strong>建议:</strong> ${rec.action}</div>
+                        <div><strong>问题:</strong> ${escapeHtml(rec.description)}</div>
+                        <div><strong>建议:</strong> ${escapeHtml(rec.action)}</div>
                     </div>
                 `;
             });
@@ -1046,7 +3279,7 @@ INDEX_TEMPLATE = '''
         
         // 显示错误信息
         function displayError(message) {
-            resultsDiv.innerHTML = `<div class="error-message">❌ ${message}</div>`;
+            resultsDiv.innerHTML = `<div class="error-message">❌ ${escapeHtml(message)}</div>`;
             resultsDiv.style.display = 'block';
         }
         
@@ -1073,21 +3306,109 @@ INDEX_TEMPLATE = '''
 </html>
 '''
 
-if __name__ == '__main__':
+# ==================== 应用工厂与多进程部署 ====================
+# 生产环境通过 winxy_serve.py 启动：主进程 import 本模块时加载编译好的规则、威胁情报和 IP 索引，
+# 再 fork 出工作进程，工作进程以写时复制方式共享这些只读数据；线程池和进程池在 fork 之后按需创建。
+
+# web_interface 段缺失字段时的默认值
+WEB_DEFAULTS = {
+    'host': '0.0.0.0',
+    'port': 12000,
+    'debug': False,
+    'cors_enabled': True,
+    'admin_token': '',
+    'max_upload_size_mb': 50,
+    'server': 'auto',
+    'workers': 2,
+    'threads': 8,
+    'timeout_seconds': 120,
+    'graceful_timeout_seconds': 30,
+    'watch_folder': '',
+    'watch_interval_seconds': 10
+}
+
+def load_web_settings(config_path=None):
+    """读取 config.json 的 web_interface 段，缺失字段使用默认值"""
+    settings = dict(WEB_DEFAULTS)
+    config_path = config_path or RULE_ENGINE.config_path
+    try:
+        with open(config_path, 'r', encoding='utf-8-sig') as f:
+            settings.update(json.load(f).get('web_interface', {}))
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"读取 web_interface 配置失败，使用默认值: {e}")
+    # 管理员令牌也可以只放在环境变量中，不写入配置文件
+    settings['admin_token'] = os.environ.get('WINXY_ADMIN_TOKEN', settings['admin_token'])
+    return settings
+
+def create_app(config_path=None):
+    """应用工厂：按 web_interface 配置创建 Flask 应用"""
+    settings = load_web_settings(config_path)
+    application = Flask(__name__)
+    application.request_class = UploadRequest  # 上传文件直接流式写入上传目录
+    max_mb = settings['max_upload_size_mb']
+    application.config['MAX_CONTENT_LENGTH'] = int(max_mb * 1024 * 1024) if max_mb else None
+    application.config['WINXY_SETTINGS'] = settings
+    if settings['cors_enabled']:
+        CORS(application)
+    application.register_blueprint(web)
+    return application
+
+def preload_shared_state():
+    """fork 工作进程之前在主进程中执行：预热共享数据，补录报告目录，清理上次运行遗留的任务和指标"""
+    RULE_ENGINE.current()
+    get_catalog()
+    get_metrics_store().clear()
+    failed = get_job_store().fail_active('服务器重启，任务已中断，请重新上传')
+    if failed:
+        logger.info(f"已将上次运行遗留的 {failed} 个未完成任务标记为失败")
+
+def reset_after_fork():
+    """fork 出的子进程丢弃从父进程继承的线程池、进程池和锁（线程不会随 fork 复制）"""
+    global _job_executor, _shard_executor, _watch_thread, jobs_lock, _shard_executor_lock, catalog_lock, watch_lock
+    _job_executor = None
+    _shard_executor = None
+    _watch_thread = None
+    jobs_lock = threading.Lock()
+    _shard_executor_lock = threading.Lock()
+    catalog_lock = threading.Lock()
+    watch_lock = threading.Lock()
+    METRICS.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+def print_banner(settings, server_name):
+    """打印启动信息"""
     print("=" * 60)
     print("Windows紧急响应系统 - Web服务器")
     print("=" * 60)
-    print(f"服务器启动中...")
-    print(f"Web界面地址: http://localhost:12000")
+    print(f"服务器启动中...（{server_name}）")
+    print(f"Web界面地址: http://localhost:{settings['port']}")
     print(f"上传目录: {UPLOAD_FOLDER}")
     print(f"报告目录: {REPORTS_FOLDER}")
+    if settings.get('watch_folder'):
+        print(f"投递目录: {settings['watch_folder']}（每 {settings['watch_interval_seconds']} 秒轮询，新文件和追加内容自动分析）")
+    ioc_stats = current_ioc_matcher().stats()
+    print(f"威胁情报: 进程名 {ioc_stats['names']}，哈希 {ioc_stats['hashes']}，IP {ioc_stats['ips']}，"
+          f"端口 {ioc_stats['ports']}，关键字 {ioc_stats['keywords']}（版本 {ioc_stats['version']}）")
+    print(f"IP离线数据: {', '.join(IP_INDEX.sources) or '无'}（版本 {IP_INDEX.version}）")
+    print(f"检测规则: {RULE_ENGINE.config_path}（版本 {RULE_ENGINE.current().version}，修改后自动生效）")
     print("按 Ctrl+C 停止服务器")
     print("=" * 60)
+
+app = create_app()
+
+if __name__ == '__main__':
+    # 开发模式（Flask 内置服务器，单进程）；生产环境请使用: python winxy_serve.py
+    settings = app.config['WINXY_SETTINGS']
+    print_banner(settings, 'Flask 开发服务器，生产环境请使用 python winxy_serve.py')
     
     try:
-        app.run(host='0.0.0.0', port=12000, debug=False)
+        preload_shared_state()
+        start_drop_watcher(settings)
+        app.run(host=settings['host'], port=settings['port'], debug=False, threaded=True)
     except KeyboardInterrupt:
         print("\n服务器已停止")
     except Exception as e:
         print(f"服务器启动失败: {e}")
-        input("按回车键退出...")
\ No newline at end of file
+        input("按回车键退出...")